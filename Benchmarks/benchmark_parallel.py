@@ -0,0 +1,79 @@
+"""
+Benchmarks evaluating a scenario file serially and with a pool of workers (felicific_parallel).
+
+A scaled trolley or lifeboat scenario, built as in benchmark_scenarios.py, is written to a temporary scenario file once
+and then evaluated with every number of workers. The times are the best of several runs and the speedup is relative to
+the first worker count (by default 1, the serial evaluation). The results of every run are checked against the serial
+ones:
+
+    python Benchmarks/benchmark_parallel.py
+    python Benchmarks/benchmark_parallel.py --records 20000000 --workers 1 2 4 8
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_scenario
+from benchmark_scenarios import SCENARIOS, getScaledRows, timeStage
+
+
+def getMatrixChunks(scenario, recordCount, decisions, chunkSize):
+    """Yields the records of a scaled scenario chunk by chunk, so scenarios larger than memory can be written."""
+    agentsPerDecision = max(1, recordCount // decisions)
+    template = getScaledRows(scenario, min(agentsPerDecision, 1000), decisions)
+    rows = np.array([list(arguments) + [0] * (fa.DECISION_COLUMN - len(arguments)) + [index, isDecisionMaker]
+                     for index, decisionRows in enumerate(template) for arguments, isDecisionMaker in decisionRows],
+                    dtype=float)
+    for start in range(0, agentsPerDecision * decisions, chunkSize):
+        count = min(chunkSize, agentsPerDecision * decisions - start)
+        yield rows[np.arange(start, start + count) % len(rows)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial and parallel evaluation of a scenario file.")
+    parser.add_argument("--scenario", default="trolley", choices=sorted(SCENARIOS))
+    parser.add_argument("--records", type=int, default=5000000, help="agents in the scenario")
+    parser.add_argument("--decisions", type=int, default=100, help="decisions in the scenario")
+    parser.add_argument("--workers", nargs="+", type=int, default=None,
+                        help="worker counts to compare (by default 1 up to one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=1000000, help="records evaluated at a time")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per worker count, the fastest is kept")
+    arguments = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    workerCounts = arguments.workers or sorted({1, 2, cpus} | {count for count in (4, 8, 16) if count < cpus})
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "scenario.bin")
+        decisionNames = ["Decision " + str(index) for index in range(arguments.decisions)]
+        felicific_scenario.writeScenarioMatrix(
+            path, getMatrixChunks(arguments.scenario, arguments.records, arguments.decisions, arguments.chunk_size),
+            decisionNames)
+        scenario = felicific_scenario.loadScenario(path)
+        print("{0}: {1:,} records x {2} decisions, {3:.1f} MB, {4} CPU(s)".format(
+            arguments.scenario, len(scenario.matrix), arguments.decisions, os.path.getsize(path) / 1e6, cpus))
+
+        serial = scenario.evaluate(.5, chunkSize=arguments.chunk_size)
+        serialTime = None
+        for workers in workerCounts:
+            seconds = timeStage(lambda: scenario.evaluate(.5, chunkSize=arguments.chunk_size, workers=workers),
+                                arguments.repeat)
+            result = scenario.evaluate(.5, chunkSize=arguments.chunk_size, workers=workers)
+            if not (np.array_equal(result.moralValues, serial.moralValues)
+                    and np.array_equal(result.negativeMoralValues, serial.negativeMoralValues)):
+                sys.exit(str(workers) + " worker(s) gave different values from the serial evaluation.")
+            serialTime = serialTime or seconds
+            print("    {0:>3} worker(s) {1:>10.4f} s {2:>14,.0f} records/s {3:>6.2f}x".format(
+                workers, seconds, len(scenario.matrix) / seconds, serialTime / seconds))
+        del scenario
+
+
+if __name__ == "__main__":
+    main()
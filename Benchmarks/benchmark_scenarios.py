@@ -0,0 +1,214 @@
+"""
+Benchmarks the Felicific Calculus on scaled versions of the trolley and lifeboat problems from Tests/.
+
+Every scaled decision cycles through the agents of one of the scenario's decisions, with the multipliers jittered so
+that the decisions differ. For each size the time of every stage is the best of several runs, reported with its
+throughput, along with the peak memory of building the decisions. Times are compared to a stored baseline, and the
+script exits with status 1 if any stage is slower than the tolerance allows. Benchmarks/baseline.json holds the times
+of the code before any of the optimizations, so every change is measured against the same reference: it stays fixed,
+and --save-baseline is for recording a baseline of your own on another machine, with --baseline pointing elsewhere:
+
+    python Benchmarks/benchmark_scenarios.py                                        compare to Benchmarks/baseline.json
+    python Benchmarks/benchmark_scenarios.py --baseline times.json --save-baseline  store the times in times.json
+    python Benchmarks/benchmark_scenarios.py --agents 10 1000000 --decisions 2 100000 --max-agents 100000000
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import felicific_calculus as fc
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# (createAgent() arguments, isDecisionMaker) of every agent of every decision, as in Tests/
+SCENARIOS = {
+    "trolley": [
+        [((False, 10, 1, 1, 1, 1, 0, 5), False),
+         ((True, 3, 3, 1, 1, 0, .8, 1, 0, 0, 0, 0, 1.5, 4, 1, 1), False),
+         ((False, 1, 5, 1, 1, 0, 0, 1), True),
+         ((False, 5, 5, 1, 1, 0, 0, 5), False)],
+        [((True, 3, 3, 1, 1, 0, .8, 5, 0, 0, 0, 0, 1.5, 4, 1, 5), False),
+         ((False, 10, 1, 1, 1, 1, 0, 1), False),
+         ((False, 3, 10, 1, 1, 0, 1, 1), True),
+         ((False, 5, 5, 1, 1, 0, 0, 1), False)],
+    ],
+    "lifeboat": [
+        [((True, 5, 3, 1, 1, 1, 0, 9, 0, 0, 0, 0, 3, 8, 1, 9), False),
+         ((False, 10, 1, .7, 1, 0, 0, 5), False),
+         ((False, 1, 2, 1, 1, 0, 0, 5), False),
+         ((False, 10, 1, .5, 1, 0, .5, 1, 0, 0, 0, 0, 1.5, 4, 1, 1), True)],
+        [((False, 10, 1, .5, 1, 0, 0, 9), False),
+         ((True, 5, 3, 1, 1, 1, 0, 5, 0, 0, 0, 0, 3, 4, 1, 5), False),
+         ((False, 1, 2, 1, 1, 0, 0, 5), False),
+         ((False, 10, 1, .7, 1, 0, .3, 1, 0, 0, 0, 0, 1.5, 4, 1, 1), True)],
+        [((False, 10, 1, .5, 1, 0, 0, 9), False),
+         ((False, 10, 1, .7, 1, 0, 0, 5), False),
+         ((True, 2, 2, 1, 1, 0, 0, 5), False),
+         ((True, 5, 1, 1, 1, 1, 0, 1, 0, 0, 0, 0, 1.5, 8, 1, 1), True)],
+    ],
+}
+
+MULTIPLIER = 7
+
+
+def getScaledRows(scenario, agentsPerDecision, decisions, seed=0):
+    """Returns, for every decision, the (createAgent() arguments, isDecisionMaker) of its agents."""
+    rng = random.Random(seed)
+    templates = SCENARIOS[scenario]
+    scaled = []
+    for decision in range(decisions):
+        template = templates[decision % len(templates)]
+        rows = []
+        for agent in range(agentsPerDecision):
+            arguments, isDecisionMaker = template[agent % len(template)]
+            arguments = list(arguments)
+            arguments[MULTIPLIER] = arguments[MULTIPLIER] * rng.uniform(.5, 1.5)
+            rows.append((arguments, isDecisionMaker))
+        scaled.append(rows)
+    return scaled
+
+
+def buildDecisions(scaledRows):
+    evaluate = fc.EvaluateDecisions()
+    for index, rows in enumerate(scaledRows):
+        decision = fc.Decision()
+        for arguments, isDecisionMaker in rows:
+            decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+        evaluate.addDecision("Decision " + str(index), decision)
+    return evaluate
+
+
+def timeStage(function, repeat):
+    # like timeit, the garbage collector is off while timing, so its pauses don't land on whichever stage they hit
+    best = None
+    gcWasEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        for run in range(repeat):
+            start = time.perf_counter()
+            function()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        if gcWasEnabled:
+            gc.enable()
+    return best
+
+
+def benchmark(scenario, agentsPerDecision, decisions, repeat):
+    """Returns {stage: (seconds, operations)} and the peak memory in bytes of building the decisions."""
+    scaledRows = getScaledRows(scenario, agentsPerDecision, decisions)
+    agents = agentsPerDecision * decisions
+    results = {}
+
+    results["createAgent"] = (timeStage(lambda: buildDecisions(scaledRows), repeat), agents)
+
+    # Every getMoralValue() stage starts from freshly built decisions, so cached values don't hide the work
+    def timeDecisions(method):
+        best = None
+        for run in range(repeat):
+            decisionList = [decision for name, decision in buildDecisions(scaledRows).getDecisions()]
+            elapsed = timeStage(lambda: [getattr(decision, method)() for decision in decisionList], 1)
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    results["Decision.getMoralValue"] = (timeDecisions("getMoralValue"), decisions)
+    results["Decision.getNegativeMoralValue"] = (timeDecisions("getNegativeMoralValue"), decisions)
+
+    evaluate = buildDecisions(scaledRows)
+    results["EvaluateDecisions.setSelfInterestScale"] = (
+        timeStage(lambda: evaluate.setSelfInterestScale(.5), repeat), decisions)
+    results["EvaluateDecisions.getDecisionWithHighestValue"] = (
+        timeStage(evaluate.getDecisionWithHighestValue, repeat), decisions)
+    results["EvaluateDecisions.getDecisionWithLeastNegativeValue"] = (
+        timeStage(evaluate.getDecisionWithLeastNegativeValue, repeat), decisions)
+
+    try:
+        import numpy as np
+        import felicific_arrays as fa
+    except ImportError:
+        pass
+    else:
+        matrix = np.array([list(arguments) + [0] * (16 - len(arguments)) + [index, isDecisionMaker]
+                           for index, rows in enumerate(scaledRows) for arguments, isDecisionMaker in rows],
+                          dtype=float)
+        results["felicific_arrays.evaluateParameterMatrix"] = (
+            timeStage(lambda: fa.evaluateParameterMatrix(matrix, .5), repeat), agents)
+
+    tracemalloc.start()
+    evaluate = buildDecisions(scaledRows)
+    peakMemory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del evaluate
+
+    return results, peakMemory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Felicific Calculus on scaled scenarios.")
+    parser.add_argument("--scenarios", nargs="+", default=sorted(SCENARIOS), choices=sorted(SCENARIOS))
+    parser.add_argument("--agents", nargs="+", type=int, default=[10, 1000], help="agents per decision")
+    parser.add_argument("--decisions", nargs="+", type=int, default=[2, 100], help="decisions per scenario")
+    parser.add_argument("--max-agents", type=int, default=1000000,
+                        help="skip sizes with more agents in total than this")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest is kept")
+    parser.add_argument("--tolerance", type=float, default=.25,
+                        help="how much slower than the baseline a stage may be before it is a regression")
+    parser.add_argument("--min-time", type=float, default=.001,
+                        help="stages faster than this many seconds are too noisy to count as regressions")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store the times in --baseline, which should not be Benchmarks/baseline.json")
+    arguments = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(arguments.baseline):
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+
+    times = {}
+    regressions = []
+    for scenario in arguments.scenarios:
+        for decisions in arguments.decisions:
+            for agentsPerDecision in arguments.agents:
+                if agentsPerDecision * decisions > arguments.max_agents:
+                    continue
+                results, peakMemory = benchmark(scenario, agentsPerDecision, decisions, arguments.repeat)
+                print("{0}: {1} agents x {2} decisions, peak memory {3:.1f} MB".format(
+                    scenario, agentsPerDecision, decisions, peakMemory / 1e6))
+
+                for stage, (seconds, operations) in results.items():
+                    key = "{0}/{1}x{2}/{3}".format(scenario, agentsPerDecision, decisions, stage)
+                    times[key] = seconds
+                    line = "    {0:<52} {1:>10.6f} s {2:>14,.0f} /s".format(stage, seconds,
+                                                                          operations / seconds if seconds else 0)
+                    if key in baseline and baseline[key] > 0:
+                        change = seconds / baseline[key] - 1
+                        line += " {0:>+8.1%}".format(change)
+                        if change > arguments.tolerance and seconds >= arguments.min_time:
+                            regressions.append(key)
+                            line += " REGRESSION"
+                    print(line)
+
+    if arguments.save_baseline:
+        baseline.update(times)
+        with open(arguments.baseline, "w") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print("Saved baseline to " + arguments.baseline)
+    elif regressions:
+        print(str(len(regressions)) + " stage(s) slower than the baseline by more than "
+              + "{0:.0%}".format(arguments.tolerance))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
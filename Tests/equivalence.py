@@ -0,0 +1,229 @@
+"""
+Helpers of the equivalence tests, which check every feature against a reference calculus: the formula of
+felicific_calculus written out again here, one consequence at a time and without any of the code under test, so a
+regression in Agent or Decision shows up as well as one in the features built on them.
+
+Decisions are given as rows of (createAgent() arguments, isDecisionMaker), either those of the examples in Tests/ or
+random ones drawn from values that exercise every branch of the calculus (pleasure and pain, missing 2nd order
+consequences, propinquities of 0). The reference values are summed exactly (math.fsum) and not rounded: a value
+computed by the code under test must round to the same cent, unless the exact value is so close to half a cent that
+summing in another order may round it either way.
+"""
+
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import felicific_calculus as fc
+import felicific_decay
+
+# the rows of every decision of trolley_problem.py and lifeboat_problem.py
+EXAMPLES = {
+    "trolley": [
+        [((False, 10, 1, 1, 1, 1, 0, 5), False),
+         ((True, 3, 3, 1, 1, 0, .8, 1, 0, 0, 0, 0, 1.5, 4, 1, 1), False),
+         ((False, 1, 5, 1, 1, 0, 0, 1), True),
+         ((False, 5, 5, 1, 1, 0, 0, 5), False)],
+        [((True, 3, 3, 1, 1, 0, .8, 5, 0, 0, 0, 0, 1.5, 4, 1, 5), False),
+         ((False, 10, 1, 1, 1, 1, 0, 1), False),
+         ((False, 3, 10, 1, 1, 0, 1, 1), True),
+         ((False, 5, 5, 1, 1, 0, 0, 1), False)],
+    ],
+    "lifeboat": [
+        [((True, 5, 3, 1, 1, 1, 0, 9, 0, 0, 0, 0, 3, 8, 1, 9), False),
+         ((False, 10, 1, .7, 1, 0, 0, 5), False),
+         ((False, 1, 2, 1, 1, 0, 0, 5), False),
+         ((False, 10, 1, .5, 1, 0, .5, 1, 0, 0, 0, 0, 1.5, 4, 1, 1), True)],
+        [((False, 10, 1, .5, 1, 0, 0, 9), False),
+         ((True, 5, 3, 1, 1, 1, 0, 5, 0, 0, 0, 0, 3, 4, 1, 5), False),
+         ((False, 1, 2, 1, 1, 0, 0, 5), False),
+         ((False, 10, 1, .7, 1, 0, .3, 1, 0, 0, 0, 0, 1.5, 4, 1, 1), True)],
+        [((False, 10, 1, .5, 1, 0, 0, 9), False),
+         ((False, 10, 1, .7, 1, 0, 0, 5), False),
+         ((True, 2, 2, 1, 1, 0, 0, 5), False),
+         ((True, 5, 1, 1, 1, 1, 0, 1, 0, 0, 0, 0, 1.5, 8, 1, 1), True)],
+    ],
+}
+
+# (moral value, negative moral value) of every decision of the examples for every self-interest scale, as printed by
+# the examples before any change to felicific_calculus
+EXAMPLE_VALUES = {
+    "trolley": {
+        None: [(-175.8, -184.8), (-44.0, -89.0)],
+        0: [(-170.8, -179.8), (-14.0, -59.0)],
+        .3: [(-121.06, -127.36), (-18.8, -50.3)],
+        .5: [(-87.9, -92.4), (-22.0, -44.5)],
+        1: [(-5.0, -5.0), (-30.0, -30.0)],
+    },
+    "lifeboat": {
+        None: [(88.0, -50.0), (14.8, -62.0), (-55.0, -80.0)],
+        0: [(90.0, -45.0), (20.0, -55.0), (-60.0, -80.0)],
+        .3: [(62.4, -33.0), (12.44, -40.6), (-40.5, -56.0)],
+        .5: [(44.0, -25.0), (7.4, -31.0), (-27.5, -40.0)],
+        1: [(-2.0, -5.0), (-5.2, -7.0), (5.0, 0.0)],
+    },
+}
+
+SELF_INTEREST_SCALES = (None, 0, .3, .5, 1)
+
+# a sum in another order than math.fsum may differ from it in its last bits, so a value this close (relative to its
+# size) to half a cent may be rounded either way
+ROUNDING_TOLERANCE = 1e-9
+
+
+def getRandomArguments(rng):
+    """Returns random createAgent() arguments, all 16 of them."""
+    return (rng.random() < .5,) + tuple(rng.choice((0, 1, 2, 3, .5, .7, rng.uniform(0, 10))) for field in range(15))
+
+
+def getRandomRows(rng, decisions=6, maxAgents=8):
+    """Returns the rows of random decisions, each with 0 to maxAgents agents."""
+    return [[(getRandomArguments(rng), rng.random() < .25) for agent in range(rng.randint(0, maxAgents))]
+            for decision in range(decisions)]
+
+
+def getScenarios(seed=0, count=20, decisions=6, maxAgents=8):
+    """Returns the rows of the examples followed by count random scenarios."""
+    rng = random.Random(seed)
+    return list(EXAMPLES.values()) + [getRandomRows(rng, decisions, maxAgents) for scenario in range(count)]
+
+
+def getFullArguments(arguments):
+    """Returns the 16 createAgent() arguments of a row, with the optional ones that were left out set to 0."""
+    return tuple(arguments) + (0,) * (16 - len(arguments))
+
+
+def getFactor(decay=None):
+    """Returns the factor of a propinquity as a function, written out from the formulas of felicific_decay."""
+    if decay is None or decay == felicific_decay.DEFAULT_DECAY:
+        return lambda propinquity: 1 / propinquity ** .1 if propinquity != 0 else 1
+    if isinstance(decay, felicific_decay.PowerLawDecay):
+        return lambda propinquity: propinquity ** -decay.exponent if propinquity != 0 else 1
+    if isinstance(decay, felicific_decay.ExponentialDecay):
+        return lambda propinquity: math.exp(-decay.rate * propinquity)
+    if isinstance(decay, felicific_decay.HyperbolicDecay):
+        return lambda propinquity: 1 / (1 + decay.rate * propinquity)
+    raise ValueError("No reference factor for " + repr(decay) + ".")
+
+
+def getReferenceConsequences(arguments, decay=None):
+    """Returns the consequences of one row: C * I * D * N * M for the consequence and each 2nd order consequence."""
+    (isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+     f_intensity, f_duration, f_propinquity, f_multiplier,
+     p_intensity, p_duration, p_propinquity, p_multiplier) = getFullArguments(arguments)
+    factor = getFactor(decay)
+    sign = 1 if isPleasure else -1
+    # fecundity is a 2nd order consequence of the same kind, purity one of the opposite kind
+    consequences = [sign * certainty * intensity * duration * factor(propinquity) * multiplier]
+    if fecundity != 0:
+        consequences.append(sign * fecundity * f_intensity * f_duration * factor(f_propinquity) * f_multiplier)
+    if purity != 0:
+        consequences.append(-sign * purity * p_intensity * p_duration * factor(p_propinquity) * p_multiplier)
+    return consequences
+
+
+def getReferencePartialValues(rows, decay=None):
+    """
+    Returns the exact unscaled sums of the rows as ((decision maker value, others value), (decision maker negative
+    value, others negative value)).
+    """
+    values = {True: [], False: []}
+    negativeValues = {True: [], False: []}
+    for arguments, isDecisionMaker in rows:
+        for consequence in getReferenceConsequences(arguments, decay):
+            values[bool(isDecisionMaker)].append(consequence)
+            negativeValues[bool(isDecisionMaker)].append(min(consequence, 0))
+    return ((math.fsum(values[True]), math.fsum(values[False])),
+            (math.fsum(negativeValues[True]), math.fsum(negativeValues[False])))
+
+
+def scaleValues(decisionMakerValue, othersValue, selfInterestScale):
+    if selfInterestScale is None:
+        return decisionMakerValue + othersValue
+    return decisionMakerValue * selfInterestScale + othersValue * (1 - selfInterestScale)
+
+
+def getReferenceValues(rows, selfInterestScale=None, decay=None):
+    """Returns the exact (moral value, negative moral value) of the rows of a decision, before rounding."""
+    partialValues, partialNegativeValues = getReferencePartialValues(rows, decay)
+    return scaleValues(*partialValues, selfInterestScale), scaleValues(*partialNegativeValues, selfInterestScale)
+
+
+def getAllReferenceValues(decisionRows, selfInterestScale=None, decay=None):
+    return [getReferenceValues(rows, selfInterestScale, decay) for rows in decisionRows]
+
+
+def getRoundings(value):
+    """
+    Returns the cents an exact value may be rounded to: one, or both neighbours if it is within a rounding error of
+    half a cent.
+    """
+    tolerance = ROUNDING_TOLERANCE * max(1, abs(value))
+    return {round(value - tolerance, 2), round(value + tolerance, 2)}
+
+
+def buildDecision(rows, selfInterestScale=None, decay=None):
+    """Builds a Decision of the rows, the input of the features that evaluate decisions."""
+    decision = fc.Decision(selfInterestScale, decay=decay)
+    for arguments, isDecisionMaker in rows:
+        decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+    return decision
+
+
+def buildEvaluation(decisionRows, selfInterestScale=None, decay=None):
+    """Builds an EvaluateDecisions of decisions named "Decision 0", "Decision 1"..."""
+    evaluate = fc.EvaluateDecisions()
+    for index, rows in enumerate(decisionRows):
+        evaluate.addDecision("Decision " + str(index), buildDecision(rows, decay=decay))
+    if selfInterestScale is not None:
+        evaluate.setSelfInterestScale(selfInterestScale)
+    return evaluate
+
+
+def getDecisionNames(decisionRows):
+    return ["Decision " + str(index) for index in range(len(decisionRows))]
+
+
+def getValues(evaluate):
+    """Returns [(moral value, negative moral value)] of every decision of an EvaluateDecisions."""
+    return [(decision.getMoralValue(), decision.getNegativeMoralValue()) for name, decision in evaluate.getDecisions()]
+
+
+def checkValue(testCase, actualValue, referenceValue):
+    """Checks that a rounded value is the exact reference value rounded to the cent."""
+    testCase.assertIn(actualValue, getRoundings(referenceValue))
+
+
+def checkValues(testCase, actualValues, referenceValues):
+    """Checks [(moral value, negative moral value)] of every decision against the exact reference values."""
+    testCase.assertEqual(len(actualValues), len(referenceValues))
+    for actual, reference in zip(actualValues, referenceValues):
+        checkValue(testCase, actual[0], reference[0])
+        checkValue(testCase, actual[1], reference[1])
+
+
+def checkUnroundedValue(testCase, actualValue, referenceValue):
+    """Checks a value that is not rounded against the exact reference value, allowing for rounding errors."""
+    testCase.assertAlmostEqual(actualValue, referenceValue, delta=ROUNDING_TOLERANCE * max(1, abs(referenceValue)))
+
+
+def getBestIndexes(values):
+    """
+    Returns the indexes of the decisions that may be the first with the highest of the exact values once they are
+    rounded: only one, unless values within a rounding error of half a cent decide it.
+    """
+    roundings = [getRoundings(value) for value in values]
+    return [index for index, rounding in enumerate(roundings)
+            if all(min(other) < max(rounding) if otherIndex < index else min(other) <= max(rounding)
+                   for otherIndex, other in enumerate(roundings) if otherIndex != index)]
+
+
+def checkBestDecisions(testCase, highestValueName, leastNegativeValueName, decisionNames, referenceValues):
+    """Checks the best decisions (the first of equal ones, like max()) against the exact reference values."""
+    testCase.assertIn(highestValueName, [decisionNames[index] for index in getBestIndexes(
+        [moralValue for moralValue, negativeMoralValue in referenceValues])])
+    testCase.assertIn(leastNegativeValueName, [decisionNames[index] for index in getBestIndexes(
+        [negativeMoralValue for moralValue, negativeMoralValue in referenceValues])])
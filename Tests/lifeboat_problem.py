@@ -1,3 +1,6 @@
+import logging
+import sys
+
 import felicific_calculus as fc
 
 if __name__ == "__main__":
@@ -11,6 +14,9 @@ if __name__ == "__main__":
     obviously could use your help, or go with the young, strong people, with whom you might have a better chance of survival?
     """
 
+    # Show the notices of EvaluateDecisions alongside the results
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
     # Decision 1: Help the families
     lifeboatHelpFamilies = fc.Decision()
 
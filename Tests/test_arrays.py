@@ -0,0 +1,95 @@
+"""Tests of felicific_arrays against the reference calculus of equivalence.py."""
+
+import unittest
+
+from equivalence import (EXAMPLE_VALUES, EXAMPLES, SELF_INTEREST_SCALES, buildEvaluation, checkUnroundedValue,
+                         checkValue, checkValues, getAllReferenceValues, getBestIndexes, getFullArguments,
+                         getReferenceConsequences, getReferenceValues, getScenarios)
+
+import numpy as np
+
+import felicific_arrays as fa
+
+
+def buildArrayDecision(rows, selfInterestScale=None):
+    decision = fa.ArrayDecision(selfInterestScale)
+    for arguments, isDecisionMaker in rows:
+        decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+    return decision
+
+
+class ArrayDecisionTest(unittest.TestCase):
+
+    def testMoralValuesEqualReference(self):
+        for decisionRows in getScenarios(1):
+            for rows in decisionRows:
+                for selfInterestScale in SELF_INTEREST_SCALES:
+                    decision = buildArrayDecision(rows, selfInterestScale)
+                    moralValue, negativeMoralValue = getReferenceValues(rows, selfInterestScale)
+                    checkValue(self, decision.getMoralValue(), moralValue)
+                    checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+                    self.assertEqual(decision.hasDecisionMaker(), any(isDecisionMaker for arguments, isDecisionMaker
+                                                                      in rows))
+
+    def testExamplesEqualPrintedValues(self):
+        for scenario, decisionRows in EXAMPLES.items():
+            for selfInterestScale, values in EXAMPLE_VALUES[scenario].items():
+                self.assertEqual([(decision.getMoralValue(), decision.getNegativeMoralValue())
+                                  for decision in (buildArrayDecision(rows, selfInterestScale)
+                                                   for rows in decisionRows)], values)
+
+    def testColumnsEqualReferenceConsequences(self):
+        for decisionRows in getScenarios(2, count=5):
+            for rows in decisionRows:
+                columns = buildArrayDecision(rows).getColumns()
+                expected = [(consequence, agent, isDecisionMaker)
+                            for agent, (arguments, isDecisionMaker) in enumerate(rows)
+                            for consequence in getReferenceConsequences(arguments)]
+                self.assertEqual(len(columns), len(expected))
+                self.assertEqual(columns.agent.tolist(), [agent for value, agent, isDecisionMaker in expected])
+                self.assertEqual(columns.decisionMaker.tolist(),
+                                 [isDecisionMaker for value, agent, isDecisionMaker in expected])
+                for value, (expectedValue, agent, isDecisionMaker) in zip(columns.getValues().tolist(), expected):
+                    checkUnroundedValue(self, value, expectedValue)
+
+
+def getMatrix(decisionRows):
+    return np.array([getFullArguments(arguments) + (decisionId, isDecisionMaker)
+                     for decisionId, rows in enumerate(decisionRows) for arguments, isDecisionMaker in rows],
+                    dtype=float).reshape(-1, fa.DECISION_MAKER_COLUMN + 1)
+
+
+class ParameterMatrixTest(unittest.TestCase):
+
+    def testResultsEqualReference(self):
+        for decisionRows in getScenarios(3):
+            matrix = getMatrix(decisionRows)
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                expected = getAllReferenceValues(decisionRows, selfInterestScale)
+                for chunkSize in (1, 7, 1000000):
+                    result = fa.evaluateParameterMatrix(matrix, selfInterestScale, decisionCount=len(decisionRows),
+                                                        chunkSize=chunkSize)
+                    checkValues(self, list(zip(result.moralValues.tolist(), result.negativeMoralValues.tolist())),
+                                expected)
+                    if decisionRows:
+                        self.assertIn(result.getDecisionWithHighestValue(),
+                                      getBestIndexes([moralValue for moralValue, negativeValue in expected]))
+                        self.assertIn(result.getDecisionWithLeastNegativeValue(),
+                                      getBestIndexes([negativeValue for moralValue, negativeValue in expected]))
+
+    def testMatrixOfDecisions(self):
+        for decisionRows in getScenarios(4, count=5):
+            matrix, decisionNames = fa.getParameterMatrix(buildEvaluation(decisionRows).getDecisions())
+            np.testing.assert_array_equal(matrix, getMatrix(decisionRows))
+            self.assertEqual(decisionNames, ["Decision " + str(index) for index in range(len(decisionRows))])
+
+    def testBadMatricesAreRefused(self):
+        self.assertRaises(ValueError, fa.evaluateParameterMatrix, np.zeros((2, 5)))
+        self.assertRaises(ValueError, fa.evaluateParameterMatrix, getMatrix(EXAMPLES["trolley"]), 2)
+        matrix = getMatrix(EXAMPLES["trolley"])
+        matrix[0, fa.DECISION_COLUMN] = -1
+        self.assertRaises(ValueError, fa.evaluateParameterMatrix, matrix)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Tests of the decisions benchmarked by Benchmarks/benchmark_scenarios.py against the reference of equivalence.py."""
+
+import os
+import sys
+import unittest
+
+from equivalence import (EXAMPLES, SELF_INTEREST_SCALES, checkBestDecisions, checkValues, getAllReferenceValues,
+                         getValues)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Benchmarks"))
+
+import numpy as np
+
+import benchmark_scenarios
+import felicific_arrays as fa
+
+
+class BenchmarkScenariosTest(unittest.TestCase):
+
+    def testScenariosEqualExamples(self):
+        self.assertEqual(benchmark_scenarios.SCENARIOS, EXAMPLES)
+
+    def testScaledRowsJitterOnlyTheMultiplier(self):
+        for scenario, templates in sorted(benchmark_scenarios.SCENARIOS.items()):
+            scaledRows = benchmark_scenarios.getScaledRows(scenario, 6, 5)
+            self.assertEqual(scaledRows, benchmark_scenarios.getScaledRows(scenario, 6, 5))
+            self.assertEqual([len(rows) for rows in scaledRows], [6] * 5)
+            for decision, rows in enumerate(scaledRows):
+                template = templates[decision % len(templates)]
+                for agent, (arguments, isDecisionMaker) in enumerate(rows):
+                    templateArguments, templateIsDecisionMaker = template[agent % len(template)]
+                    self.assertEqual(isDecisionMaker, templateIsDecisionMaker)
+                    self.assertEqual(arguments[:7] + arguments[8:], list(templateArguments[:7] + templateArguments[8:]))
+                    multiplier = templateArguments[benchmark_scenarios.MULTIPLIER]
+                    self.assertTrue(.5 * multiplier <= arguments[benchmark_scenarios.MULTIPLIER] <= 1.5 * multiplier)
+
+    def testDecisionsEqualReference(self):
+        for scenario in sorted(benchmark_scenarios.SCENARIOS):
+            for agentsPerDecision, decisions in ((1, 1), (4, 3), (50, 20)):
+                scaledRows = benchmark_scenarios.getScaledRows(scenario, agentsPerDecision, decisions)
+                benchmarked = benchmark_scenarios.buildDecisions(scaledRows)
+                decisionNames = [name for name, decision in benchmarked.getDecisions()]
+                for selfInterestScale in SELF_INTEREST_SCALES:
+                    # None leaves the decisions as built, without a self-interest scale
+                    if selfInterestScale is not None:
+                        benchmarked.setSelfInterestScale(selfInterestScale)
+                    expected = getAllReferenceValues(scaledRows, selfInterestScale)
+                    checkValues(self, getValues(benchmarked), expected)
+                    checkBestDecisions(self, benchmarked.getDecisionWithHighestValue(),
+                                       benchmarked.getDecisionWithLeastNegativeValue(), decisionNames, expected)
+
+    def testParameterMatrixEqualsReference(self):
+        # the matrix of the felicific_arrays stage, built as benchmark() builds it
+        for scenario in sorted(benchmark_scenarios.SCENARIOS):
+            scaledRows = benchmark_scenarios.getScaledRows(scenario, 40, 10)
+            matrix = np.array([list(arguments) + [0] * (16 - len(arguments)) + [index, isDecisionMaker]
+                               for index, rows in enumerate(scaledRows) for arguments, isDecisionMaker in rows],
+                              dtype=float)
+            result = fa.evaluateParameterMatrix(matrix, .5)
+            checkValues(self, list(zip(result.moralValues.tolist(), result.negativeMoralValues.tolist())),
+                        getAllReferenceValues(scaledRows, .5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""Tests of felicific_bundles against the reference values of every bundle, from equivalence.py."""
+
+import itertools
+import random
+import unittest
+
+from equivalence import ROUNDING_TOLERANCE, checkValue, getRandomRows, getReferenceValues
+
+import felicific_bundles
+
+
+def getAllowedBundles(actions, budget, minActions, maxActions, conflicts, requirements):
+    """Yields the names of every bundle of actions that meets the constraints."""
+    for count in range(minActions, (len(actions) if maxActions is None else maxActions) + 1):
+        for bundle in itertools.combinations(actions, count):
+            names = set(name for name, cost, required, rows in bundle)
+            if budget is not None and sum(cost for name, cost, required, rows in bundle) > budget:
+                continue
+            if any(required and name not in names for name, cost, required, rows in actions):
+                continue
+            if any(name in names and otherName in names for name, otherName in conflicts):
+                continue
+            if any(name in names and requiredName not in names for name, requiredName in requirements):
+                continue
+            yield bundle
+
+
+class BundleOptimizerTest(unittest.TestCase):
+
+    def testBestBundleEqualsBestDecision(self):
+        rng = random.Random(37)
+        for scenario in range(150):
+            # (name, cost, required, rows) of every action
+            actions = [("Action " + str(index), rng.choice((0, 1, 2, 5)), rng.random() < .1,
+                        getRandomRows(rng, 1, 4)[0]) for index in range(rng.randint(2, 7))]
+            names = [name for name, cost, required, rows in actions]
+            budget = rng.choice((None, 3, 8))
+            minActions = rng.choice((0, 0, 1, 2))
+            maxActions = rng.choice((None, minActions + 1, minActions + 3))
+            conflicts = [tuple(rng.sample(names, 2)) for conflict in range(rng.randint(0, 2))]
+            requirements = [tuple(rng.sample(names, 2)) for requirement in range(rng.randint(0, 2))]
+            negative = rng.random() < .3
+            selfInterestScale = rng.choice((None, 0, .5, 1))
+
+            optimizer = felicific_bundles.BundleOptimizer(budget, maxActions, minActions, negative)
+            for name, cost, required, rows in actions:
+                action = optimizer.addAction(name, cost, required)
+                for arguments, isDecisionMaker in rows:
+                    action.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+            for name, otherName in conflicts:
+                optimizer.addConflict(name, otherName)
+            for name, requiredName in requirements:
+                optimizer.addRequirement(name, requiredName)
+
+            # the reference value of every allowed bundle, from the rows of its actions
+            allowed = [set(name for name, cost, required, rows in bundle)
+                       for bundle in getAllowedBundles(actions, budget, minActions, maxActions, conflicts,
+                                                       requirements)]
+            if not allowed:
+                self.assertRaises(ValueError, optimizer.optimize, selfInterestScale)
+                continue
+            result = optimizer.optimize(selfInterestScale)
+            self.assertIn(set(result.actionNames), allowed)
+            self.assertEqual(result.actionNames, [name for name in names if name in result.actionNames])
+            best = max(getReferenceValues([row for name, cost, required, rows in actions if name in bundle
+                                           for row in rows], selfInterestScale)[negative] for bundle in allowed)
+            expected = getReferenceValues([row for name, cost, required, rows in actions if name in result.actionNames
+                                           for row in rows], selfInterestScale)
+            self.assertGreaterEqual(expected[negative], best - ROUNDING_TOLERANCE * max(1, abs(best)))
+            checkValue(self, result.moralValue, expected[0])
+            checkValue(self, result.negativeMoralValue, expected[1])
+            self.assertEqual(result.cost, sum(cost for name, cost, required, rows in actions
+                                              if name in result.actionNames))
+
+    def testConstraints(self):
+        # pleasures of 5, 4 and 3 costing 4, 2 and 2, and a pain of 2 that costs nothing
+        optimizer = felicific_bundles.BundleOptimizer(budget=4)
+        for name, value, cost in (("A", 5, 4), ("B", 4, 2), ("C", 3, 2), ("D", -2, 0)):
+            optimizer.addAction(name, cost).createAgent(value > 0, abs(value), 1, 1, 0, 0, 0, 1)
+        result = optimizer.optimize()
+        self.assertEqual((result.actionNames, result.moralValue, result.cost), (["B", "C"], 7, 4))
+        optimizer.addConflict("B", "C")
+        self.assertEqual(optimizer.optimize().actionNames, ["A"])
+        optimizer.addRequirement("A", "D")
+        self.assertEqual(optimizer.optimize().actionNames, ["B"])
+        optimizer.getAction("D").required = True
+        self.assertEqual((optimizer.optimize().actionNames, optimizer.optimize().moralValue), (["A", "D"], 3))
+        optimizer.minActions = 3
+        self.assertRaises(ValueError, optimizer.optimize)
+        self.assertRaises(ValueError, optimizer.addAction, "A")
+        self.assertRaises(KeyError, optimizer.addConflict, "A", "E")
+        self.assertRaises(ValueError, felicific_bundles.BundleOptimizer, maxActions=1, minActions=2)
+
+    def testManyActions(self):
+        # more actions than the recursion limit, of which the 10 most valuable fit in the budget
+        rng = random.Random(41)
+        values = rng.sample(range(1, 100000), 1200)
+        optimizer = felicific_bundles.BundleOptimizer(budget=50, maxActions=10)
+        for index, value in enumerate(values):
+            optimizer.addAction("Action " + str(index), 5).createAgent(True, value, 1, 1, 0, 0, 0, 1)
+        result = optimizer.optimize()
+        best = sorted(range(len(values)), key=lambda index: -values[index])[:10]
+        self.assertEqual(result.actionNames, ["Action " + str(index) for index in sorted(best)])
+        self.assertEqual((result.moralValue, result.cost), (sum(values[index] for index in best), 50))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Tests of felicific_cache against the reference calculus of equivalence.py."""
+
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from equivalence import (SELF_INTEREST_SCALES, buildEvaluation, checkBestDecisions, checkUnroundedValue, checkValue,
+                         checkValues, getAllReferenceValues, getDecisionNames, getReferenceConsequences,
+                         getReferenceValues, getScenarios)
+
+import felicific_cache
+import felicific_decay
+import felicific_scenario
+
+ROWS = [((False, 1, 2, 1, 1, 0, 0, 1), True), ((True, 3, 1, 1, 1, 0, 0, 1), False)]
+
+
+def evaluateInProcess(path, index):
+    # the rows of every process differ, and each process also evaluates ROWS, which any of them may have stored
+    with felicific_cache.EvaluationCache(path) as cache:
+        evaluations = cache.evaluateRows([("Mine", [((True, index + 1, 1, 1, 1, 0, 0, 1), False)]), ("Shared", ROWS)])
+    return [(evaluation.moralValue, evaluation.negativeMoralValue) for evaluation in evaluations]
+
+
+class EvaluationCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def checkRows(self, cache, decisionRows, selfInterestScale, decay):
+        evaluations = cache.evaluateRows(zip(getDecisionNames(decisionRows), decisionRows), selfInterestScale, decay)
+        self.assertEqual(len(evaluations), len(decisionRows))
+        for evaluation, rows in zip(evaluations, decisionRows):
+            moralValue, negativeMoralValue = getReferenceValues(rows, selfInterestScale, decay)
+            checkValue(self, evaluation.moralValue, moralValue)
+            checkValue(self, evaluation.negativeMoralValue, negativeMoralValue)
+            self.assertEqual(len(evaluation.agentValues), len(rows))
+            for (agentValue, agentNegativeValue, isDecisionMaker), (arguments, rowIsDecisionMaker) in zip(
+                    evaluation.agentValues, rows):
+                consequences = getReferenceConsequences(arguments, decay)
+                checkUnroundedValue(self, agentValue, sum(consequences))
+                checkUnroundedValue(self, agentNegativeValue, sum(min(value, 0) for value in consequences))
+                self.assertEqual(isDecisionMaker, rowIsDecisionMaker)
+
+    def testRowsEqualReference(self):
+        scenarios = getScenarios(23, count=8)
+        for decay in (None, felicific_decay.ExponentialDecay(.3)):
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                # evaluated, then read back from the cache and from the file by another cache
+                with felicific_cache.EvaluationCache(self.path) as cache:
+                    for decisionRows in scenarios:
+                        self.checkRows(cache, decisionRows, selfInterestScale, decay)
+                        self.checkRows(cache, decisionRows, selfInterestScale, decay)
+                with felicific_cache.EvaluationCache(self.path) as cache:
+                    for decisionRows in scenarios:
+                        self.checkRows(cache, decisionRows, selfInterestScale, decay)
+
+    def testScenarioEqualsReference(self):
+        scenarioPath = os.path.join(self.directory.name, "scenario.bin")
+        for decisionRows in getScenarios(24, count=4):
+            if not decisionRows:
+                continue
+            felicific_scenario.writeScenario(scenarioPath, buildEvaluation(decisionRows).getDecisions())
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                expected = getAllReferenceValues(decisionRows, selfInterestScale)
+                # the first lookup evaluates the file, the others read the values back, also from a reopened cache
+                for opening in range(2):
+                    with felicific_cache.EvaluationCache(self.path) as cache:
+                        for lookup in range(2):
+                            result = cache.evaluateScenario(scenarioPath, selfInterestScale)
+                            checkValues(self, list(zip(result.moralValues.tolist(),
+                                                       result.negativeMoralValues.tolist())), expected)
+                            checkBestDecisions(self, result.getDecisionWithHighestValue(),
+                                               result.getDecisionWithLeastNegativeValue(),
+                                               getDecisionNames(decisionRows), expected)
+
+    def testLookupsHitTheCache(self):
+        with felicific_cache.EvaluationCache(self.path) as cache:
+            self.assertEqual(cache.evaluateRows([("Decision", ROWS)])[0].moralValue, 1)
+            self.assertEqual(len(cache), 1)
+            # an evaluation stored under the key of the rows is returned instead of evaluating them
+            key = felicific_cache.getRowsKey(ROWS)
+            cache.put(key, felicific_cache.CachedEvaluation(42, -42, []))
+            self.assertEqual(len(cache), 1)
+            self.assertEqual(cache.evaluateRows([("Decision", ROWS)])[0].moralValue, 42)
+            # the scale and the decay are part of the key
+            self.assertEqual(cache.evaluateRows([("Decision", ROWS)], selfInterestScale=1)[0].moralValue, -2)
+            self.assertEqual(len(cache.evaluateRows([("Decision", ROWS)], decay=felicific_decay.HyperbolicDecay(1))
+                                 [0].agentValues), 2)
+            self.assertEqual(len(cache), 3)
+        with felicific_cache.EvaluationCache(self.path) as cache:
+            self.assertEqual(cache.get(key).moralValue, 42)
+            cache.clear()
+            self.assertEqual(len(cache), 0)
+            self.assertIsNone(cache.get(key))
+
+    def testEqualRowsShareTheirKey(self):
+        key = felicific_cache.getRowsKey(ROWS)
+        (arguments, isDecisionMaker), otherRow = ROWS
+        # lists, floats, numpy scalars and optional arguments given as 0 hold the same rows
+        for row in ((list(arguments), isDecisionMaker),
+                    (arguments[:1] + tuple(map(float, arguments[1:])), 1),
+                    (arguments[:1] + tuple(map(np.float64, arguments[1:])), np.bool_(isDecisionMaker)),
+                    (arguments + (0,) * 8, isDecisionMaker)):
+            self.assertEqual(felicific_cache.getRowsKey([row, otherRow]), key)
+        self.assertNotEqual(felicific_cache.getRowsKey([(arguments, False), otherRow]), key)
+        self.assertNotEqual(felicific_cache.getRowsKey(ROWS[::-1]), key)
+        # a row repeated as the same tuple or as equal tuples
+        row = (arguments, isDecisionMaker)
+        self.assertEqual(felicific_cache.getRowsKey([row, row]),
+                         felicific_cache.getRowsKey([(arguments, isDecisionMaker), (tuple(arguments), True)]))
+        # and equal scales and decays
+        self.assertEqual(felicific_cache.getRowsKey(ROWS, .5, felicific_decay.ExponentialDecay(np.float64(.2))),
+                         felicific_cache.getRowsKey(ROWS, np.float64(.5), felicific_decay.ExponentialDecay(.2)))
+        self.assertNotEqual(felicific_cache.getRowsKey(ROWS, decay=felicific_decay.ExponentialDecay(.2)),
+                            felicific_cache.getRowsKey(ROWS, decay=felicific_decay.HyperbolicDecay(.2)))
+
+    def testLeastRecentlyUsedAreEvicted(self):
+        keys = [bytes([index]) * 20 for index in range(5)]
+        with felicific_cache.EvaluationCache(self.path, maxEntries=3) as cache:
+            for index, key in enumerate(keys[:3]):
+                cache.put(key, felicific_cache.CachedEvaluation(index, 0, []))
+            # using the first evaluation makes the second the least recently used
+            self.assertEqual(cache.get(keys[0]).moralValue, 0)
+            cache.put(keys[3], felicific_cache.CachedEvaluation(3, 0, []))
+            self.assertEqual(len(cache), 3)
+            self.assertIsNone(cache.get(keys[1]))
+            # the third evaluation is now the least recently used
+            cache.put(keys[4], felicific_cache.CachedEvaluation(4, 0, []))
+            self.assertEqual(sorted(cache.getMany(keys)), [keys[0], keys[3], keys[4]])
+        self.assertRaises(ValueError, felicific_cache.EvaluationCache, self.path, 0)
+
+    def testProcessesShareTheFile(self):
+        with multiprocessing.get_context("spawn").Pool(2) as pool:
+            results = pool.starmap(evaluateInProcess, [(self.path, index) for index in range(4)])
+        self.assertEqual(results, [[(index + 1, 0), (1, -2)] for index in range(4)])
+        with felicific_cache.EvaluationCache(self.path) as cache:
+            self.assertEqual(len(cache), 5)
+            self.assertEqual(cache.get(felicific_cache.getRowsKey(ROWS)).moralValue, 1)
+            # what one process stores, another reads
+            cache.put(felicific_cache.getRowsKey(ROWS), felicific_cache.CachedEvaluation(7, 0, []))
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            self.assertEqual(pool.starmap(evaluateInProcess, [(self.path, 0)]), [[(1, 0), (7, 0)]])
+
+
+if __name__ == "__main__":
+    unittest.main()
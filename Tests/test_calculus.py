@@ -0,0 +1,326 @@
+"""Tests of felicific_calculus against the reference calculus of equivalence.py and the values of the examples."""
+
+import random
+import unittest
+
+from equivalence import (EXAMPLE_VALUES, EXAMPLES, SELF_INTEREST_SCALES, buildDecision, buildEvaluation,
+                         checkBestDecisions, checkUnroundedValue, checkValue, checkValues, getAllReferenceValues,
+                         getDecisionNames, getFullArguments, getRandomArguments, getReferenceConsequences,
+                         getReferencePartialValues, getReferenceValues, getScenarios, getValues)
+
+import felicific_calculus as fc
+
+
+class DecisionTest(unittest.TestCase):
+
+    def testExamplesEqualPrintedValues(self):
+        for scenario, decisionRows in EXAMPLES.items():
+            for selfInterestScale, values in EXAMPLE_VALUES[scenario].items():
+                checkValues(self, values, getAllReferenceValues(decisionRows, selfInterestScale))
+                self.assertEqual(getValues(buildEvaluation(decisionRows, selfInterestScale)), values)
+
+    def testAgentsEqualReference(self):
+        for decisionRows in getScenarios(19, count=20):
+            for rows in decisionRows:
+                for arguments, isDecisionMaker in rows:
+                    agent = fc.Agent(*arguments)
+                    expected = getReferenceConsequences(arguments)
+                    self.assertEqual(len(agent.getConsequences()), len(expected))
+                    for value, expectedValue in zip(agent.getConsequences(), expected):
+                        checkUnroundedValue(self, value, expectedValue)
+                    checkUnroundedValue(self, agent.getMoralValue(), sum(expected))
+                    checkUnroundedValue(self, agent.getNegativeMoralValue(), sum(min(value, 0) for value in expected))
+
+    def testDecisionsEqualReference(self):
+        for decisionRows in getScenarios(46):
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                evaluate = buildEvaluation(decisionRows, selfInterestScale)
+                expected = getAllReferenceValues(decisionRows, selfInterestScale)
+                checkValues(self, getValues(evaluate), expected)
+                checkValues(self, evaluate.getAllMoralValues(), expected)
+                for (decisionName, decision), rows in zip(evaluate.getDecisions(), decisionRows):
+                    self.assertEqual(decision.hasDecisionMaker(), any(isDecisionMaker for arguments, isDecisionMaker
+                                                                      in rows))
+                if decisionRows:
+                    checkBestDecisions(self, evaluate.getDecisionWithHighestValue(),
+                                       evaluate.getDecisionWithLeastNegativeValue(), getDecisionNames(decisionRows),
+                                       expected)
+
+
+class SelfInterestTest(unittest.TestCase):
+
+    def testMoralValueAtEqualsReference(self):
+        for decisionRows in getScenarios(5, count=10):
+            for rows in decisionRows:
+                decision = buildDecision(rows)
+                (decisionMakerValue, othersValue), (decisionMakerNegativeValue, othersNegativeValue) = \
+                    getReferencePartialValues(rows)
+                checkUnroundedValue(self, decision.getPartialMoralValues()[0], decisionMakerValue)
+                checkUnroundedValue(self, decision.getPartialMoralValues()[1], othersValue)
+                checkUnroundedValue(self, decision.getPartialNegativeMoralValues()[0], decisionMakerNegativeValue)
+                checkUnroundedValue(self, decision.getPartialNegativeMoralValues()[1], othersNegativeValue)
+                for selfInterestScale in (None, 0, .1, .25, .5, .9, 1):
+                    moralValue, negativeMoralValue = getReferenceValues(rows, selfInterestScale)
+                    checkValue(self, decision.getMoralValueAt(selfInterestScale), moralValue)
+                    checkValue(self, decision.getNegativeMoralValueAt(selfInterestScale), negativeMoralValue)
+
+    def testBestDecisionsEqualReference(self):
+        for decisionRows in getScenarios(6, count=40):
+            segments = buildEvaluation(decisionRows).getBestDecisionsBySelfInterest()
+            self.assertEqual(segments[0][0], 0)
+            self.assertEqual(segments[-1][1], 1)
+            for (lowest, highest, decisionName), following in zip(segments, segments[1:] + [None]):
+                if following is not None:
+                    self.assertEqual(highest, following[0])
+                    self.assertNotEqual(decisionName, following[2])
+                for selfInterestScale in (lowest + (highest - lowest) / 4, (lowest + highest) / 2):
+                    # the segments are found from the exact values, so the decision has the highest of them
+                    values = [moralValue for moralValue, negativeMoralValue
+                              in getAllReferenceValues(decisionRows, selfInterestScale)]
+                    index = getDecisionNames(decisionRows).index(decisionName)
+                    checkUnroundedValue(self, values[index], max(values))
+
+    def testCrossoversOfExamples(self):
+        # Pull Lever is best up to the scale at which both decisions are worth the same, Do Nothing after it
+        segments = buildEvaluation(EXAMPLES["trolley"]).getBestDecisionsBySelfInterest()
+        self.assertEqual([decisionName for lowest, highest, decisionName in segments], ["Decision 1", "Decision 0"])
+        (decisionMakerValue, othersValue), negativeValues = getReferencePartialValues(EXAMPLES["trolley"][0])
+        (otherDecisionMakerValue, otherOthersValue), negativeValues = getReferencePartialValues(EXAMPLES["trolley"][1])
+        crossover = (otherOthersValue - othersValue) / (
+            decisionMakerValue - othersValue - otherDecisionMakerValue + otherOthersValue)
+        checkUnroundedValue(self, buildEvaluation(EXAMPLES["trolley"]).getSelfInterestCrossovers()[0], crossover)
+
+
+class RunningTotalsTest(unittest.TestCase):
+
+    def testTotalsEqualReference(self):
+        for decisionRows in getScenarios(7, count=10):
+            for rows in decisionRows:
+                decision = fc.Decision()
+                for count, (arguments, isDecisionMaker) in enumerate(rows, 1):
+                    decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+                    # reading the values in between must not change the totals
+                    for selfInterestScale in SELF_INTEREST_SCALES:
+                        decision.setSelfInterestScale(selfInterestScale)
+                        moralValue, negativeMoralValue = getReferenceValues(rows[:count], selfInterestScale)
+                        checkValue(self, decision.getMoralValue(), moralValue)
+                        checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+
+    def testAddedConsequencesEqualReference(self):
+        rng = random.Random(8)
+        for decisionRows in getScenarios(9, count=10):
+            for rows in decisionRows:
+                decision = buildDecision(rows)
+                # the rows of every consequence added, by the decision maker flag of the agent
+                addedRows = list(rows)
+                for (agent, isDecisionMaker), (arguments, rowIsDecisionMaker) in zip(decision.getAgents(), rows):
+                    expected = getReferenceConsequences(arguments)
+                    if rng.random() < .5:
+                        addedArguments = getRandomArguments(rng)
+                        agent.addConsequence(*addedArguments)
+                        addedRows.append((addedArguments, isDecisionMaker))
+                        expected += getReferenceConsequences(addedArguments)
+                    for value, expectedValue in zip(agent.getConsequences(), expected):
+                        checkUnroundedValue(self, value, expectedValue)
+                    checkUnroundedValue(self, agent.getMoralValue(), sum(expected))
+                    checkUnroundedValue(self, agent.getNegativeMoralValue(), sum(min(value, 0) for value in expected))
+                for selfInterestScale in SELF_INTEREST_SCALES:
+                    decision.setSelfInterestScale(selfInterestScale)
+                    moralValue, negativeMoralValue = getReferenceValues(addedRows, selfInterestScale)
+                    checkValue(self, decision.getMoralValue(), moralValue)
+                    checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+
+
+class AgentTest(unittest.TestCase):
+
+    def testParametersEqualArguments(self):
+        for decisionRows in getScenarios(20, count=10):
+            for rows in decisionRows:
+                decision = buildDecision(rows)
+                self.assertEqual(decision.getParameterRows(), [(getFullArguments(arguments), isDecisionMaker)
+                                                               for arguments, isDecisionMaker in rows])
+                for (agent, isDecisionMaker), (arguments, rowIsDecisionMaker) in zip(decision.agents, rows):
+                    self.assertEqual(isDecisionMaker, rowIsDecisionMaker)
+                    self.assertEqual(agent.getParameters(), [getFullArguments(arguments)])
+
+    def testAppendedAgentsEqualReference(self):
+        for decisionRows in getScenarios(21, count=10):
+            for rows in decisionRows:
+                decision = fc.Decision()
+                # Decision.agents used to be a list of (Agent, isDecisionMaker), which callers appended to
+                decision.agents.extend((fc.Agent(*arguments), isDecisionMaker) for arguments, isDecisionMaker in rows)
+                self.assertEqual(len(decision.agents), len(rows))
+                self.assertEqual([isDecisionMaker for agent, isDecisionMaker in decision.agents],
+                                 [isDecisionMaker for arguments, isDecisionMaker in rows])
+                for selfInterestScale in SELF_INTEREST_SCALES:
+                    decision.setSelfInterestScale(selfInterestScale)
+                    moralValue, negativeMoralValue = getReferenceValues(rows, selfInterestScale)
+                    checkValue(self, decision.getMoralValue(), moralValue)
+                    checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+
+    def testAgentsViewCannotChange(self):
+        decision = buildDecision(EXAMPLES["trolley"][0])
+        with self.assertRaises(TypeError):
+            decision.agents[0] = decision.agents[1]
+        with self.assertRaises(TypeError):
+            del decision.agents[0]
+        self.assertEqual(len(decision.agents), 4)
+
+    def testAgentsKeepOnlyTheirArguments(self):
+        rng = random.Random(22)
+        for decisionRows in getScenarios(22, count=10):
+            for rows in decisionRows:
+                for arguments, isDecisionMaker in rows:
+                    agent = fc.Agent(*arguments)
+                    self.assertFalse(hasattr(agent, "__dict__"))
+                    # the 2nd order arguments of an agent without them are not stored
+                    self.assertEqual(len(agent.parameters), 8 if not any(getFullArguments(arguments)[8:]) else 16)
+                    self.assertEqual(agent.consequences, agent.getConsequences())
+                    with self.assertRaises(AttributeError):
+                        agent.consequences = []
+
+                    # added and changed consequences keep the arguments of every call
+                    addedArguments = getRandomArguments(rng)
+                    agent.addConsequence(*addedArguments)
+                    agent.setParameter("multiplier", 3)
+                    changedArguments = getFullArguments(arguments)
+                    changedArguments = changedArguments[:7] + (3,) + changedArguments[8:]
+                    self.assertEqual(agent.getParameters(), [changedArguments, getFullArguments(addedArguments)])
+                    expected = getReferenceConsequences(changedArguments) + getReferenceConsequences(addedArguments)
+                    for value, expectedValue in zip(agent.consequences, expected):
+                        checkUnroundedValue(self, value, expectedValue)
+                    checkUnroundedValue(self, agent.getMoralValue(), sum(expected))
+                    checkUnroundedValue(self, agent.getNegativeMoralValue(), sum(min(value, 0) for value in expected))
+
+
+def getRepeatedRows(rng, templates, agents):
+    # agents drawn from a few templates, so a pool shares them between decisions and within one
+    return [(rng.choice(templates), rng.random() < .2) for agent in range(agents)]
+
+
+class AgentPoolTest(unittest.TestCase):
+
+    def testPooledDecisionsEqualReference(self):
+        rng = random.Random(22)
+        for scenario in range(20):
+            pool = fc.AgentPool()
+            templates = [getRandomArguments(rng) for template in range(rng.randint(1, 6))]
+            decisionRows = [getRepeatedRows(rng, templates, rng.randint(0, 15)) for decision in range(10)]
+            pooled = fc.EvaluateDecisions()
+            for index, rows in enumerate(decisionRows):
+                decision = fc.Decision(pool=pool)
+                for arguments, isDecisionMaker in rows:
+                    decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+                pooled.addDecision("Decision " + str(index), decision)
+            # every template is stored once, however many decisions and agents use it
+            self.assertLessEqual(len(pool), len(templates))
+
+            for selfInterestScale in (.5, 0, 1):
+                pooled.setSelfInterestScale(selfInterestScale)
+                expected = getAllReferenceValues(decisionRows, selfInterestScale)
+                checkValues(self, getValues(pooled), expected)
+                checkBestDecisions(self, pooled.getDecisionWithHighestValue(),
+                                   pooled.getDecisionWithLeastNegativeValue(), getDecisionNames(decisionRows), expected)
+            for (name, decision), rows in zip(pooled.getDecisions(), decisionRows):
+                self.assertEqual(len(decision.agents), len(rows))
+                # a pooled decision holds its agents in the order the pool first saw them
+                self.assertEqual(sorted(decision.getParameterRows()),
+                                 sorted((getFullArguments(arguments), isDecisionMaker) for arguments, isDecisionMaker
+                                        in rows))
+
+    def testPooledAgentsAreShared(self):
+        pool = fc.AgentPool()
+        first, second = fc.Decision(pool=pool), fc.Decision(pool=pool)
+        for decision in (first, second, first):
+            decision.createAgent(False, 10, 1, 1, 1, 1, 0, 5)
+        self.assertEqual(len(pool), 1)
+        self.assertIs(first.agentList[0], second.agentList[0])
+        self.assertEqual([multiplicity for agent, isDecisionMaker, multiplicity in first.getAgentCounts()], [2])
+        self.assertEqual(first.getMoralValue(), -100)
+        self.assertEqual(second.getMoralValue(), -50)
+        self.assertRaises(ValueError, first.agentList[0].addConsequence, True, 1, 1, 1, 1, 0, 0, 1)
+
+
+class AgentParameterTest(unittest.TestCase):
+
+    def testChangedDecisionsEqualReference(self):
+        rng = random.Random(23)
+        for pooled in (False, True):
+            pool = fc.AgentPool() if pooled else None
+            templates = [getRandomArguments(rng) for template in range(8)]
+            # the rows are changed along with the decisions, which are checked against the reference values of the rows
+            decisionRows = [[(list(arguments), isDecisionMaker)
+                             for arguments, isDecisionMaker in getRepeatedRows(rng, templates, rng.randint(1, 8))]
+                            for decision in range(15)]
+            evaluate = fc.EvaluateDecisions()
+            # the position in agentList of the agent of every row, as a pooled decision holds repeated agents once
+            rowPositions = []
+            for index, rows in enumerate(decisionRows):
+                decision = fc.Decision(pool=pool)
+                for arguments, isDecisionMaker in rows:
+                    decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+                evaluate.addDecision("Decision " + str(index), decision)
+                rowPositions.append([decision.agentPositions[(id(pool.getAgent(*arguments)), isDecisionMaker)]
+                                     if pooled else position
+                                     for position, (arguments, isDecisionMaker) in enumerate(rows)])
+
+            selfInterestScale = None
+            for change in range(300):
+                index = rng.randrange(len(decisionRows))
+                decision = evaluate.getDecisions()[index][1]
+                position = rng.randrange(len(decision.agentList))
+                parameterIndex = rng.randrange(1, 16)
+                value = rng.choice((0, .5, 1, 2, 3, 10))
+                decision.setAgentParameter(position, fc.PARAMETER_NAMES[parameterIndex], value)
+                for (arguments, isDecisionMaker), rowPosition in zip(decisionRows[index], rowPositions[index]):
+                    if rowPosition == position:
+                        arguments[parameterIndex] = value
+                if change % 20 == 0:
+                    selfInterestScale = rng.choice((0, .3, 1))
+                    evaluate.setSelfInterestScale(selfInterestScale)
+
+                expected = getAllReferenceValues(decisionRows, selfInterestScale)
+                checkValues(self, getValues(evaluate), expected)
+                checkBestDecisions(self, evaluate.getDecisionWithHighestValue(),
+                                   evaluate.getDecisionWithLeastNegativeValue(), getDecisionNames(decisionRows),
+                                   expected)
+
+    def testTotalsAreSummedAgain(self):
+        rng = random.Random(24)
+        rows = [(list(getRandomArguments(rng)), rng.random() < .3) for agent in range(20)]
+        decision = buildDecision(rows)
+        # the changes are added to the totals, which are summed again from the agents every RESUM_INTERVAL changes
+        for change in range(3 * fc.RESUM_INTERVAL):
+            position = rng.randrange(len(rows))
+            parameterIndex = rng.randrange(1, 16)
+            value = rng.uniform(0, 10)
+            decision.setAgentParameter(position, fc.PARAMETER_NAMES[parameterIndex], value)
+            rows[position][0][parameterIndex] = value
+            if (change + 1) % fc.RESUM_INTERVAL == 0:
+                self.assertEqual(decision.changes, 0)
+                # summed in the same order, the totals are exactly those of a decision built with the new arguments
+                expected = buildDecision(rows)
+                self.assertEqual(decision.getPartialMoralValues(), expected.getPartialMoralValues())
+                self.assertEqual(decision.getPartialNegativeMoralValues(), expected.getPartialNegativeMoralValues())
+
+    def testReplacedDecisionsAreTracked(self):
+        decisionRows = [[((True, value, 1, 1, 0, 0, 0, 1), False)] for value in (1, 3, 2)]
+        evaluate = buildEvaluation(decisionRows)
+        self.assertEqual(evaluate.getDecisionWithHighestValue(), "Decision 1")
+        # an entry replaced in place, so the list keeps its length
+        replaced = evaluate.decisions[1][1]
+        evaluate.decisions[1] = ("Decision 1", buildDecision([((True, 1, 1, 1, 0, 0, 0, 1), False)]))
+        self.assertEqual(evaluate.getDecisionWithHighestValue(), "Decision 2")
+        # changes of the replaced decision no longer count, those of the new one do
+        replaced.setAgentParameter(0, "intensity", 10)
+        self.assertEqual(evaluate.getDecisionWithHighestValue(), "Decision 2")
+        evaluate.decisions[1][1].setAgentParameter(0, "intensity", 5)
+        self.assertEqual(evaluate.getDecisionWithHighestValue(), "Decision 1")
+        evaluate.decisions.append(("Decision 3", buildDecision([((True, 6, 1, 1, 0, 0, 0, 1), False)])))
+        self.assertEqual(evaluate.getDecisionWithHighestValue(), "Decision 3")
+        del evaluate.decisions[3]
+        self.assertEqual(evaluate.getDecisionWithHighestValue(), "Decision 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+"""Tests of felicific_cohort against the reference of equivalence.py with an agent per member, sample or bin."""
+
+import random
+import unittest
+
+from equivalence import (SELF_INTEREST_SCALES, checkUnroundedValue, checkValue, getRandomArguments,
+                         getReferenceValues, getScenarios)
+
+import felicific_calculus as fc
+import felicific_cohort
+import felicific_decay
+
+MULTIPLIERS = [fc.PARAMETER_NAMES.index(name) for name in ("multiplier", "f_multiplier", "p_multiplier")]
+
+
+class CohortAgentTest(unittest.TestCase):
+
+    def testNumericCohortsEqualReference(self):
+        for decay in (None, felicific_decay.ExponentialDecay(.2)):
+            for decisionRows in getScenarios(43, count=5):
+                for rows in decisionRows:
+                    decision = fc.Decision(decay=decay)
+                    for arguments, isDecisionMaker in rows:
+                        decision.createCohortAgent(*arguments, isDecisionMaker=isDecisionMaker)
+                    for selfInterestScale in SELF_INTEREST_SCALES:
+                        decision.setSelfInterestScale(selfInterestScale)
+                        moralValue, negativeMoralValue = getReferenceValues(rows, selfInterestScale, decay)
+                        checkValue(self, decision.getMoralValue(), moralValue)
+                        checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+
+    def testCohortOfRoad(self):
+        # a pain of 5 for 2 hours for 30 members, and of 1 for 2 hours for the other 70
+        agent = felicific_cohort.CohortAgent(False, felicific_cohort.Histogram([5, 1], [30, 70]), 2, 1, 0, 0, 0, 100)
+        self.assertAlmostEqual(agent.getMoralValue(), -440, delta=1e-9)
+        agent = felicific_cohort.CohortAgent.fromSamples(False, [(5, 2, 1, 0, 0, 0, 1), (1, 2, 1, 0, 0, 0, 1)], [30, 70])
+        self.assertAlmostEqual(agent.getMoralValue(), -440, delta=1e-9)
+        self.assertRaises(ValueError, felicific_cohort.Histogram, [])
+        self.assertRaises(ValueError, felicific_cohort.Histogram, [1, 2], [0, 0])
+
+    def testSamplesEqualAgentPerMember(self):
+        rng = random.Random(44)
+        for cohort in range(100):
+            isPleasure = rng.random() < .5
+            samples = [getRandomArguments(rng)[1:] for sample in range(rng.randint(1, 5))]
+            weights = [rng.randint(0, 4) for sample in samples]
+            agent = felicific_cohort.CohortAgent.fromSamples(isPleasure, samples, weights)
+            # every member is an agent of its own
+            moralValue, negativeMoralValue = getReferenceValues([((isPleasure,) + sample, False)
+                                                                 for sample, weight in zip(samples, weights)
+                                                                 for member in range(weight)])
+            checkUnroundedValue(self, agent.getMoralValue(), moralValue)
+            checkUnroundedValue(self, agent.getNegativeMoralValue(), negativeMoralValue)
+
+    def testHistogramEqualsAgentPerBin(self):
+        rng = random.Random(45)
+        for cohort in range(100):
+            arguments = list(getRandomArguments(rng))
+            # one parameter differs between the members, the agent of every bin stands for the members in it
+            index = rng.randrange(1, 16)
+            values = [rng.choice((0, .5, 1, 2, rng.uniform(0, 10))) for value in range(rng.randint(1, 4))]
+            counts = [rng.randint(1, 5) for value in values]
+            histogram = felicific_cohort.Histogram(values, counts)
+            agent = felicific_cohort.CohortAgent(*(arguments[:index] + [histogram] + arguments[index + 1:]))
+
+            rows = []
+            for value, count in zip(values, counts):
+                binArguments = arguments[:index] + [value] + arguments[index + 1:]
+                # the share of the members in the bin scales the multipliers of every consequence
+                for multiplier in MULTIPLIERS:
+                    binArguments[multiplier] *= count / sum(counts)
+                rows.append((binArguments, False))
+            moralValue, negativeMoralValue = getReferenceValues(rows)
+            checkUnroundedValue(self, agent.getMoralValue(), moralValue)
+            checkUnroundedValue(self, agent.getNegativeMoralValue(), negativeMoralValue)
+
+
+if __name__ == "__main__":
+    unittest.main()
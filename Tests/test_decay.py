@@ -0,0 +1,106 @@
+"""Tests of felicific_decay against the reference calculus of equivalence.py and hard-coded factors."""
+
+import unittest
+
+from equivalence import (SELF_INTEREST_SCALES, buildDecision, checkUnroundedValue, checkValue, getFactor,
+                         getReferenceConsequences, getReferenceValues, getScenarios)
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_calculus as fc
+import felicific_decay
+
+DECAYS = (felicific_decay.PowerLawDecay(.3), felicific_decay.ExponentialDecay(.2), felicific_decay.HyperbolicDecay(.5))
+
+TABLE = felicific_decay.TableDecay([(4, .5), (1, 1), (10, .2)])
+
+PROPINQUITIES = [0, 1, 2, 3, .5, .7, 1.25, 7.5, 9.99, 1023, 1024, 5000.5]
+
+
+class DecayTest(unittest.TestCase):
+
+    def testFactorsEqualFormulas(self):
+        for decay in DECAYS + (felicific_decay.DEFAULT_DECAY,):
+            factor = getFactor(decay)
+            values = decay.getValues(np.array(PROPINQUITIES)).tolist()
+            for propinquity, value in zip(PROPINQUITIES, values):
+                checkUnroundedValue(self, decay.getValue(propinquity), factor(propinquity))
+                checkUnroundedValue(self, value, factor(propinquity))
+            for propinquity in (-1, -.5):
+                self.assertRaises(ValueError, decay.getValue, propinquity)
+                self.assertRaises(ValueError, decay.getValues, np.array([1, propinquity]))
+
+    def testTableInterpolates(self):
+        # the points are sorted, and the factors of the first and last point hold beyond them
+        expected = {0: 1, .5: 1, 1: 1, 2: 1 - .5 / 3, 4: .5, 7: .35, 10: .2, 20: .2, 5000.5: .2}
+        for propinquity, factor in expected.items():
+            self.assertAlmostEqual(TABLE.getValue(propinquity), factor, delta=1e-12)
+        np.testing.assert_allclose(TABLE.getValues(np.array(list(expected))), list(expected.values()), atol=1e-12)
+        np.testing.assert_allclose(TABLE.getDerivatives(np.array([0, .5, 2, 7, 20])), [0, 0, -.5 / 3, -.05, 0])
+        self.assertRaises(ValueError, felicific_decay.TableDecay, [])
+
+    def testDerivativesEqualFormulas(self):
+        propinquities = np.array([.5, 1, 3, 7.5])
+        np.testing.assert_allclose(felicific_decay.PowerLawDecay(.3).getDerivatives(propinquities),
+                                   -.3 * propinquities ** -1.3)
+        np.testing.assert_allclose(felicific_decay.ExponentialDecay(.2).getDerivatives(propinquities),
+                                   -.2 * np.exp(-.2 * propinquities))
+        np.testing.assert_allclose(felicific_decay.HyperbolicDecay(.5).getDerivatives(propinquities),
+                                   -.5 / (1 + .5 * propinquities) ** 2)
+        self.assertEqual(felicific_decay.ExponentialDecay(.2).getDerivatives(np.array([0.])).tolist(), [0])
+
+    def testDecaysByName(self):
+        self.assertIs(felicific_decay.getDecay(), felicific_decay.DEFAULT_DECAY)
+        self.assertEqual(felicific_decay.getDecay("power"), felicific_decay.PowerLawDecay(.1))
+        self.assertEqual(felicific_decay.getDecay("exponential", .2), felicific_decay.ExponentialDecay(.2))
+        self.assertNotEqual(felicific_decay.ExponentialDecay(.2), felicific_decay.HyperbolicDecay(.2))
+        self.assertEqual(hash(TABLE), hash(felicific_decay.TableDecay([(1, 1), (4, .5), (10, .2)])))
+        self.assertRaises(ValueError, felicific_decay.getDecay, "logarithmic")
+        # a table has no default points, so it can only be named together with them
+        self.assertRaises(ValueError, felicific_decay.getDecay, "table")
+        self.assertRaises(ValueError, felicific_decay.getDecay, "exponential", .2, .3)
+        self.assertRaises(ValueError, fc.Decision, decay="table")
+        self.assertEqual(felicific_decay.getDecay("table", [(4, .5), (1, 1), (10, .2)]), TABLE)
+
+    def testDecisionsEqualReference(self):
+        for decay in (None, "power") + DECAYS:
+            referenceDecay = felicific_decay.getDecay(decay)
+            for decisionRows in getScenarios(31, count=10):
+                for rows in decisionRows:
+                    decision = buildDecision(rows, decay=decay)
+                    for (agent, isDecisionMaker), (arguments, rowIsDecisionMaker) in zip(decision.agents, rows):
+                        expected = getReferenceConsequences(arguments, referenceDecay)
+                        self.assertEqual(len(agent.getConsequences()), len(expected))
+                        for value, expectedValue in zip(agent.getConsequences(), expected):
+                            checkUnroundedValue(self, value, expectedValue)
+                    moralValue, negativeMoralValue = getReferenceValues(rows, decay=referenceDecay)
+                    checkValue(self, decision.getMoralValue(), moralValue)
+                    checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+
+    def testTableDecisions(self):
+        # a pain of 2 * 3 at a propinquity of 7 and a pleasure of 10 at 2, whose purity of .5 * 4 is at 20
+        rows = [((False, 2, 3, 1, 7, 0, 0, 1), True), ((True, 10, 1, 1, 2, 0, .5, 1, 0, 0, 0, 0, 4, 1, 20, 1), False)]
+        expected = round(-6 * .35 + 10 * (1 - .5 / 3) - 2 * .2, 2)
+        self.assertEqual(buildDecision(rows, decay=TABLE).getMoralValue(), expected)
+        decision = fa.ArrayDecision(decay=TABLE)
+        for arguments, isDecisionMaker in rows:
+            decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+        self.assertEqual(decision.getMoralValue(), expected)
+
+    def testArrayDecisionsEqualReference(self):
+        for decay in DECAYS:
+            for decisionRows in getScenarios(32, count=5):
+                for rows in decisionRows:
+                    decision = fa.ArrayDecision(decay=decay)
+                    for arguments, isDecisionMaker in rows:
+                        decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+                    for selfInterestScale in SELF_INTEREST_SCALES:
+                        decision.setSelfInterestScale(selfInterestScale)
+                        moralValue, negativeMoralValue = getReferenceValues(rows, selfInterestScale, decay)
+                        checkValue(self, decision.getMoralValue(), moralValue)
+                        checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests of felicific_ingest against the reference calculus of equivalence.py."""
+
+import csv
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from equivalence import (SELF_INTEREST_SCALES, checkBestDecisions, checkUnroundedValue, checkValues,
+                         getAllReferenceValues, getDecisionNames, getReferenceConsequences, getScenarios)
+
+import felicific_decay
+import felicific_ingest
+
+DECAYS = (None, felicific_decay.ExponentialDecay(.2), felicific_decay.HyperbolicDecay(.5))
+HEADER = ["decision", "agent", "isDecisionMaker"] + list(felicific_ingest.FIELDS)
+
+
+def getRecords(decisionRows):
+    """Returns a record of every agent, as a dictionary of the columns of a scenario file."""
+    return [dict(zip(HEADER, ["Decision " + str(index), "Agent " + str(agent), isDecisionMaker] + list(arguments)))
+            for index, rows in enumerate(decisionRows) for agent, (arguments, isDecisionMaker) in enumerate(rows)]
+
+
+def writeCsv(file, records):
+    writer = csv.DictWriter(file, HEADER)
+    writer.writeheader()
+    writer.writerows(records)
+
+
+def writeJsonl(file, records):
+    for record in records:
+        file.write(json.dumps(record) + "\n")
+
+
+class IngestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def writeScenarios(self, decisionRows):
+        """Writes the decisions as every kind of scenario file and returns their paths."""
+        records = getRecords(decisionRows)
+        paths = []
+        for name, write in (("scenario.csv", writeCsv), ("scenario.jsonl", writeJsonl)):
+            path = os.path.join(self.directory.name, name)
+            with open(path, "w", encoding="utf-8", newline="") as file:
+                write(file, records)
+            with gzip.open(path + ".gz", "wt", encoding="utf-8", newline="") as file:
+                write(file, records)
+            paths += [path, path + ".gz"]
+        return paths
+
+    def testIngestEqualsReference(self):
+        for decisionRows in getScenarios(25, count=10):
+            # decisions without agents have no rows in a scenario file
+            decisionRows = [rows for rows in decisionRows if rows]
+            if not decisionRows:
+                continue
+            for path in self.writeScenarios(decisionRows):
+                for decay in DECAYS:
+                    result = felicific_ingest.ingestScenario(path, chunkSize=3, decay=decay)
+                    decisionNames = getDecisionNames(decisionRows)
+                    self.assertEqual(list(result.decisionNames), decisionNames)
+                    for selfInterestScale in SELF_INTEREST_SCALES:
+                        expected = getAllReferenceValues(decisionRows, selfInterestScale, decay)
+                        checkValues(self, list(zip(result.getMoralValues(selfInterestScale).tolist(),
+                                                   result.getNegativeMoralValues(selfInterestScale).tolist())),
+                                    expected)
+                        checkBestDecisions(self, result.getDecisionWithHighestValue(selfInterestScale),
+                                           result.getDecisionWithLeastNegativeValue(selfInterestScale),
+                                           decisionNames, expected)
+
+    def testAgentValuesEqualReference(self):
+        for decisionRows in getScenarios(26, count=5):
+            decisionRows = [rows for rows in decisionRows if rows]
+            for path in self.writeScenarios(decisionRows)[:1]:
+                result = felicific_ingest.ingestScenario(path, chunkSize=3)
+                for index, rows in enumerate(decisionRows):
+                    agentValues = result.getAgentValues("Decision " + str(index))
+                    self.assertEqual(len(agentValues), len(rows))
+                    for agent, (arguments, isDecisionMaker) in enumerate(rows):
+                        moralValue, negativeMoralValue = agentValues["Agent " + str(agent)]
+                        consequences = getReferenceConsequences(arguments)
+                        checkUnroundedValue(self, moralValue, sum(consequences))
+                        checkUnroundedValue(self, negativeMoralValue, sum(min(value, 0) for value in consequences))
+
+    def testRowsOfText(self):
+        # optional columns left empty, flags as words, agents spread over several rows and a row giving its value
+        path = os.path.join(self.directory.name, "scenario.csv")
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            file.write("decision,agent,isDecisionMaker,isPleasure,intensity,duration,certainty,propinquity,fecundity,"
+                       "purity,multiplier,value\n"
+                       "Build,Me,yes,true,5,2,1,0,0,0,1,\n"
+                       "Build,Town,no,false,1,3,1,0,0,0,10,\n"
+                       "Build,Town,,,,,,,,,,-4\n"
+                       "Wait,Me,y,no,2,1,1,0,0,0,1,\n")
+        result = felicific_ingest.ingestScenario(path, chunkSize=2)
+        self.assertEqual(result.decisionNames, ["Build", "Wait"])
+        self.assertEqual(result.getMoralValues().tolist(), [10 - 30 - 4, -2])
+        self.assertEqual(result.getMoralValues(1).tolist(), [10, -2])
+        self.assertEqual(result.getNegativeMoralValues(0).tolist(), [-34, 0])
+        self.assertEqual(result.getDecisionWithHighestValue(), "Wait")
+        self.assertEqual(result.getAgentValues("Build"), {"Me": (10, 0), "Town": (-34, -34)})
+
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            file.write("decision,intensity\nBuild,5\n")
+        self.assertRaises(ValueError, felicific_ingest.ingestScenario, path)
+        # the format is only guessed from the name
+        self.assertRaises(ValueError, felicific_ingest.ingestScenario,
+                          os.path.join(self.directory.name, "scenario.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests of felicific_instrumentation: instrumented evaluations against the reference calculus of equivalence.py."""
+
+import os
+import tempfile
+import unittest
+
+from equivalence import (EXAMPLES, SELF_INTEREST_SCALES, buildEvaluation, checkBestDecisions, checkValues,
+                         getAllReferenceValues, getDecisionNames, getReferenceConsequences, getScenarios, getValues)
+
+import felicific_instrumentation
+
+
+def checkEvaluation(testCase, decisionRows):
+    """Evaluates the rows with every self-interest scale, checking the values and best decisions against the reference."""
+    evaluate = buildEvaluation(decisionRows)
+    for selfInterestScale in SELF_INTEREST_SCALES:
+        if selfInterestScale is not None:
+            evaluate.setSelfInterestScale(selfInterestScale)
+        expected = getAllReferenceValues(decisionRows, selfInterestScale)
+        checkValues(testCase, getValues(evaluate), expected)
+        checkBestDecisions(testCase, evaluate.getDecisionWithHighestValue(),
+                           evaluate.getDecisionWithLeastNegativeValue(), getDecisionNames(decisionRows), expected)
+    return evaluate
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def tearDown(self):
+        felicific_instrumentation.disable()
+
+    def testInstrumentedEvaluationsEqualReference(self):
+        scenarios = [decisionRows for decisionRows in getScenarios(40, count=10) if decisionRows]
+        for trackAllocations in (False, True):
+            recorder = felicific_instrumentation.enable(trackAllocations=trackAllocations)
+            for decisionRows in scenarios:
+                checkEvaluation(self, decisionRows)
+            felicific_instrumentation.disable()
+
+            rows = [row for decisionRows in scenarios for decisionRow in decisionRows for row in decisionRow]
+            self.assertEqual(recorder.counters["agentsCreated"], len(rows))
+            self.assertEqual(recorder.counters["consequencesCreated"],
+                             sum(len(getReferenceConsequences(arguments)) for arguments, isDecisionMaker in rows))
+            snapshot = recorder.getSnapshot()
+            self.assertEqual(snapshot["timers"]["Decision.createAgent"]["calls"], len(rows))
+            self.assertEqual("allocations" in snapshot, trackAllocations)
+
+    def testDisableRestoresDecision(self):
+        methods = [(owner, name, owner.__dict__[name])
+                   for owner, name, counter, size, kind in felicific_instrumentation.INSTRUMENTED]
+        felicific_instrumentation.enable()
+        self.assertTrue(felicific_instrumentation.isEnabled())
+        felicific_instrumentation.disable()
+        self.assertFalse(felicific_instrumentation.isEnabled())
+        for owner, name, method in methods:
+            self.assertIs(owner.__dict__[name], method)
+
+    def testProfileEqualsReference(self):
+        for decisionRows in getScenarios(41, count=5):
+            if not decisionRows:
+                continue
+            with felicific_instrumentation.profile() as report:
+                checkEvaluation(self, decisionRows)
+            self.assertEqual(report.snapshot["counters"]["agentsCreated"], sum(map(len, decisionRows)))
+            self.assertEqual(len(report.decisions), min(10, len(decisionRows)))
+            for name, seconds, agents in report.decisions:
+                self.assertIn(agents, [len(rows) for rows in decisionRows])
+            self.assertFalse(felicific_instrumentation.isEnabled())
+
+    def testExporters(self):
+        recorder = felicific_instrumentation.enable()
+        checkEvaluation(self, EXAMPLES["lifeboat"])
+        felicific_instrumentation.disable()
+        # the lifeboat problem has 3 decisions of 4 agents, 7 of them with one consequence and 5 with two
+        self.assertEqual(recorder.counters["agentsCreated"], 12)
+        self.assertEqual(recorder.counters["consequencesCreated"], 17)
+
+        snapshot = {"counters": {"agentsCreated": 12}, "timers": {"Decision.createAgent": {
+            "calls": 12, "seconds": .5, "maxSeconds": .25}}}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "felicific.prom")
+            felicific_instrumentation.PrometheusExporter(path).export(snapshot)
+            with open(path) as file:
+                self.assertEqual(file.read().splitlines(), [
+                    "# TYPE felicific_agents_created_total counter", "felicific_agents_created_total 12",
+                    "# TYPE felicific_stage_calls_total counter",
+                    'felicific_stage_calls_total{stage="Decision.createAgent"} 12',
+                    "# TYPE felicific_stage_seconds_total counter",
+                    'felicific_stage_seconds_total{stage="Decision.createAgent"} 0.5',
+                    "# TYPE felicific_stage_max_seconds gauge",
+                    'felicific_stage_max_seconds{stage="Decision.createAgent"} 0.25'])
+            self.assertEqual(os.listdir(directory), ["felicific.prom"])
+
+if __name__ == "__main__":
+    unittest.main()
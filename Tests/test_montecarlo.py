@@ -0,0 +1,70 @@
+"""Tests of felicific_montecarlo against the reference calculus of equivalence.py."""
+
+import unittest
+
+from equivalence import SELF_INTEREST_SCALES, checkValue, getAllReferenceValues, getBestIndexes, getScenarios
+
+import numpy as np
+
+import felicific_montecarlo as mc
+
+
+def buildMonteCarlo(decisionRows, certain=False, seed=1):
+    """Returns a MonteCarloEvaluation of the rows, with every intensity given as a single-valued distribution."""
+    evaluation = mc.MonteCarloEvaluation(seed=seed)
+    for index, rows in enumerate(decisionRows):
+        decision = evaluation.addDecision("Decision " + str(index))
+        for arguments, isDecisionMaker in rows:
+            if not certain:
+                arguments = arguments[:1] + (mc.Empirical([arguments[1]]),) + arguments[2:]
+            decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+    return evaluation
+
+
+class MonteCarloTest(unittest.TestCase):
+
+    def testCertainSamplesEqualReference(self):
+        for decisionRows in getScenarios(10):
+            if not decisionRows:
+                continue
+            for certain in (True, False):
+                evaluation = buildMonteCarlo(decisionRows, certain)
+                for selfInterestScale in SELF_INTEREST_SCALES:
+                    expected = [moralValue for moralValue, negativeMoralValue
+                                in getAllReferenceValues(decisionRows, selfInterestScale)]
+                    result = evaluation.run(5, selfInterestScale, batchSize=2)
+                    self.assertEqual(result.moralValues.shape, (5, len(decisionRows)))
+                    for sample in result.moralValues.tolist():
+                        for value, expectedValue in zip(sample, expected):
+                            checkValue(self, value, expectedValue)
+                    best = getBestIndexes(expected)
+                    if len(best) == 1:
+                        self.assertEqual(result.getProbabilityBest()["Decision " + str(best[0])], 1)
+
+    def testSamplesFollowDistribution(self):
+        # the intensity of the only agent of "Uncertain" is 1 or 3, with weights 1 and 3: -5 or -15 against -10
+        evaluation = mc.MonteCarloEvaluation(seed=3)
+        evaluation.addDecision("Uncertain").createAgent(False, mc.Empirical([1, 3], [1, 3]), 5, 1, 0, 0, 0, 1)
+        evaluation.addDecision("Certain").createAgent(False, 2, 5, 1, 0, 0, 0, 1)
+        result = evaluation.run(20000, batchSize=3000)
+        uncertain = result.getDistribution("Uncertain")
+        self.assertEqual(set(uncertain.tolist()), {-5.0, -15.0})
+        self.assertEqual(set(result.getDistribution("Certain").tolist()), {-10.0})
+        self.assertAlmostEqual(result.getProbabilityBest()["Uncertain"], .25, delta=.015)
+        self.assertAlmostEqual(result.getMeans()["Uncertain"], -12.5, delta=.15)
+        np.testing.assert_array_equal(result.getQuantiles((0, 1))["Uncertain"], [-15, -5])
+
+    def testRunsAreReproducible(self):
+        evaluation = mc.MonteCarloEvaluation(seed=2)
+        decision = evaluation.addDecision("Uncertain")
+        decision.createAgent(False, 10, 1, mc.Beta(7, 3), 1, 0, 0, mc.Empirical([3, 5, 7], [1, 2, 1]))
+        decision.createAgent(True, mc.Triangular(1, 2, 5), 1, 1, 1, 0, 0, 1, isDecisionMaker=True)
+        evaluation.addDecision("Certain").createAgent(True, 5, 3, 1, 1, 1, 0, 9, 0, 0, 0, 0, 3, 8, 1, 9)
+        # the samples only depend on the seed and the batches, not on the processes they are drawn in
+        expected = evaluation.run(50, batchSize=7).moralValues
+        np.testing.assert_array_equal(evaluation.run(50, batchSize=7).moralValues, expected)
+        np.testing.assert_array_equal(evaluation.run(50, batchSize=7, processes=2).moralValues, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
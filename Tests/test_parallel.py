@@ -0,0 +1,73 @@
+"""Tests of felicific_parallel against the reference calculus of equivalence.py and the serial evaluation."""
+
+import os
+import tempfile
+import unittest
+
+from equivalence import (buildDecision, buildEvaluation, checkBestDecisions, checkValues, getAllReferenceValues,
+                         getDecisionNames, getScenarios)
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_calculus as fc
+import felicific_decay
+import felicific_parallel
+import felicific_scenario
+
+
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        # few scenarios with many decisions, as every evaluation starts a pool of processes
+        self.scenarios = getScenarios(14, count=2, decisions=30)
+
+    def checkResult(self, result, decisionRows, selfInterestScale):
+        expected = getAllReferenceValues(decisionRows, selfInterestScale)
+        checkValues(self, list(zip(result.moralValues.tolist(), result.negativeMoralValues.tolist())), expected)
+        checkBestDecisions(self, result.getDecisionWithHighestValue(), result.getDecisionWithLeastNegativeValue(),
+                           getDecisionNames(decisionRows), expected)
+
+    def testParameterMatrixEqualsReference(self):
+        for decisionRows in self.scenarios:
+            matrix, decisionNames = fa.getParameterMatrix(buildEvaluation(decisionRows).getDecisions())
+            result = felicific_parallel.evaluateParameterMatrix(matrix, .5, decisionNames, workers=2, chunkSize=5)
+            self.checkResult(result, decisionRows, .5)
+            # the chunks are summed in the order of the serial evaluation, so the values are exactly the same
+            serial = fa.evaluateParameterMatrix(matrix, .5, decisionNames, chunkSize=5)
+            np.testing.assert_array_equal(result.moralValues, serial.moralValues)
+            np.testing.assert_array_equal(result.negativeMoralValues, serial.negativeMoralValues)
+
+    def testScenarioEqualsReference(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "scenario.bin")
+            for decisionRows in self.scenarios:
+                felicific_scenario.writeScenario(path, buildEvaluation(decisionRows).getDecisions())
+                for selfInterestScale in (None, .3):
+                    self.checkResult(felicific_parallel.evaluateScenario(path, selfInterestScale, workers=2,
+                                                                         chunkSize=7), decisionRows, selfInterestScale)
+
+    def testEvaluateDecisionsEqualsReference(self):
+        for decisionRows in self.scenarios:
+            for selfInterestScale, chunkSize in ((None, None), (.3, 7)):
+                evaluate = fc.EvaluateDecisions(parallel=True, workers=2, chunkSize=chunkSize)
+                for index, rows in enumerate(decisionRows):
+                    evaluate.addDecision("Decision " + str(index), buildDecision(rows))
+                if selfInterestScale is not None:
+                    evaluate.setSelfInterestScale(selfInterestScale)
+                expected = getAllReferenceValues(decisionRows, selfInterestScale)
+                checkValues(self, evaluate.getAllMoralValues(), expected)
+                checkBestDecisions(self, evaluate.getDecisionWithHighestValue(),
+                                   evaluate.getDecisionWithLeastNegativeValue(), getDecisionNames(decisionRows),
+                                   expected)
+
+        # the parameter matrix is evaluated with one decay
+        evaluate = fc.EvaluateDecisions(parallel=True, workers=2)
+        evaluate.addDecision("Power law", buildDecision(self.scenarios[0][0]))
+        evaluate.addDecision("Exponential", buildDecision(self.scenarios[0][1],
+                                                          decay=felicific_decay.ExponentialDecay()))
+        self.assertRaises(ValueError, evaluate.getAllMoralValues)
+
+
+if __name__ == "__main__":
+    unittest.main()
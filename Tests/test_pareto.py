@@ -0,0 +1,73 @@
+"""Tests of felicific_pareto against a pairwise comparison of the values of the reference of equivalence.py."""
+
+import itertools
+import random
+import unittest
+
+from equivalence import buildEvaluation, getReferencePartialValues, getRoundings, getScenarios, scaleValues
+
+import felicific_calculus as fc
+import felicific_pareto
+
+
+def getPairwiseParetoOptimal(points):
+    """Compares every pair of points, keeping those no other point is at least as good as everywhere and better in."""
+    return [index for index, point in enumerate(points)
+            if not any(all(value >= pointValue for value, pointValue in zip(other, point)) and other != point
+                       for other in points)]
+
+
+def getObjectiveValues(rows, selfInterestScale):
+    """
+    Returns the reference values of the objectives of a decision, with the moral values rounded as EvaluateDecisions
+    rounds them, or None if one is within a rounding error of half a cent.
+    """
+    partialValues, partialNegativeValues = getReferencePartialValues(rows)
+    roundings = [getRoundings(scaleValues(*values, selfInterestScale))
+                 for values in (partialValues, partialNegativeValues)]
+    if any(len(rounding) > 1 for rounding in roundings):
+        return None
+    (moralValue,), (negativeMoralValue,) = roundings
+    return {"total": moralValue, "negative": negativeMoralValue, "decisionMaker": partialValues[0],
+            "others": partialValues[1]}
+
+
+class ParetoTest(unittest.TestCase):
+
+    def testSkylinesEqualPairwiseComparison(self):
+        rng = random.Random(35)
+        for dimensions in range(1, 6):
+            for sample in range(200):
+                # few distinct values, so that points are often equal in some or all objectives
+                values = rng.choice(((0, 1, 2), (0, .5, 1, 1.5, 2, 3), tuple(range(50))))
+                points = [tuple(rng.choice(values) for dimension in range(dimensions))
+                          for point in range(rng.randint(0, 40))]
+                self.assertEqual(felicific_pareto.getParetoOptimal(points), getPairwiseParetoOptimal(points))
+
+    def testSkylines(self):
+        points = [(1, 5), (2, 4), (2, 4), (1, 1), (3, 1), (0, 6), (3, 0)]
+        self.assertEqual(felicific_pareto.getParetoOptimal(points), [0, 1, 2, 4, 5])
+        self.assertEqual(felicific_pareto.getParetoOptimal([(1, 1, 1), (0, 2, 0), (1, 1, 0), (0, 0, 2)]), [0, 1, 3])
+        self.assertEqual(felicific_pareto.getParetoOptimal([(1, 0, 0, 0), (0, 0, 0, 1), (0, 0, 0, 0)]), [0, 1])
+        self.assertEqual(felicific_pareto.getParetoOptimal([(3,), (1,), (3,)]), [0, 2])
+        self.assertEqual(felicific_pareto.getParetoOptimal([]), [])
+        self.assertRaises(ValueError, felicific_pareto.getParetoOptimal, [(1, 2), (1, 2, 3)])
+
+    def testDecisionsEqualPairwiseComparison(self):
+        objectiveSets = [objectives for count in range(1, 5)
+                         for objectives in itertools.combinations(fc.EvaluateDecisions.OBJECTIVES, count)]
+        for decisionRows in getScenarios(36, count=20, decisions=12):
+            for selfInterestScale in (None, .5):
+                evaluate = buildEvaluation(decisionRows, selfInterestScale)
+                values = [getObjectiveValues(rows, selfInterestScale) for rows in decisionRows]
+                if None in values:
+                    continue
+                for objectives in objectiveSets:
+                    points = [tuple(decisionValues[objective] for objective in objectives) for decisionValues in values]
+                    self.assertEqual(evaluate.getParetoOptimalDecisions(objectives),
+                                     [evaluate.getDecisions()[index][0] for index in getPairwiseParetoOptimal(points)])
+        self.assertRaises(ValueError, evaluate.getParetoOptimalDecisions, ["total", "fairness"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+"""Tests of felicific_results against the reference calculus of equivalence.py."""
+
+import csv
+import io
+import json
+import os
+import pathlib
+import tempfile
+import unittest
+
+from equivalence import EXAMPLES, SELF_INTEREST_SCALES, buildEvaluation, checkValue, getAllReferenceValues, getScenarios
+
+import numpy as np
+
+import felicific_calculus as fc
+import felicific_results
+
+
+class ResultsTest(unittest.TestCase):
+
+    def checkResults(self, results, decisionRows, selfInterestScale):
+        """Checks (name, moral value, negative moral value, scale, has decision maker) against the reference."""
+        expected = getAllReferenceValues(decisionRows, selfInterestScale)
+        self.assertEqual(len(results), len(decisionRows))
+        for index, (result, rows, (moralValue, negativeMoralValue)) in enumerate(zip(results, decisionRows, expected)):
+            decisionName, resultMoralValue, resultNegativeMoralValue, resultScale, hasDecisionMaker = result
+            self.assertEqual(decisionName, "Decision " + str(index))
+            checkValue(self, resultMoralValue, moralValue)
+            checkValue(self, resultNegativeMoralValue, negativeMoralValue)
+            if selfInterestScale is None:
+                self.assertIsNone(resultScale)
+            else:
+                self.assertEqual(resultScale, selfInterestScale)
+            self.assertEqual(hasDecisionMaker, any(isDecisionMaker for arguments, isDecisionMaker in rows))
+
+    def testResultsEqualReference(self):
+        for decisionRows in getScenarios(17):
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                evaluate = buildEvaluation(decisionRows, selfInterestScale)
+                results = evaluate.getResults()
+                self.checkResults([result.toTuple() for result in results], decisionRows, selfInterestScale)
+                self.assertEqual([tuple(result.toDict().values()) for result in results],
+                                 [result.toTuple() for result in results])
+
+    def testSinksEqualReference(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for decisionRows in getScenarios(18, count=5):
+                evaluate = buildEvaluation(decisionRows, .5)
+
+                text = io.StringIO()
+                with felicific_results.JsonlSink(text, bufferSize=2) as sink:
+                    evaluate.writeResults(sink)
+                self.checkResults([tuple(json.loads(line).values()) for line in text.getvalue().splitlines()],
+                                  decisionRows, .5)
+
+                text = io.StringIO()
+                with felicific_results.CsvSink(text, bufferSize=3) as sink:
+                    evaluate.writeResults(sink)
+                rows = list(csv.reader(io.StringIO(text.getvalue())))
+                self.assertEqual(rows[0], ["decisionName", "moralValue", "negativeMoralValue", "selfInterestScale",
+                                           "hasDecisionMaker"])
+                self.checkResults([(name, float(moralValue), float(negativeMoralValue), float(scale),
+                                    hasDecisionMaker == "True")
+                                   for name, moralValue, negativeMoralValue, scale, hasDecisionMaker in rows[1:]],
+                                  decisionRows, .5)
+
+                # the path may be a pathlib.Path, which the sink opens and closes itself
+                path = pathlib.Path(directory, "results.jsonl")
+                with felicific_results.JsonlSink(path) as sink:
+                    evaluate.writeResults(sink)
+                with open(path) as file:
+                    self.checkResults([tuple(json.loads(line).values()) for line in file], decisionRows, .5)
+
+                path = os.path.join(directory, "results.npz")
+                with felicific_results.ColumnarSink(path, "npz", bufferSize=4) as sink:
+                    evaluate.writeResults(sink)
+                with np.load(path) as columns:
+                    self.checkResults(list(zip(*(columns[field].tolist()
+                                                 for field in felicific_results.DecisionResult.FIELDS))),
+                                      decisionRows, .5)
+
+                sink = felicific_results.NullSink()
+                evaluate.writeResults(sink)
+                self.assertEqual(sink.count, len(decisionRows))
+
+    def testSinksBufferWrites(self):
+        text = io.StringIO()
+        sink = felicific_results.JsonlSink(text, bufferSize=3)
+        for index in range(5):
+            sink.write(felicific_results.DecisionResult("Decision " + str(index), index, 0))
+        # the first three results were written when the buffer filled, the other two wait for the next flush
+        self.assertEqual(len(text.getvalue().splitlines()), 3)
+        sink.close()
+        self.assertEqual([json.loads(line)["moralValue"] for line in text.getvalue().splitlines()], [0, 1, 2, 3, 4])
+        self.assertRaises(ValueError, felicific_results.ColumnarSink, "results", "xlsx")
+
+    def testColumnarSinkWritesEveryFlush(self):
+        # names of growing length, so every flush has a type of its own
+        results = [felicific_results.DecisionResult("D" * (index + 1), index / 2, -index, None if index < 6 else .5,
+                                                    index % 3 == 0) for index in range(10)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "results.npz")
+            sink = felicific_results.ColumnarSink(path, "npz", bufferSize=4)
+            sink.writeAll(results)
+            # two full buffers were written out, and only the last two results are held
+            self.assertEqual(len(sink.buffer), 2)
+            self.assertEqual([length for chunkType, length in sink.chunks["moralValue"]], [4, 4])
+            self.assertEqual(sink.columnFiles["moralValue"].tell(), 8 * 8)
+            sink.close()
+            with np.load(path) as columns:
+                self.assertEqual(columns["decisionName"].tolist(), [result.decisionName for result in results])
+                self.assertEqual(columns["moralValue"].tolist(), [result.moralValue for result in results])
+                self.assertEqual(columns["negativeMoralValue"].tolist(), [-index for index in range(10)])
+                self.assertEqual(np.isnan(columns["selfInterestScale"]).tolist(), [index < 6 for index in range(10)])
+                self.assertEqual(columns["hasDecisionMaker"].tolist(), [index % 3 == 0 for index in range(10)])
+
+            # an empty sink still writes every column
+            with felicific_results.ColumnarSink(path, "npz") as sink:
+                pass
+            with np.load(path) as columns:
+                self.assertEqual(sorted(columns.files), sorted(felicific_results.DecisionResult.FIELDS))
+                self.assertEqual(len(columns["moralValue"]), 0)
+
+    def testNoticesGoThroughLogging(self):
+        evaluate = buildEvaluation([[((False, 1, 1, 1, 1, 0, 0, 1), False)]] + EXAMPLES["trolley"])
+        with self.assertLogs(fc.logger, "INFO") as logs:
+            evaluate.setSelfInterestScale(0)
+        self.assertEqual(logs.output, ["WARNING:felicific_calculus:Decision Decision 0 does not have a decision maker.",
+                                       "INFO:felicific_calculus:Set self interest to Altruistic"])
+
+
+if __name__ == "__main__":
+    unittest.main()
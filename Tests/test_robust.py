@@ -0,0 +1,86 @@
+"""Tests of felicific_robust against the reference calculus of equivalence.py."""
+
+import unittest
+
+from equivalence import buildEvaluation, checkValue, getFullArguments, getReferenceValues, getScenarios
+
+import numpy as np
+
+import felicific_robust
+
+GRID = felicific_robust.getScenarioGrid({"certainty": (.5, 1), "multiplier": (.8, 1.2), "propinquity": (1, 2.5)},
+                                        (None, 0, .5, 1))
+
+
+def getScaledRows(decisionRows, scenario):
+    """The rows of the decisions with the parameters multiplied by the scale factors of a scenario."""
+    fields = felicific_robust.FIELD_INDEX
+    scaledRows = []
+    for rows in decisionRows:
+        scaled = []
+        for arguments, isDecisionMaker in rows:
+            arguments = list(getFullArguments(arguments))
+            for name, value in scenario.items():
+                if name != "selfInterestScale":
+                    arguments[fields[name]] *= value
+            scaled.append((arguments, isDecisionMaker))
+        scaledRows.append(scaled)
+    return scaledRows
+
+
+class RobustEvaluationTest(unittest.TestCase):
+
+    def testValuesEqualReference(self):
+        for decisionRows in getScenarios(42, count=10):
+            if not decisionRows:
+                continue
+            for negative in (False, True):
+                evaluation = felicific_robust.RobustEvaluation(buildEvaluation(decisionRows).getDecisions(), GRID,
+                                                               negative=negative)
+                result = evaluation.run(shardSize=5, keepValues=True)
+                self.assertEqual(result.values.shape, (len(decisionRows), len(GRID)))
+                # every decision evaluated by the reference in every scenario, with the parameters scaled
+                for scenarioIndex, scenario in enumerate(GRID):
+                    for rows, value in zip(getScaledRows(decisionRows, scenario),
+                                           result.values[:, scenarioIndex].tolist()):
+                        checkValue(self, value, getReferenceValues(rows, scenario.get("selfInterestScale"))[negative])
+
+                # the summaries of the (checked) values, which are the same whatever the shards
+                values = result.values
+                np.testing.assert_array_equal(result.worstValues, values.min(axis=1))
+                np.testing.assert_array_equal(result.maxRegrets, (values.max(axis=0) - values).max(axis=1))
+                np.testing.assert_allclose(result.expectedValues, values.mean(axis=1), rtol=1e-12, atol=1e-12)
+                names = result.decisionNames
+                self.assertEqual(result.getMaximinDecision(), names[int(np.argmax(values.min(axis=1)))])
+                self.assertEqual(result.getMinimaxRegretDecision(),
+                                 names[int(np.argmin((values.max(axis=0) - values).max(axis=1)))])
+                single = evaluation.run(shardSize=len(GRID))
+                np.testing.assert_array_equal(single.worstValues, result.worstValues)
+                np.testing.assert_array_equal(single.maxRegrets, result.maxRegrets)
+
+    def testChoices(self):
+        # an altruist values decision 0 at 0 and decision 1 at 4, an egoist at 10 and 1
+        decisions = buildEvaluation([[((True, 10, 1, 1, 0, 0, 0, 1), True)],
+                                     [((True, 4, 1, 1, 0, 0, 0, 1), False), ((True, 1, 1, 1, 0, 0, 0, 1), True)]])
+        scenarios = [{"selfInterestScale": 0}, {"selfInterestScale": 1}]
+        result = felicific_robust.RobustEvaluation(decisions.getDecisions(), scenarios).run(keepValues=True)
+        np.testing.assert_array_equal(result.values, [[0, 10], [4, 1]])
+        # worst values of 0 and 1, largest regrets of 4 and 9, expected values of 5 and 2.5
+        self.assertEqual((result.getMaximinDecision(), result.getMinimaxRegretDecision(),
+                          result.getExpectedValueDecision()), ("Decision 1", "Decision 0", "Decision 0"))
+        result = felicific_robust.RobustEvaluation(decisions.getDecisions(), scenarios, [.9, .1]).run()
+        np.testing.assert_allclose(result.expectedValues, [1, 3.7])
+        self.assertEqual(result.getExpectedValueDecision(), "Decision 1")
+        # halving the certainty halves every value
+        result = felicific_robust.RobustEvaluation(decisions.getDecisions(),
+                                                   [{"certainty": .5, "selfInterestScale": 1}]).run()
+        np.testing.assert_array_equal(result.worstValues, [5, .5])
+
+        self.assertRaises(ValueError, felicific_robust.RobustEvaluation, decisions.getDecisions(), [])
+        self.assertRaises(ValueError, felicific_robust.RobustEvaluation, decisions.getDecisions(), [{"isPleasure": 2}])
+        self.assertRaises(ValueError, felicific_robust.RobustEvaluation, decisions.getDecisions(), [{"certainty": -1}])
+        self.assertEqual(len(felicific_robust.getScenarioGrid({"certainty": (.5, 1), "multiplier": (.8, 1, 1.2)},
+                                                              (0, .5, 1))), 18)
+
+if __name__ == "__main__":
+    unittest.main()
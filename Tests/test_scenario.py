@@ -0,0 +1,106 @@
+"""Tests of felicific_scenario against the reference calculus of equivalence.py."""
+
+import os
+import tempfile
+import unittest
+
+from equivalence import (EXAMPLES, SELF_INTEREST_SCALES, buildEvaluation, checkBestDecisions, checkValue, checkValues,
+                         getAllReferenceValues, getDecisionNames, getFullArguments, getReferenceValues, getScenarios)
+
+import numpy as np
+
+import felicific_decay
+import felicific_scenario
+
+DECAYS = (None, felicific_decay.ExponentialDecay(.2), felicific_decay.HyperbolicDecay(.5))
+
+
+class ScenarioTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "scenario.bin")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testEvaluateEqualsReference(self):
+        for decisionRows in getScenarios(15, count=10):
+            for decay in DECAYS:
+                # the decay is written with the scenario, so it is not given again
+                felicific_scenario.writeScenario(self.path, buildEvaluation(decisionRows, decay=decay).getDecisions())
+                scenario = felicific_scenario.loadScenario(self.path)
+                for selfInterestScale in SELF_INTEREST_SCALES:
+                    expected = getAllReferenceValues(decisionRows, selfInterestScale, decay)
+                    result = scenario.evaluate(selfInterestScale, chunkSize=5)
+                    checkValues(self, list(zip(result.moralValues.tolist(), result.negativeMoralValues.tolist())),
+                                expected)
+                    if decisionRows:
+                        checkBestDecisions(self, result.getDecisionWithHighestValue(),
+                                           result.getDecisionWithLeastNegativeValue(), getDecisionNames(decisionRows),
+                                           expected)
+                del scenario
+
+    def testDecisionsEqualReference(self):
+        for decisionRows in getScenarios(16, count=5):
+            for decay in DECAYS:
+                felicific_scenario.writeScenario(self.path, buildEvaluation(decisionRows, decay=decay).getDecisions())
+                scenario = felicific_scenario.loadScenario(self.path)
+                for index, rows in enumerate(decisionRows):
+                    decision = scenario.getDecision("Decision " + str(index))
+                    moralValue, negativeMoralValue = getReferenceValues(rows, decay=decay)
+                    checkValue(self, decision.getMoralValue(), moralValue)
+                    checkValue(self, decision.getNegativeMoralValue(), negativeMoralValue)
+                del scenario
+
+    def testFileLayout(self):
+        decisionRows = EXAMPLES["lifeboat"]
+        felicific_scenario.writeScenario(self.path, buildEvaluation(decisionRows).getDecisions())
+        records = sum(map(len, decisionRows))
+        names = sum(5 + len(name) for name in getDecisionNames(decisionRows))
+        # a 64 byte header, 18 doubles per record and the names, each after its length and type
+        self.assertEqual(os.path.getsize(self.path), 64 + records * 18 * 8 + names)
+        with open(self.path, "rb") as file:
+            self.assertEqual(file.read(8), b"UTILICLC")
+
+        scenario = felicific_scenario.loadScenario(self.path)
+        # the records are mapped from the file rather than read into memory
+        self.assertIsInstance(scenario.matrix, np.memmap)
+        self.assertEqual(scenario.decisionNames, getDecisionNames(decisionRows))
+        np.testing.assert_array_equal(scenario.matrix, [getFullArguments(arguments) + (decisionId, isDecisionMaker)
+                                                        for decisionId, rows in enumerate(decisionRows)
+                                                        for arguments, isDecisionMaker in rows])
+        self.assertIsNone(scenario.decay)
+        del scenario
+
+    def testNamesKeepTheirType(self):
+        matrix = np.zeros((3, 18))
+        matrix[:, 16] = [0, 1, 2]
+        felicific_scenario.writeScenarioMatrix(self.path, matrix, [0, "1", np.int64(-2)])
+        scenario = felicific_scenario.loadScenario(self.path)
+        self.assertEqual(scenario.decisionNames, [0, "1", -2])
+        self.assertEqual(list(map(type, scenario.decisionNames)), [int, str, int])
+        del scenario
+        for name in (1.5, True, None):
+            self.assertRaises(ValueError, felicific_scenario.writeScenarioMatrix, self.path, matrix[:1], [name])
+
+        # files of other versions are refused rather than read with another layout
+        with open(self.path, "r+b") as file:
+            file.seek(8)
+            file.write((1).to_bytes(4, "little"))
+        self.assertRaises(ValueError, felicific_scenario.loadScenario, self.path)
+
+    def testFailedWriteLeavesNoFile(self):
+        def getChunks():
+            yield np.zeros((2, 18))
+            raise RuntimeError("The scenario could not be built.")
+
+        self.assertRaises(RuntimeError, felicific_scenario.writeScenarioMatrix, self.path, getChunks(), ["Decision 0"])
+        self.assertEqual(os.listdir(self.directory.name), [])
+        self.assertRaises(ValueError, felicific_scenario.writeScenarioMatrix, self.path, np.zeros((2, 18)) + 3,
+                          ["Decision 0"])
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""Tests of felicific_sensitivity against the reference calculus of equivalence.py."""
+
+import random
+import unittest
+
+from equivalence import (SELF_INTEREST_SCALES, buildEvaluation, checkUnroundedValue, getFullArguments,
+                         getReferenceValues, getScenarios)
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_sensitivity as fsens
+
+STEP = 1e-5
+
+
+def getChangedRows(rows, row, field, change):
+    changed = [(getFullArguments(arguments), isDecisionMaker) for arguments, isDecisionMaker in rows]
+    arguments, isDecisionMaker = changed[row]
+    changed[row] = (arguments[:field] + (arguments[field] + change,) + arguments[field + 1:], isDecisionMaker)
+    return changed
+
+
+def getDifference(rows, row, field, selfInterestScale):
+    """The central difference of the reference value of a decision when one parameter of one row changes."""
+    return (getReferenceValues(getChangedRows(rows, row, field, STEP), selfInterestScale)[0]
+            - getReferenceValues(getChangedRows(rows, row, field, -STEP), selfInterestScale)[0]) / (2 * STEP)
+
+
+class GradientTest(unittest.TestCase):
+
+    def testValuesEqualReference(self):
+        for decisionRows in getScenarios(25, count=10):
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                evaluate = buildEvaluation(decisionRows, selfInterestScale)
+                for negative in (False, True):
+                    result = fsens.getGradients(evaluate.getDecisions(), selfInterestScale, negative)
+                    self.assertEqual(len(result.values), len(decisionRows))
+                    for value, rows in zip(result.values.tolist(), decisionRows):
+                        checkUnroundedValue(self, value, getReferenceValues(rows, selfInterestScale)[negative])
+
+    def testGradientsEqualDifferencesOfReference(self):
+        rng = random.Random(26)
+        for decisionRows in getScenarios(27, count=10):
+            evaluate = buildEvaluation(decisionRows)
+            for selfInterestScale in (None, .3):
+                result = fsens.getGradients(evaluate.getDecisions(), selfInterestScale)
+                matrix, decisionNames = fa.getParameterMatrix(evaluate.getDecisions())
+                rowDecisions = matrix[:, fa.DECISION_COLUMN].astype(int)
+                rowOffsets = np.cumsum([0] + [len(rows) for rows in decisionRows])
+                for row in rng.sample(range(len(matrix)), min(len(matrix), 5)):
+                    decision = rowDecisions[row]
+                    rows = decisionRows[decision]
+                    for field in range(1, 16):
+                        # the decay is not differentiable at a propinquity of 0, which means no decay
+                        if fsens.FIELDS[field].endswith("propinquity") and matrix[row, field] < 2 * STEP:
+                            continue
+                        difference = getDifference(rows, row - rowOffsets[decision], field, selfInterestScale)
+                        self.assertAlmostEqual(result.rowGradients[row, field], difference,
+                                               delta=1e-4 * max(1, abs(difference)))
+
+    def testGradientsOfProduct(self):
+        # a pain of -2 * 3 * 5 = -30, whose derivative by each factor is the product of the others
+        evaluate = buildEvaluation([[((False, 2, 3, 1, 0, 0, 0, 5), True)], [((True, 1, 1, 1, 0, 0, 0, 1), True)]])
+        result = fsens.getGradients(evaluate.getDecisions())
+        self.assertEqual(result.values.tolist(), [-30, 1])
+        gradient = result.getDecisionGradient("Decision 0")
+        self.assertEqual([gradient[name] for name in ("intensity", "duration", "certainty", "multiplier")],
+                         [-15, -10, -30, -6])
+        elasticities = result.getElasticities("Decision 0")
+        self.assertEqual([elasticities[name] for name in ("intensity", "duration", "certainty", "multiplier")],
+                         [-30] * 4)
+        # the margin of the best decision over the runner-up changes by 1 - -30 with every factor
+        self.assertEqual(result.getRankingElasticities()["intensity"], 31)
+
+
+class ScaledEvaluationTest(unittest.TestCase):
+
+    def testScaledValuesEqualReference(self):
+        rng = np.random.default_rng(28)
+        for decisionRows in getScenarios(29, count=10):
+            if not decisionRows:
+                continue
+            evaluate = buildEvaluation(decisionRows)
+            for selfInterestScale in (None, .3):
+                scaled = fsens.ScaledEvaluation(evaluate.getDecisions(), selfInterestScale)
+                scales = np.vstack([np.ones(16), rng.uniform(.5, 1.5, (3, 16))])
+                scales[:, 0] = 1
+                for sample, (moralValues, negativeMoralValues) in enumerate(
+                        zip(scaled.evaluate(scales).tolist(), scaled.evaluate(scales, negative=True).tolist())):
+                    for rows, value, negativeValue in zip(decisionRows, moralValues, negativeMoralValues):
+                        scaledRows = [(tuple(np.multiply(getFullArguments(arguments), scales[sample]).tolist()),
+                                       isDecisionMaker) for arguments, isDecisionMaker in rows]
+                        moralValue, negativeMoralValue = getReferenceValues(scaledRows, selfInterestScale)
+                        checkUnroundedValue(self, value, moralValue)
+                        checkUnroundedValue(self, negativeValue, negativeMoralValue)
+
+
+class SobolTest(unittest.TestCase):
+
+    def testIndicesOfProduct(self):
+        # the value is a product X * Y of two independent uniform factors of variance s = .2 ** 2 / 12, so the
+        # variance of the product is 2s + s ** 2, of which X alone explains s and X with its interaction s + s ** 2
+        evaluate = buildEvaluation([[((False, 2, 3, 1, 0, 0, 0, 5), True)], [((True, 20, 1, 1, 0, 0, 0, 1), True)]])
+        result = fsens.getSobolIndices(evaluate.getDecisions(), {"intensity": (.9, 1.1), "multiplier": (.9, 1.1)},
+                                       samples=4096)
+        s = .2 ** 2 / 12
+        for decisionName in ("Decision 0", "Decision 1"):
+            for firstOrder, total in result.getIndices(decisionName).values():
+                self.assertAlmostEqual(firstOrder, s / (2 * s + s ** 2), delta=.03)
+                self.assertAlmostEqual(total, (s + s ** 2) / (2 * s + s ** 2), delta=.03)
+        # the margin of 20 * X * Y over -30 * X * Y is a product of the same factors
+        self.assertEqual(result.rankingDecisions, ("Decision 1", "Decision 0"))
+        for name, total in result.getRankingDrivers():
+            self.assertAlmostEqual(total, (s + s ** 2) / (2 * s + s ** 2), delta=.03)
+
+        self.assertRaises(ValueError, fsens.getSobolIndices, evaluate.getDecisions(), {"isPleasure": (.9, 1.1)})
+        self.assertRaises(ValueError, fsens.getSobolIndices, evaluate.getDecisions(), {"intensity": (0, 1)})
+        self.assertRaises(ValueError, fsens.getSobolIndices, evaluate.getDecisions(), samples=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
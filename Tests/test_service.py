@@ -0,0 +1,134 @@
+"""Tests of felicific_service against the reference calculus of equivalence.py."""
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from equivalence import (SELF_INTEREST_SCALES, checkBestDecisions, checkValues, getAllReferenceValues,
+                         getDecisionNames, getFullArguments, getScenarios)
+
+import felicific_decay
+import felicific_service
+
+
+def getRequests(scenarios):
+    """Returns a request for every (decision rows, selfInterestScale) of the scenarios, with rows of 17 values."""
+    requests = []
+    for decisionRows in scenarios:
+        if not decisionRows:
+            continue
+        for selfInterestScale in SELF_INTEREST_SCALES:
+            request = {"id": len(requests), "decisions": {
+                "Decision " + str(index): [list(getFullArguments(arguments)) + [isDecisionMaker]
+                                           for arguments, isDecisionMaker in rows]
+                for index, rows in enumerate(decisionRows)}}
+            if selfInterestScale is not None:
+                request["selfInterestScale"] = selfInterestScale
+            requests.append((request, decisionRows, selfInterestScale))
+    return requests
+
+
+class ServiceTest(unittest.TestCase):
+
+    def checkResponse(self, response, decisionRows, selfInterestScale, decay=None):
+        expected = getAllReferenceValues(decisionRows, selfInterestScale, decay)
+        names = getDecisionNames(decisionRows)
+        self.assertEqual(list(response["moralValues"]), names)
+        checkValues(self, [(response["moralValues"][name], response["negativeMoralValues"][name]) for name in names],
+                    expected)
+        checkBestDecisions(self, response["decisionWithHighestValue"], response["decisionWithLeastNegativeValue"],
+                           names, expected)
+
+    def testBatchEqualsReference(self):
+        requests = getRequests(getScenarios(38, count=10))
+        for decay in (None, felicific_decay.ExponentialDecay(.3)):
+            # a request that cannot be evaluated doesn't change the others of its batch
+            lines = felicific_service.evaluateRequests([request for request, decisionRows, selfInterestScale
+                                                        in requests] + [{"id": "bad", "decisions": {}}], decay)
+            self.assertIn("error", json.loads(lines[-1]))
+            for line, (request, decisionRows, selfInterestScale) in zip(lines, requests):
+                response = json.loads(line)
+                self.assertEqual(response["id"], request["id"])
+                self.checkResponse(response, decisionRows, selfInterestScale, decay)
+
+    def testBadRequestsAreAnsweredAlone(self):
+        requests = getRequests(getScenarios(40, count=2))
+        errors = {"propinquity": "Propinquity must not be negative.",
+                  "f_propinquity": "Propinquity must not be negative.",
+                  "nan": "Every value of a request must be finite.",
+                  "infinity": "Every value of a request must be finite.",
+                  "scale": "Self interest scale must be between 0 and 1."}
+        bad = [{"id": "propinquity", "decisions": {"Decision 0": [[False, 1, 1, 1, -1, 0, 0, 1]]}},
+               {"id": "f_propinquity", "decisions": {"Decision 0": [[True, 1, 1, 1, 1, .5, 0, 1, 1, 1, -2, 1]]}},
+               {"id": "nan", "decisions": {"Decision 0": [[True, float("nan"), 1, 1, 1, 0, 0, 1]]}},
+               {"id": "infinity", "decisions": {"Decision 0": [[True, 1, 1, 1, 1, 0, 0, float("inf")]]}},
+               {"id": "scale", "decisions": {"Decision 0": [[True, 1, 1, 1, 1, 0, 0, 1]]},
+                "selfInterestScale": float("nan")}]
+        # every bad request is evaluated in the same batch as good ones, between them
+        batch = []
+        for request, decisionRows, selfInterestScale in requests:
+            batch.append(request)
+            if bad:
+                batch.append(bad.pop(0))
+        # the propinquity of a fecundity that doesn't happen is not decayed, as in Decision
+        batch.append({"id": "unused", "decisions": {"Decision 0": [[True, 2, 1, 1, 0, 0, 0, 1, 1, 1, -2, 1]]}})
+
+        for decay in (None, felicific_decay.ExponentialDecay(.3)):
+            responses = dict((response["id"], response)
+                             for response in map(json.loads, felicific_service.evaluateRequests(batch, decay)))
+            self.assertEqual(len(responses), len(requests) + len(errors) + 1)
+            for requestId, error in errors.items():
+                self.assertEqual(responses[requestId], {"id": requestId, "error": error})
+            self.assertEqual(responses["unused"]["moralValues"], {"Decision 0": 2})
+            for request, decisionRows, selfInterestScale in requests:
+                self.checkResponse(responses[request["id"]], decisionRows, selfInterestScale, decay)
+
+    def testServerEqualsReference(self):
+        requests = getRequests(getScenarios(39, count=3))
+
+        async def serve(path):
+            server = await felicific_service.EvaluationServer(path).start()
+            try:
+                reader, writer = await asyncio.open_unix_connection(path)
+                writer.write(b"".join(json.dumps(request).encode() + b"\n"
+                                      for request, decisionRows, selfInterestScale in requests))
+                await writer.drain()
+                responses = [json.loads(await reader.readline()) for request in requests]
+                writer.close()
+                return responses
+            finally:
+                await server.close()
+
+        with tempfile.TemporaryDirectory() as directory:
+            responses = asyncio.run(serve(os.path.join(directory, "service.sock")))
+        responses = dict((response["id"], response) for response in responses)
+        for request, decisionRows, selfInterestScale in requests:
+            self.checkResponse(responses[request["id"]], decisionRows, selfInterestScale)
+
+    def testRequestsAreBatched(self):
+        batches = []
+
+        def evaluate(requests):
+            batches.append(list(requests))
+            return [request * 2 for request in requests]
+
+        async def submit():
+            # every request is queued before the first batch is taken, so the batches are as large as allowed
+            batcher = felicific_service.MicroBatcher(evaluate, None, window=.05, maxBatchSize=4)
+            futures = [await batcher.submit(request) for request in range(10)]
+            batcher.start()
+            results = await asyncio.gather(*futures)
+            await batcher.close()
+            return results, batcher.stats.getStats()
+
+        results, stats = asyncio.run(submit())
+        self.assertEqual(results, [request * 2 for request in range(10)])
+        self.assertEqual(batches, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        self.assertEqual((stats["requests"], stats["batches"], stats["meanBatchSize"]), (10, 3, 10 / 3))
+        self.assertRaises(ValueError, felicific_service.MicroBatcher, evaluate, None, maxBatchSize=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Tests of felicific_streaming against the reference calculus of equivalence.py."""
+
+import unittest
+
+from equivalence import (SELF_INTEREST_SCALES, buildDecision, checkBestDecisions, checkValue, getAllReferenceValues,
+                         getDecisionNames, getFullArguments, getRoundings, getScenarios)
+
+import felicific_streaming as fs
+
+
+def getRanking(decisionNames, values):
+    """Returns the (name, value) of the decisions by rounded value, equal ones in the order they arrived in."""
+    return sorted(zip(decisionNames, [round(value, 2) for value in values]), key=lambda entry: entry[1], reverse=True)
+
+
+def getStreamRows(rows):
+    # rows of 17 values, the last one being isDecisionMaker
+    return [getFullArguments(arguments) + (isDecisionMaker,) for arguments, isDecisionMaker in rows]
+
+
+def getStream(decisionRows):
+    # the decisions arrive from a generator, alternately as Decision objects and as rows
+    for index, rows in enumerate(decisionRows):
+        yield "Decision " + str(index), buildDecision(rows) if index % 2 else getStreamRows(rows)
+
+
+class StreamingEvaluationTest(unittest.TestCase):
+
+    def testBestDecisionsEqualReference(self):
+        for decisionRows in getScenarios(13, count=30, decisions=12):
+            if not decisionRows:
+                continue
+            decisionNames = getDecisionNames(decisionRows)
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                expected = getAllReferenceValues(decisionRows, selfInterestScale)
+                for k in (1, 3, 20):
+                    stream = fs.StreamingEvaluation(k, selfInterestScale).addDecisions(getStream(decisionRows))
+                    self.assertEqual(stream.decisionCount, len(decisionRows))
+                    checkBestDecisions(self, stream.getDecisionWithHighestValue(),
+                                       stream.getDecisionWithLeastNegativeValue(), decisionNames, expected)
+                    for negative, topDecisions in ((False, stream.getTopDecisions()),
+                                                   (True, stream.getTopNegativeDecisions())):
+                        values = [value[negative] for value in expected]
+                        self.assertEqual(len(topDecisions), min(k, len(decisionRows)))
+                        for decisionName, value in topDecisions:
+                            checkValue(self, value, values[decisionNames.index(decisionName)])
+                        # unless a value is within a rounding error of half a cent, the ranking is that of the values
+                        if all(len(getRoundings(value)) == 1 for value in values):
+                            self.assertEqual(topDecisions, getRanking(decisionNames, values)[:k])
+
+    def testStreamKeepsOnlyTopDecisions(self):
+        def getDecisions():
+            # decision i is worth (i * 7) % 1000, so every value is reached once in the first 1000 decisions
+            for index in range(100000):
+                yield "Decision " + str(index), [(True, (index * 7) % 1000, 1, 1, 0, 0, 0, 1)]
+
+        stream = fs.StreamingEvaluation(3).addDecisions(getDecisions())
+        self.assertEqual(stream.decisionCount, 100000)
+        self.assertEqual(len(stream.topDecisions), 3)
+        # among equal values the decisions that arrived first rank higher
+        self.assertEqual(stream.getTopDecisions(), [("Decision 857", 999), ("Decision 1857", 999),
+                                                    ("Decision 2857", 999)])
+        self.assertEqual(stream.getDecisionWithLeastNegativeValue(), "Decision 0")
+        self.assertRaises(ValueError, fs.StreamingEvaluation(2).getDecisionWithHighestValue)
+
+
+if __name__ == "__main__":
+    unittest.main()
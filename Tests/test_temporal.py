@@ -0,0 +1,88 @@
+"""Tests of felicific_temporal against the reference calculus of equivalence.py."""
+
+import unittest
+
+from equivalence import (SELF_INTEREST_SCALES, buildEvaluation, checkUnroundedValue, getFullArguments,
+                         getReferenceConsequences, getReferenceValues, getScenarios)
+
+import numpy as np
+
+import felicific_temporal
+
+# later than any consequence of the scenarios ends
+HORIZON = 50
+
+
+def getAccruedValue(rows, selfInterestScale, time, negative=False):
+    """The reference value of the rows accrued by a time, every consequence accruing evenly over its duration."""
+    total = 0
+    for arguments, isDecisionMaker in rows:
+        weight = 1 if selfInterestScale is None else selfInterestScale if isDecisionMaker else 1 - selfInterestScale
+        arguments = getFullArguments(arguments)
+        # (start, duration) of the consequences of the row: the 1st order one, fecundity and purity
+        timings = [(arguments[4], arguments[2])]
+        if arguments[5] != 0:
+            timings.append((arguments[10], arguments[9]))
+        if arguments[6] != 0:
+            timings.append((arguments[14], arguments[13]))
+        for value, (start, duration) in zip(getReferenceConsequences(arguments), timings):
+            share = min(max((time - start) / duration, 0), 1) if duration > 0 else float(start <= time)
+            total += weight * (min(value, 0) if negative else value) * share
+    return total
+
+
+class TemporalEvaluationTest(unittest.TestCase):
+
+    def testAccruedValuesEqualReference(self):
+        for decisionRows in getScenarios(33, count=10):
+            if not decisionRows:
+                continue
+            for selfInterestScale in SELF_INTEREST_SCALES:
+                evaluate = buildEvaluation(decisionRows, selfInterestScale)
+                for negative in (False, True):
+                    # once every consequence has ended, the accrued values are the moral values
+                    values = [getReferenceValues(rows, selfInterestScale)[negative] for rows in decisionRows]
+                    for bucketSize in (1, 2.5):
+                        temporal = felicific_temporal.TemporalEvaluation(evaluate.getDecisions(), selfInterestScale,
+                                                                         bucketSize, negative)
+                        for accrued in (temporal.getValuesAt(HORIZON),
+                                        temporal.getBucketValues(HORIZON, cumulative=True)[-1],
+                                        temporal.getBucketValues(HORIZON).sum(axis=0),
+                                        np.concatenate([block for firstBucket, block in temporal.iterateBuckets(
+                                            HORIZON, blockSize=7)]).sum(axis=0)):
+                            for value, moralValue in zip(accrued.tolist(), values):
+                                checkUnroundedValue(self, value, moralValue)
+
+    def testValuesAtEqualReference(self):
+        for decisionRows in getScenarios(34, count=10):
+            if not decisionRows:
+                continue
+            for selfInterestScale in (None, .3):
+                evaluate = buildEvaluation(decisionRows, selfInterestScale)
+                temporal = felicific_temporal.TemporalEvaluation(evaluate.getDecisions(), selfInterestScale)
+                cumulative = temporal.getBucketValues(HORIZON, cumulative=True)
+                for time in (0, .5, 1, 2, 3.7, 8, 15):
+                    expected = [getAccruedValue(rows, selfInterestScale, time) for rows in decisionRows]
+                    for value, expectedValue in zip(temporal.getValuesAt(time).tolist(), expected):
+                        self.assertAlmostEqual(value, expectedValue, delta=1e-6 * max(1, abs(expectedValue)))
+                    if time >= 1 and float(time).is_integer():
+                        # bucket k ends at time k + 1
+                        for value, expectedValue in zip(cumulative[int(time) - 1].tolist(), expected):
+                            self.assertAlmostEqual(value, expectedValue, delta=1e-6 * max(1, abs(expectedValue)))
+
+    def testBucketsOfOneConsequence(self):
+        # a pain of 2 a unit of time from time 1 to 4, and a pleasure of 5 from time 1 to 2
+        evaluate = buildEvaluation([[((False, 2, 3, 1, 1, 0, 0, 1), True)], [((True, 5, 1, 1, 1, 0, 0, 1), True)]])
+        temporal = felicific_temporal.TemporalEvaluation(evaluate.getDecisions())
+        np.testing.assert_allclose(temporal.getBucketValues(5), [[0, 0], [-2, 5], [-2, 0], [-2, 0], [0, 0]])
+        np.testing.assert_allclose(temporal.getBucketValues(5, cumulative=True)[:, 0], [0, -2, -4, -6, -6])
+        np.testing.assert_allclose(temporal.getValuesAt(2.5), [-3, 5])
+        # half buckets, with the horizon rounded up to a whole bucket
+        temporal = felicific_temporal.TemporalEvaluation(evaluate.getDecisions(), bucketSize=.5)
+        np.testing.assert_allclose(temporal.getBucketValues(1.9)[:, 0], [0, 0, -1, -1])
+        self.assertRaises(ValueError, temporal.getBucketValues, 0)
+        self.assertRaises(ValueError, felicific_temporal.TemporalEvaluation, evaluate.getDecisions(), bucketSize=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
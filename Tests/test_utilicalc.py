@@ -0,0 +1,105 @@
+"""Tests of the consequence graph of utilicalc against the reference calculus of equivalence.py."""
+
+import random
+import unittest
+
+from equivalence import EXAMPLES, checkUnroundedValue, getFullArguments, getRandomArguments, getReferenceConsequences
+
+import utilicalc
+
+AGENTS = ["Me", "Neighbor 1", "Neighbor 2", "Stranger 1", "Stranger 2", "Tobacco Company", "Gas Station"]
+CONSEQUENCES = {"Me": [3, -5, -1], "Neighbor 1": [-2], "Neighbor 2": [-2], "Stranger 1": [-2], "Stranger 2": [-4],
+                "Tobacco Company": [2], "Gas Station": [3]}
+
+
+def getGraph(rows):
+    """
+    Returns the consequence graph of the agents of a decision: every agent's 1st order consequence, linked to its 2nd
+    order consequences by a fecundity edge and a purity edge with the probabilities of the fecundity and the purity.
+    """
+    graph = utilicalc.ConsequenceGraph()
+    for agent, (arguments, isDecisionMaker) in enumerate(rows):
+        arguments = getFullArguments(arguments)
+        fecundity, purity = arguments[5:7]
+        # the reference consequences are weighted by the probabilities, the graph weights the edges instead
+        first, fecundityValue, purityValue = getReferenceConsequences(arguments[:5] + (1, 1) + arguments[7:])
+        graph.addConsequence((agent, "first"), first)
+        for name, probability, value, isFecundity in (("fecundity", fecundity, fecundityValue, True),
+                                                      ("purity", purity, purityValue, False)):
+            if probability != 0:
+                graph.addConsequence((agent, name), value)
+                graph.addFurtherConsequence((agent, "first"), (agent, name), probability, isFecundity)
+    return graph
+
+
+def getRandomRows(rng, agents):
+    # the graph takes fecundity and purity as probabilities
+    rows = []
+    for agent in range(agents):
+        arguments = getRandomArguments(rng)
+        probabilities = tuple(rng.choice((0, .5, .7, 1, rng.random())) for field in range(2))
+        rows.append((arguments[:5] + probabilities + arguments[7:], rng.random() < .25))
+    return rows
+
+
+class ConsequenceGraphTest(unittest.TestCase):
+
+    def testTotalValuesEqualReference(self):
+        rng = random.Random(11)
+        for rows in [rows for decisionRows in EXAMPLES.values() for rows in decisionRows] + [
+                getRandomRows(rng, rng.randint(0, 8)) for decision in range(100)]:
+            graph = getGraph(rows)
+            for agent, (arguments, isDecisionMaker) in enumerate(rows):
+                consequences = getReferenceConsequences(arguments)
+                for maxDepth in (None, 1, 3):
+                    checkUnroundedValue(self, graph.getTotalValue((agent, "first"), maxDepth), sum(consequences))
+                checkUnroundedValue(self, graph.getTotalValue((agent, "first"), 0), consequences[0])
+
+            score = utilicalc.utilityCalculus("act", range(len(rows)),
+                                              {agent: [(agent, "first")] for agent in range(len(rows))}, graph)
+            checkUnroundedValue(self, score, sum(sum(getReferenceConsequences(arguments))
+                                                 for arguments, isDecisionMaker in rows))
+
+    def testValuesWithoutGraph(self):
+        # the example of utilicalc, whose consequences have no further consequences
+        self.assertEqual(utilicalc.utilityCalculus("Buying a pack of cigarettes", AGENTS, CONSEQUENCES), -8)
+        self.assertEqual(utilicalc.utilityCalculus("Buying a pack of cigarettes", AGENTS, CONSEQUENCES,
+                                                   utilicalc.ConsequenceGraph()), -8)
+
+    def testFurtherOrders(self):
+        # smoking (-5) leads to a cough (-2) half the time, which leads to a day off (2) a quarter of the time
+        graph = utilicalc.ConsequenceGraph()
+        graph.addConsequence("smoking", -5)
+        graph.addConsequence("cough", -2)
+        graph.addConsequence("day off", 2)
+        graph.addFecundity("smoking", "cough", .5)
+        graph.addPurity("cough", "day off", .25)
+        self.assertEqual(graph.getTotalValue("smoking"), -5.75)
+        self.assertEqual(graph.getTotalValue("smoking", maxDepth=1), -6)
+        self.assertEqual(graph.getFurtherValue("cough"), .5)
+        # the edge to the day off is worth .25 * 2 = .5 to the cough, so a threshold of .75 cuts it but not the cough
+        self.assertEqual(graph.getTotalValue("smoking", threshold=.75), -6)
+        self.assertEqual(utilicalc.utilityCalculus("act", ["Me"], {"Me": ["smoking", 1]}, graph), -4.75)
+
+        self.assertRaises(ValueError, graph.addFecundity, "cough", "day off", .5)
+        self.assertRaises(ValueError, graph.addPurity, "smoking", "cough", .5)
+        self.assertRaises(ValueError, graph.addFecundity, "smoking", "cough", 2)
+        self.assertRaises(KeyError, graph.addFecundity, "smoking", "lung cancer", .1)
+        # numbers are always values, so a consequence valued 3 is not taken for a consequence named 3
+        for consequence in (3, 2.5, True):
+            self.assertRaises(ValueError, graph.addConsequence, consequence, -1)
+        self.assertEqual(utilicalc.utilityCalculus("act", ["Me"], {"Me": ["smoking", 3]}, graph), -2.75)
+
+    def testCycles(self):
+        graph = utilicalc.ConsequenceGraph()
+        graph.addConsequence("stress", -4)
+        graph.addConsequence("smoking", -2)
+        graph.addFecundity("stress", "smoking", .5)
+        graph.addFecundity("smoking", "stress", .5)
+        self.assertRaises(ValueError, graph.getTotalValue, "stress")
+        self.assertEqual(graph.getTotalValue("stress", maxDepth=1), -5)
+        self.assertEqual(graph.getTotalValue("stress", maxDepth=2), -4 + .5 * (-2 + .5 * -4))
+
+
+if __name__ == "__main__":
+    unittest.main()
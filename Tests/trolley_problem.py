@@ -1,3 +1,6 @@
+import logging
+import sys
+
 import felicific_calculus as fc
 
 if __name__ == "__main__":
@@ -12,6 +15,9 @@ if __name__ == "__main__":
     2. Pull the lever, diverting the trolley onto the side track where it will kill one person.
     """
 
+    # Show the notices of EvaluateDecisions alongside the results
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+
     # Evaluate first without taking into account the egoistic/altruistic nature of the decision maker
 
     # Decision 1: Do nothing
@@ -0,0 +1,322 @@
+"""
+Array-backed (columnar) storage for the Felicific Calculus.
+
+felicific_calculus.Agent keeps its consequences as a Python list and Decision keeps a list of (Agent, bool) tuples,
+so every moral value is computed in interpreted loops. This module keeps the same information as parallel NumPy
+columns, one row per consequence, and evaluates Bentham's formula over whole columns at once:
+
+    sign * C * (I * D * N * M)
+
+Each createAgent() call expands into up to three consequence rows: the 1st order consequence, the 2nd order
+consequence of the same type (fecundity) and the 2nd order consequence of the opposite type (purity). The
+expansion follows Agent.addConsequence() exactly, so ArrayDecision returns the same results as Decision.
+
+NumPy is only required by this module, felicific_calculus itself has no dependencies.
+"""
+
+import numpy as np
+
+import felicific_calculus as fc
+import felicific_decay
+
+# The positional fields taken by Decision.createAgent(), in order
+FIELDS = fc.PARAMETER_NAMES
+
+FIELD_INDEX = {name: index for index, name in enumerate(FIELDS)}
+
+
+def adjustPropinquity(propinquity, decay=None):
+    """Vectorized form of the decay (1/propinquity^0.1 by default), where a propinquity of 0 means no decay."""
+    return felicific_decay.getDecay(decay).getValues(propinquity)
+
+
+class ConsequenceColumns:
+    """
+    Parallel columns describing consequences, one row per consequence.
+
+    Variables:
+    intensity, duration, certainty, propinquity, multiplier = the terms of the formula for each consequence
+        (certainty holds the fecundity or purity probability for 2nd order consequences)
+    sign = 1 for pleasure, -1 for pain
+    order = 1 for 1st order consequences, 2 for 2nd order consequences
+    decisionMaker = whether the consequence belongs to the decision maker
+    agent = the index of the agent (createAgent() row) the consequence belongs to
+    decay = the felicific_decay.PropinquityDecay applied to the propinquities, or None for 1/propinquity^0.1
+
+    Methods:
+        getValues() returns the signed value of every consequence
+        getMoralValue() returns the summed moral value for a self-interest scale
+        getNegativeMoralValue() returns the summed value of the painful consequences for a self-interest scale
+    """
+
+    def __init__(self, intensity, duration, certainty, propinquity, multiplier, sign, order, decisionMaker, agent,
+                 decay=None):
+        self.intensity = intensity
+        self.duration = duration
+        self.certainty = certainty
+        self.propinquity = propinquity
+        self.multiplier = multiplier
+        self.sign = sign
+        self.order = order
+        self.decisionMaker = decisionMaker
+        self.agent = agent
+        self.decay = decay
+        self.values = None
+
+    def __len__(self):
+        return len(self.sign)
+
+    def getValues(self):
+        if self.values is None:
+            self.values = self.sign * self.certainty * (
+                    self.intensity * self.duration * adjustPropinquity(self.propinquity, self.decay) * self.multiplier)
+        return self.values
+
+    def getWeights(self, selfInterestScale):
+        if selfInterestScale is None:
+            return np.ones(len(self))
+        return np.where(self.decisionMaker, selfInterestScale, 1 - selfInterestScale)
+
+    def getMoralValue(self, selfInterestScale=None):
+        return float(np.dot(self.getValues(), self.getWeights(selfInterestScale)))
+
+    def getNegativeMoralValue(self, selfInterestScale=None):
+        values = self.getValues()
+        return float(np.dot(np.minimum(values, 0), self.getWeights(selfInterestScale)))
+
+
+def expandConsequences(parameters, isDecisionMaker=None, decay=None):
+    """
+    Expands a (rows, 16) matrix of createAgent() parameters into ConsequenceColumns in a single vectorized pass.
+    Rows keep the order Agent.addConsequence() appends them in: 1st order, fecundity, then purity.
+    """
+    parameters = np.asarray(parameters, dtype=float).reshape(-1, len(FIELDS))
+    rows = len(parameters)
+    if isDecisionMaker is None:
+        isDecisionMaker = np.zeros(rows, dtype=bool)
+    isDecisionMaker = np.asarray(isDecisionMaker, dtype=bool)
+
+    column = {name: parameters[:, index] for index, name in enumerate(FIELDS)}
+    isPleasure = column["isPleasure"] != 0
+    sign = np.where(isPleasure, 1.0, -1.0)
+
+    # Build a (rows, 3) block per column, then flatten it so each agent's consequences stay together
+    present = np.stack([np.ones(rows, dtype=bool), column["fecundity"] != 0, column["purity"] != 0], axis=1).ravel()
+
+    def interleave(first, fecundity, purity):
+        return np.stack([first, fecundity, purity], axis=1).ravel()[present]
+
+    return ConsequenceColumns(
+        intensity=interleave(column["intensity"], column["f_intensity"], column["p_intensity"]),
+        duration=interleave(column["duration"], column["f_duration"], column["p_duration"]),
+        certainty=interleave(column["certainty"], column["fecundity"], column["purity"]),
+        propinquity=interleave(column["propinquity"], column["f_propinquity"], column["p_propinquity"]),
+        multiplier=interleave(column["multiplier"], column["f_multiplier"], column["p_multiplier"]),
+        sign=interleave(sign, sign, -sign),
+        order=interleave(np.ones(rows, dtype=np.int8), np.full(rows, 2, dtype=np.int8),
+                         np.full(rows, 2, dtype=np.int8)),
+        decisionMaker=interleave(isDecisionMaker, isDecisionMaker, isDecisionMaker),
+        agent=interleave(np.arange(rows), np.arange(rows), np.arange(rows)),
+        decay=decay)
+
+
+class ArrayDecision:
+    """
+    A drop-in replacement for felicific_calculus.Decision that stores its agents as parameter rows and evaluates
+    them as NumPy columns. It can be added to EvaluateDecisions like any other Decision.
+
+    Variables:
+    selfInterestScale = the scale of self-interest (0 = altruistic, 1 = egoistic)
+    rows = the createAgent() parameters of every agent
+    decisionMakers = whether each agent is the decision maker
+    decay = the felicific_decay.PropinquityDecay of the agents, or None for 1/propinquity^0.1
+
+    Methods:
+        createAgent() creates an agent to add to the decision
+        getColumns() returns the ConsequenceColumns of the decision
+        getMoralValue() returns the summed moral value of the decision for all agents
+        getMoralValueAt() returns the summed moral value of the decision for a given self-interest scale
+        getPartialMoralValues() returns the summed moral value of the decision maker and of the other agents
+        getNegativeMoralValue() returns the summed negative moral value of the decision for all agents
+    """
+
+    def __init__(self, selfInterestScale=None, decay=None):
+        self.selfInterestScale = selfInterestScale
+        self.rows = []
+        self.decisionMakers = []
+        self.decay = felicific_decay.getDecay(decay) if decay is not None else None
+        self.columns = None
+
+    def createAgent(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                    f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                    p_intensity=0, p_duration=0, p_propinquity=0, p_multiplier=0, isDecisionMaker=False):
+
+        self.rows.append((isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                          f_intensity, f_duration, f_propinquity, f_multiplier,
+                          p_intensity, p_duration, p_propinquity, p_multiplier))
+        self.decisionMakers.append(bool(isDecisionMaker))
+        self.columns = None
+
+    def getColumns(self):
+        if self.columns is None:
+            self.columns = expandConsequences(self.rows, self.decisionMakers, self.decay)
+        return self.columns
+
+    def getAgents(self):
+        # Agents are only materialized on request, the columns remain the source of truth
+        return [(fc.Agent(*row, decay=self.decay), decisionMaker)
+                for row, decisionMaker in zip(self.rows, self.decisionMakers)]
+
+    def getParameterRows(self):
+        return list(zip(self.rows, self.decisionMakers))
+
+    def getSelfInterestScale(self):
+        return self.selfInterestScale
+
+    def setSelfInterestScale(self, selfInterestScale):
+        self.selfInterestScale = selfInterestScale
+
+    def getPartialMoralValues(self):
+        columns = self.getColumns()
+        values = columns.getValues()
+        return float(values[columns.decisionMaker].sum()), float(values[~columns.decisionMaker].sum())
+
+    def getMoralValueAt(self, selfInterestScale):
+        return round(self.getColumns().getMoralValue(selfInterestScale), 2)
+
+    def getMoralValue(self):
+        return self.getMoralValueAt(self.selfInterestScale)
+
+    def getNegativeMoralValue(self):
+        return round(self.getColumns().getNegativeMoralValue(self.selfInterestScale), 2)
+
+    def hasDecisionMaker(self):
+        return any(self.decisionMakers)
+
+
+# Layout of the parameter matrix taken by evaluateParameterMatrix(): the 16 createAgent() fields, the decision id and
+# an optional decision maker flag
+DECISION_COLUMN = len(FIELDS)
+DECISION_MAKER_COLUMN = len(FIELDS) + 1
+
+
+def getParameterMatrix(decisions):
+    """Returns the (rows, 18) parameter matrix and the names of (name, decision) pairs."""
+    rows = []
+    decisionNames = []
+    for decisionId, (decisionName, decision) in enumerate(decisions):
+        decisionNames.append(decisionName)
+        rows.extend(tuple(parameters) + (decisionId, isDecisionMaker)
+                    for parameters, isDecisionMaker in decision.getParameterRows())
+    return np.array(rows, dtype=float).reshape(-1, DECISION_MAKER_COLUMN + 1), decisionNames
+
+
+def readParameterMatrix(decisions, selfInterestScale=None, decisionNames=None):
+    """
+    Returns the (rows, 16) createAgent() parameters, the decision id of every row, the decision names and the weight
+    of every row for the self-interest scale, from (name, decision) pairs or a parameter matrix.
+    """
+    if isinstance(decisions, np.ndarray):
+        matrix = decisions
+    else:
+        matrix, decisionNames = getParameterMatrix(decisions)
+    if matrix.ndim != 2 or matrix.shape[1] not in (DECISION_COLUMN + 1, DECISION_MAKER_COLUMN + 1):
+        raise ValueError("Parameter matrix must have " + str(DECISION_COLUMN + 1) + " or "
+                         + str(DECISION_MAKER_COLUMN + 1) + " columns.")
+    if selfInterestScale is not None and (selfInterestScale > 1 or selfInterestScale < 0):
+        raise ValueError("Self interest scale must be between 0 and 1.")
+
+    decisionIds = matrix[:, DECISION_COLUMN].astype(np.int64)
+    decisionCount = len(decisionNames) if decisionNames is not None else int(decisionIds.max(initial=-1)) + 1
+    if decisionNames is None:
+        decisionNames = list(range(decisionCount))
+
+    if selfInterestScale is None:
+        weights = np.ones(len(matrix))
+    elif matrix.shape[1] > DECISION_MAKER_COLUMN:
+        weights = np.where(matrix[:, DECISION_MAKER_COLUMN] != 0, selfInterestScale, 1 - selfInterestScale)
+    else:
+        weights = np.full(len(matrix), 1 - selfInterestScale)
+    return np.asarray(matrix[:, :DECISION_COLUMN], dtype=float), decisionIds, decisionNames, weights
+
+
+class BatchResult:
+    """
+    The per-decision results of evaluateParameterMatrix().
+
+    Variables:
+    moralValues = the moral value of every decision, indexed by decision id
+    negativeMoralValues = the negative moral value of every decision, indexed by decision id
+    decisionNames = optional names of the decisions, indexed by decision id
+
+    Methods:
+        getDecisionWithHighestValue() returns the id (or name) of the decision with the highest moral value
+        getDecisionWithLeastNegativeValue() returns the id (or name) of the decision with the negative moral value
+            closest to 0
+    """
+
+    def __init__(self, moralValues, negativeMoralValues, decisionNames=None):
+        self.moralValues = moralValues
+        self.negativeMoralValues = negativeMoralValues
+        self.decisionNames = decisionNames
+
+    def getName(self, decisionId):
+        if self.decisionNames is None:
+            return decisionId
+        return self.decisionNames[decisionId]
+
+    # np.argmax returns the first maximum, which matches the tie-breaking of max() in EvaluateDecisions
+    def getDecisionWithHighestValue(self):
+        return self.getName(int(np.argmax(self.moralValues)))
+
+    def getDecisionWithLeastNegativeValue(self):
+        return self.getName(int(np.argmax(self.negativeMoralValues)))
+
+
+def evaluateParameterMatrix(matrix, selfInterestScale=None, decisionNames=None, decisionCount=None,
+                            chunkSize=1000000, decay=None):
+    """
+    Evaluates many decisions at once without creating any Agent or Decision objects.
+
+    matrix has one row per createAgent() call: the 16 createAgent() fields, then the decision id (0, 1, 2...) and
+    optionally a decision maker flag. Rows are processed in chunks of chunkSize so memory stays bounded. Values are
+    rounded like Decision.getMoralValue() before the best decision is picked.
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    if matrix.ndim != 2 or matrix.shape[1] not in (DECISION_COLUMN + 1, DECISION_MAKER_COLUMN + 1):
+        raise ValueError("Parameter matrix must have " + str(DECISION_COLUMN + 1) + " or "
+                         + str(DECISION_MAKER_COLUMN + 1) + " columns.")
+    if selfInterestScale is not None and (selfInterestScale > 1 or selfInterestScale < 0):
+        raise ValueError("Self interest scale must be between 0 and 1.")
+
+    decisionIds = matrix[:, DECISION_COLUMN].astype(np.int64)
+    if len(decisionIds) and decisionIds.min() < 0:
+        raise ValueError("Decision ids must not be negative.")
+    if decisionCount is None:
+        decisionCount = len(decisionNames) if decisionNames is not None else int(decisionIds.max(initial=-1)) + 1
+
+    moralValues = np.zeros(decisionCount)
+    negativeMoralValues = np.zeros(decisionCount)
+
+    for start in range(0, len(matrix), chunkSize):
+        chunkValues, chunkNegativeValues = sumParameterChunk(matrix[start:start + chunkSize], selfInterestScale,
+                                                             decisionCount, decay)
+        moralValues += chunkValues
+        negativeMoralValues += chunkNegativeValues
+
+    return BatchResult(np.round(moralValues, 2), np.round(negativeMoralValues, 2), decisionNames)
+
+
+def sumParameterChunk(chunk, selfInterestScale, decisionCount, decay=None):
+    """Returns the unrounded moral values and negative moral values of every decision over the rows of a chunk."""
+    chunk = np.asarray(chunk, dtype=float)
+    decisionIds = chunk[:, DECISION_COLUMN].astype(np.int64)
+    isDecisionMaker = chunk[:, DECISION_MAKER_COLUMN] != 0 if chunk.shape[1] > DECISION_MAKER_COLUMN else None
+    columns = expandConsequences(chunk[:, :DECISION_COLUMN], isDecisionMaker, decay)
+
+    weights = columns.getWeights(selfInterestScale)
+    values = columns.getValues() * weights
+    negativeValues = np.minimum(columns.getValues(), 0) * weights
+    owners = decisionIds[columns.agent]
+    return (np.bincount(owners, weights=values, minlength=decisionCount),
+            np.bincount(owners, weights=negativeValues, minlength=decisionCount))
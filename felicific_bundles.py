@@ -0,0 +1,262 @@
+"""
+Choosing the best bundle of actions, instead of building every combination of actions as a Decision.
+
+Each action adds its own agents to a decision and has a cost. A bundle of actions is the Decision holding the agents
+of all of its actions, and its moral value is the sum of the values of its actions, since the moral value of a
+decision is a sum over its agents. BundleOptimizer therefore evaluates every action once, keeps its partial sums (of
+the decision maker and of the other agents), and searches the bundles by branch and bound over those sums:
+
+    actions are tried from the most to the least valuable, each first included and then left out
+    a branch is cut as soon as it breaks a constraint, or when even the best remaining actions that fit in the
+    remaining number of actions, or the fractional knapsack of the remaining budget, cannot beat the best bundle
+
+Constraints are a budget, a minimum and maximum number of actions, required actions, conflicting actions that may
+not be chosen together, and actions that require others. The winning bundle is then built as a Decision, whose moral
+value is the one returned.
+"""
+
+import felicific_calculus as fc
+
+
+class Action:
+    """
+    An action, which adds agents to any bundle it is part of.
+
+    Variables:
+    name = the name of the action
+    cost = the cost of the action, counted against the budget
+    required = whether every bundle must include the action
+    rows = the createAgent() arguments and isDecisionMaker flag of every agent of the action
+
+    Methods:
+        createAgent() adds an agent to the action, with the arguments of Decision.createAgent()
+        getPartialMoralValues() returns the moral values of the decision maker and of the other agents
+        getPartialNegativeMoralValues() returns the negative moral values of the decision maker and of the others
+    """
+
+    def __init__(self, name, cost=0, required=False, decay=None):
+        self.name = name
+        self.cost = cost
+        self.required = required
+        self.decay = decay
+        self.rows = []
+        # the decision of only this action's agents, built when its values are first needed
+        self.decision = None
+
+    def createAgent(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                    f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                    p_intensity=0, p_duration=0, p_propinquity=0, p_multiplier=0, isDecisionMaker=False):
+
+        self.rows.append(((isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                           f_intensity, f_duration, f_propinquity, f_multiplier,
+                           p_intensity, p_duration, p_propinquity, p_multiplier), bool(isDecisionMaker)))
+        self.decision = None
+
+    def addAgentsTo(self, decision):
+        for arguments, isDecisionMaker in self.rows:
+            decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+
+    def getDecision(self):
+        if self.decision is None:
+            self.decision = fc.Decision(decay=self.decay)
+            self.addAgentsTo(self.decision)
+        return self.decision
+
+    def getPartialMoralValues(self):
+        return self.getDecision().getPartialMoralValues()
+
+    def getPartialNegativeMoralValues(self):
+        return self.getDecision().getPartialNegativeMoralValues()
+
+
+class BundleResult:
+    """
+    The best bundle of actions.
+
+    Variables:
+    actionNames = the names of the actions of the bundle, in the order they were added to the optimizer
+    decision = the Decision holding the agents of every action of the bundle
+    moralValue = the moral value of that decision
+    negativeMoralValue = the negative moral value of that decision
+    cost = the total cost of the actions
+    """
+
+    def __init__(self, actionNames, decision, cost):
+        self.actionNames = actionNames
+        self.decision = decision
+        self.moralValue = decision.getMoralValue()
+        self.negativeMoralValue = decision.getNegativeMoralValue()
+        self.cost = cost
+
+    def __repr__(self):
+        return ("BundleResult(actionNames=" + repr(self.actionNames) + ", moralValue=" + repr(self.moralValue)
+                + ", negativeMoralValue=" + repr(self.negativeMoralValue) + ", cost=" + repr(self.cost) + ")")
+
+
+class BundleOptimizer:
+    """
+    Finds the bundle of actions with the highest moral value (or negative moral value) under constraints.
+
+    Variables:
+    budget = the most the actions of a bundle may cost together, or None
+    minActions, maxActions = the fewest and most actions of a bundle (maxActions None for no limit)
+    negative = whether to maximize the negative moral value instead of the moral value
+    actions = the actions, in the order they were added
+    conflicts = the names of the actions that may not be chosen together with each action, by action name
+    requirements = the names of the actions that must be chosen with each action, by action name
+
+    Methods:
+        addAction() adds an action and returns it, so agents can be created on it
+        addConflict() forbids two actions from being chosen together
+        addRequirement() makes an action require another
+        buildDecision() builds the Decision of a bundle of actions
+        optimize() returns the BundleResult of the best bundle
+    """
+
+    def __init__(self, budget=None, maxActions=None, minActions=0, negative=False, decay=None):
+        if maxActions is not None and maxActions < minActions:
+            raise ValueError("maxActions must be at least minActions.")
+        self.budget = budget
+        self.minActions = minActions
+        self.maxActions = maxActions
+        self.negative = negative
+        self.decay = decay
+        self.actions = []
+        self.actionsByName = {}
+        self.conflicts = {}
+        self.requirements = {}
+
+    def addAction(self, name, cost=0, required=False):
+        if name in self.actionsByName:
+            raise ValueError("There is already an action named " + str(name) + ".")
+        action = Action(name, cost, required, self.decay)
+        self.actions.append(action)
+        self.actionsByName[name] = action
+        return action
+
+    def getAction(self, name):
+        if name not in self.actionsByName:
+            raise KeyError("Unknown action: " + str(name))
+        return self.actionsByName[name]
+
+    def addConflict(self, name, otherName):
+        for actionName in (name, otherName):
+            self.getAction(actionName)
+        self.conflicts.setdefault(name, set()).add(otherName)
+        self.conflicts.setdefault(otherName, set()).add(name)
+
+    def addRequirement(self, name, requiredName):
+        for actionName in (name, requiredName):
+            self.getAction(actionName)
+        self.requirements.setdefault(name, set()).add(requiredName)
+
+    def buildDecision(self, actionNames, selfInterestScale=None):
+        decision = fc.Decision(selfInterestScale, decay=self.decay)
+        for action in self.actions:
+            if action.name in actionNames:
+                action.addAgentsTo(decision)
+        return decision
+
+    def getActionValue(self, action, selfInterestScale):
+        if self.negative:
+            decisionMakerValue, othersValue = action.getPartialNegativeMoralValues()
+        else:
+            decisionMakerValue, othersValue = action.getPartialMoralValues()
+        if selfInterestScale is None:
+            return decisionMakerValue + othersValue
+        return decisionMakerValue * selfInterestScale + othersValue * (1 - selfInterestScale)
+
+    def optimize(self, selfInterestScale=None):
+        """
+        Returns the BundleResult of the bundle with the highest moral value (the first found of equal bundles, trying
+        the most valuable actions first). Raises ValueError if no bundle meets the constraints.
+        """
+        if selfInterestScale is not None and (selfInterestScale > 1 or selfInterestScale < 0):
+            raise ValueError("Self interest scale must be between 0 and 1.")
+
+        values = {action.name: self.getActionValue(action, selfInterestScale) for action in self.actions}
+        # the most valuable actions first, so that good bundles are found early and the bounds cut more
+        actions = sorted(self.actions, key=lambda action: -values[action.name])
+        actionValues = [values[action.name] for action in actions]
+        costs = [action.cost for action in actions]
+        maxActions = len(actions) if self.maxActions is None else self.maxActions
+
+        # the sums of the positive values from each action on, as the actions are sorted by value
+        positiveSums = [0] * (len(actions) + 1)
+        for index in range(len(actions) - 1, -1, -1):
+            positiveSums[index] = positiveSums[index + 1] + max(actionValues[index], 0)
+        # the actions with a positive value by value per cost, for the fractional knapsack bound
+        byDensity = sorted((index for index in range(len(actions)) if actionValues[index] > 0),
+                           key=lambda index: -actionValues[index] / costs[index] if costs[index] > 0 else float("-inf"))
+
+        def getBound(index, slots, budget):
+            # the k best remaining actions ignore the budget, the fractional knapsack ignores the number of actions
+            bound = positiveSums[index] - positiveSums[min(index + slots, len(actions))]
+            if budget is not None:
+                knapsack = 0
+                for position in byDensity:
+                    if position < index:
+                        continue
+                    if costs[position] <= budget:
+                        knapsack += actionValues[position]
+                        budget -= costs[position]
+                    else:
+                        knapsack += actionValues[position] * budget / costs[position]
+                        break
+                bound = min(bound, knapsack)
+            return bound
+
+        best = [None, None]
+        chosen = []
+        excluded = set()
+
+        # The search is depth first, with an explicit stack rather than one recursive call per action, which would
+        # reach the recursion limit with a thousand actions. Every entry is (step, index, value, cost, budget): "search"
+        # tries the action at index, "exclude" tries leaving it out once the bundles including it were searched, and
+        # "unchoose" and "unexclude" undo the choice when its bundles were searched
+        stack = [("search", 0, 0, 0, self.budget)]
+        while stack:
+            step, index, value, cost, budget = stack.pop()
+            if step == "unchoose":
+                chosen.pop()
+                continue
+            if step == "unexclude":
+                excluded.remove(actions[index].name)
+                continue
+
+            if step == "exclude":
+                action = actions[index]
+                requiredBy = [other for other in chosen if action.name in self.requirements.get(other, ())]
+                if not action.required and not requiredBy:
+                    excluded.add(action.name)
+                    stack.append(("unexclude", index, value, cost, budget))
+                    stack.append(("search", index + 1, value, cost, budget))
+                continue
+
+            if index == len(actions):
+                if len(chosen) >= self.minActions and (best[0] is None or value > best[0]):
+                    best[0], best[1] = value, (list(chosen), cost)
+                continue
+            if len(chosen) + (len(actions) - index) < self.minActions:
+                continue
+            if best[0] is not None and value + getBound(index, maxActions - len(chosen), budget) <= best[0]:
+                continue
+
+            action = actions[index]
+            name = action.name
+            stack.append(("exclude", index, value, cost, budget))
+            if (len(chosen) < maxActions and (budget is None or action.cost <= budget)
+                    and not self.conflicts.get(name, set()).intersection(chosen)
+                    and not self.requirements.get(name, set()).intersection(excluded)):
+                chosen.append(name)
+                stack.append(("unchoose", index, value, cost, budget))
+                stack.append(("search", index + 1, value + actionValues[index], cost + action.cost,
+                              None if budget is None else budget - action.cost))
+
+        if best[1] is None:
+            raise ValueError("No bundle of actions meets the constraints.")
+
+        names, cost = best[1]
+        names = set(names)
+        actionNames = [action.name for action in self.actions if action.name in names]
+        return BundleResult(actionNames, self.buildDecision(names, selfInterestScale), cost)
@@ -0,0 +1,330 @@
+"""
+A persistent cache of decision evaluations, shared between runs and between processes.
+
+Evaluations are keyed by their source, before any Agent or Decision is built, so a hit costs a hash and a lookup
+instead of building the decisions. A source is either the rows of a decision (the createAgent() arguments and the
+decision maker flag of every agent) or a scenario file (felicific_scenario), keyed by a digest of its bytes. Either way
+the self-interest scale and the decay are part of the key:
+
+    cache = felicific_cache.EvaluationCache("evaluations.sqlite")
+    evaluations = cache.evaluateRows([("Pull the lever", rows), ("Do nothing", otherRows)], selfInterestScale=.5)
+    result = cache.evaluateScenario("scenario.bin", selfInterestScale=.5)
+
+The moral value, the negative moral value and, for rows, the values of every agent are stored in an SQLite file. The
+file holds at most maxEntries evaluations, the least recently used are evicted first. It is opened in WAL mode, so
+any number of processes can read it while one writes, and writers wait for each other instead of failing. Reads take
+no lock: the evaluations found are only marked as used in memory, and written with the next write (or flush()).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import time
+
+import felicific_calculus as fc
+import felicific_decay
+
+# Bumped whenever the key encoding or the evaluation changes, so that stale evaluations are never found
+KEY_VERSION = b"felicific-cache-4"
+
+# A row of a decision in its key: isPleasure, the other createAgent() arguments as doubles, and isDecisionMaker
+ROW_STRUCT = struct.Struct("<?" + "d" * (fc.PARAMETER_COUNT - 1) + "?")
+
+# SQLite limits the number of parameters of a statement
+BATCH_SIZE = 500
+
+# Bytes of a scenario file hashed at a time
+FILE_BLOCK_SIZE = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS evaluations (
+    key BLOB PRIMARY KEY,
+    moralValue,
+    negativeMoralValue,
+    agentValues TEXT NOT NULL,
+    lastUsed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evaluationsByLastUsed ON evaluations (lastUsed);
+CREATE TABLE IF NOT EXISTS counts (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO counts VALUES ('evaluations', 0);
+CREATE TRIGGER IF NOT EXISTS countInsert AFTER INSERT ON evaluations
+    BEGIN UPDATE counts SET value = value + 1 WHERE name = 'evaluations'; END;
+CREATE TRIGGER IF NOT EXISTS countDelete AFTER DELETE ON evaluations
+    BEGIN UPDATE counts SET value = value - 1 WHERE name = 'evaluations'; END;
+"""
+
+
+class CachedEvaluation:
+    """
+    The evaluation of one decision, as stored in the cache.
+
+    Variables:
+    moralValue = the summed moral value of the decision
+    negativeMoralValue = the summed negative moral value of the decision
+    agentValues = (moral value, negative moral value, isDecisionMaker) of every agent, in the order of the rows (empty
+        for the decisions of a scenario file)
+
+    Evaluations read from the file keep agentValues as JSON until they are first used, as most lookups only need the
+    moral values.
+    """
+
+    __slots__ = ("moralValue", "negativeMoralValue", "values", "encodedValues")
+
+    def __init__(self, moralValue, negativeMoralValue, agentValues=None, encodedValues=None):
+        self.moralValue = moralValue
+        self.negativeMoralValue = negativeMoralValue
+        self.values = agentValues
+        self.encodedValues = encodedValues
+
+    @property
+    def agentValues(self):
+        if self.values is None:
+            self.values = [tuple(values) for values in json.loads(self.encodedValues)]
+        return self.values
+
+    def getEncodedValues(self):
+        if self.encodedValues is None:
+            self.encodedValues = json.dumps(self.values)
+        return self.encodedValues
+
+    def __repr__(self):
+        return ("CachedEvaluation(moralValue=" + repr(self.moralValue) + ", negativeMoralValue="
+                + repr(self.negativeMoralValue) + ", agents=" + str(len(self.agentValues)) + ")")
+
+
+def getParameterBytes(parameters):
+    # nested parameters (e.g. the points of a TableDecay) are prefixed by their length, so they can't run together
+    if isinstance(parameters, (tuple, list)):
+        return struct.pack("<q", len(parameters)) + b"".join(getParameterBytes(value) for value in parameters)
+    return struct.pack("<d", float(parameters))
+
+
+def getKeyHash(kind, selfInterestScale=None, decay=None):
+    """Returns a hash of the key version, the kind of source, the self-interest scale and the decay."""
+    key = hashlib.blake2b(KEY_VERSION + kind, digest_size=20)
+    key.update(b"n" if selfInterestScale is None else struct.pack("<d", float(selfInterestScale)))
+    decay = felicific_decay.getDecay(decay)
+    key.update((type(decay).__module__ + "." + type(decay).__qualname__).encode("utf-8"))
+    key.update(getParameterBytes(decay.getParameters()))
+    return key
+
+
+def getRowsKey(rows, selfInterestScale=None, decay=None, keyHash=None):
+    """
+    Returns the cache key of the rows of a decision: a hash of their values, packed with ROW_STRUCT, and of the
+    self-interest scale and the decay. Equal rows have the same key however they are held: as lists or tuples, with
+    ints, floats or numpy scalars, and with the optional arguments left out or given as 0.
+    """
+    key = (keyHash or getKeyHash(b"rows", selfInterestScale, decay)).copy()
+    padding = (0,) * fc.PARAMETER_COUNT
+    for arguments, isDecisionMaker in rows:
+        arguments = tuple(arguments) + padding[len(arguments):]
+        key.update(ROW_STRUCT.pack(bool(arguments[0]), *map(float, arguments[1:]), bool(isDecisionMaker)))
+    return key.digest()
+
+
+def getFileDigest(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(FILE_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.digest()
+
+
+def buildDecision(rows, selfInterestScale=None, decay=None):
+    """Builds a Decision from rows of (createAgent() arguments, isDecisionMaker)."""
+    decision = fc.Decision(selfInterestScale, decay=decay)
+    for arguments, isDecisionMaker in rows:
+        decision.createAgent(*arguments, isDecisionMaker=isDecisionMaker)
+    return decision
+
+
+def getAgentValues(decision):
+    return [(agent.getMoralValue(), agent.getNegativeMoralValue(), bool(isDecisionMaker))
+            for agent, isDecisionMaker in decision.getAgents()]
+
+
+class EvaluationCache:
+    """
+    An SQLite file of decision evaluations, with least recently used eviction.
+
+    Variables:
+    path = the path of the SQLite file
+    maxEntries = how many evaluations the file holds at most
+    timeout = how many seconds to wait for another process writing to the file
+
+    Methods:
+        get() returns the CachedEvaluation stored for a key, or None
+        getMany() returns the CachedEvaluations stored for any of the given keys, by key
+        put() stores the evaluation of a key
+        putMany() stores the evaluations of (key, CachedEvaluation) pairs in one transaction
+        evaluateRows() returns the evaluation of every (name, rows) pair, building only the decisions not cached
+        evaluateScenario() returns the felicific_arrays.BatchResult of a scenario file, reading its records only if
+            it is not cached
+        flush() writes when the evaluations found since the last write were used
+        clear() removes every evaluation
+        close() flushes and closes the file
+    """
+
+    def __init__(self, path, maxEntries=100000, timeout=60):
+        if maxEntries < 1:
+            raise ValueError("maxEntries must be at least 1.")
+        self.path = path
+        self.maxEntries = maxEntries
+        self.timeout = timeout
+        self.connection = None
+        self.processId = None
+        # when each evaluation found since the last write was used, written with the next write
+        self.usedKeys = {}
+
+    def getConnection(self):
+        # a connection must not be shared with a forked process, so each process opens its own
+        if self.connection is None or self.processId != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript("BEGIN IMMEDIATE;" + SCHEMA + "COMMIT;")
+            self.connection = connection
+            self.processId = os.getpid()
+            self.usedKeys = {}
+        return self.connection
+
+    def write(self, function, *arguments):
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait rather than deadlock
+        connection = self.getConnection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.storeUsedKeys(connection)
+            result = function(connection, *arguments)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        self.usedKeys = {}
+        return result
+
+    def storeUsedKeys(self, connection):
+        connection.executemany("UPDATE evaluations SET lastUsed = ? WHERE key = ?",
+                               [(used, key) for key, used in self.usedKeys.items()])
+
+    def getMany(self, keys):
+        keys = list(dict.fromkeys(keys))
+        connection = self.getConnection()
+        evaluations = {}
+        # without a transaction every SELECT reads a consistent snapshot and never waits for a writer
+        for start in range(0, len(keys), BATCH_SIZE):
+            batch = keys[start:start + BATCH_SIZE]
+            rows = connection.execute(
+                "SELECT key, moralValue, negativeMoralValue, agentValues FROM evaluations WHERE key IN ("
+                + ",".join("?" * len(batch)) + ")", batch)
+            for key, moralValue, negativeMoralValue, agentValues in rows:
+                evaluations[bytes(key)] = CachedEvaluation(moralValue, negativeMoralValue, encodedValues=agentValues)
+
+        # the evaluations found become the most recently used once the next write stores it
+        now = time.time()
+        for key in evaluations:
+            self.usedKeys[key] = now
+        return evaluations
+
+    def get(self, key):
+        return self.getMany([key]).get(key)
+
+    def putMany(self, evaluations):
+        evaluations = list(evaluations)
+        if evaluations:
+            self.write(self.storeEvaluations, evaluations)
+
+    def storeEvaluations(self, connection, evaluations):
+        now = time.time()
+        connection.executemany(
+            "INSERT INTO evaluations VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "moralValue = excluded.moralValue, negativeMoralValue = excluded.negativeMoralValue, "
+            "agentValues = excluded.agentValues, lastUsed = excluded.lastUsed",
+            [(key, evaluation.moralValue, evaluation.negativeMoralValue, evaluation.getEncodedValues(), now)
+             for key, evaluation in evaluations])
+
+        # the count is kept by triggers, so eviction never has to count the whole table
+        count, = connection.execute("SELECT value FROM counts WHERE name = 'evaluations'").fetchone()
+        if count > self.maxEntries:
+            connection.execute("DELETE FROM evaluations WHERE key IN "
+                               "(SELECT key FROM evaluations ORDER BY lastUsed LIMIT ?)", (count - self.maxEntries,))
+
+    def put(self, key, evaluation):
+        self.putMany([(key, evaluation)])
+
+    def evaluateRows(self, decisions, selfInterestScale=None, decay=None):
+        """
+        Returns the CachedEvaluation of every (name, rows) pair, where rows are the (createAgent() arguments,
+        isDecisionMaker) of the agents of a decision, e.g. Decision.getParameterRows(). Only the decisions that are not
+        cached are built, and their evaluations are stored in one transaction.
+        """
+        decisions = list(decisions)
+        keyHash = getKeyHash(b"rows", selfInterestScale, decay)
+        keys = [getRowsKey(rows, keyHash=keyHash) for decisionName, rows in decisions]
+        evaluations = self.getMany(keys)
+
+        missing = {}
+        for key, (decisionName, rows) in zip(keys, decisions):
+            if key not in evaluations and key not in missing:
+                decision = buildDecision(rows, selfInterestScale, decay)
+                missing[key] = CachedEvaluation(decision.getMoralValue(), decision.getNegativeMoralValue(),
+                                                getAgentValues(decision))
+        if missing:
+            self.putMany(missing.items())
+            evaluations.update(missing)
+
+        return [evaluations[key] for key in keys]
+
+    def evaluateScenario(self, path, selfInterestScale=None, decay=None, chunkSize=1000000, workers=1):
+        """
+        Returns the felicific_arrays.BatchResult of a scenario file, from the cache or by evaluating the file (see
+        felicific_scenario.Scenario.evaluate()) and storing the value of every decision.
+        """
+        import numpy as np
+        import felicific_arrays as fa
+        import felicific_scenario
+
+        keyHash = getKeyHash(b"scenario", selfInterestScale, decay)
+        keyHash.update(getFileDigest(path))
+        scenario = felicific_scenario.loadScenario(path)
+        keys = []
+        for decisionId in range(len(scenario.decisionNames)):
+            key = keyHash.copy()
+            key.update(decisionId.to_bytes(8, "little"))
+            keys.append(key.digest())
+
+        evaluations = self.getMany(keys)
+        if len(evaluations) == len(keys):
+            return fa.BatchResult(np.array([evaluations[key].moralValue for key in keys], dtype=float),
+                                  np.array([evaluations[key].negativeMoralValue for key in keys], dtype=float),
+                                  scenario.decisionNames)
+
+        result = scenario.evaluate(selfInterestScale, chunkSize=chunkSize, decay=decay, workers=workers)
+        self.putMany((key, CachedEvaluation(float(moralValue), float(negativeMoralValue), []))
+                     for key, moralValue, negativeMoralValue in zip(keys, result.moralValues,
+                                                                    result.negativeMoralValues))
+        return result
+
+    def flush(self):
+        if self.usedKeys:
+            self.write(lambda connection: None)
+
+    def clear(self):
+        self.write(lambda connection: connection.execute("DELETE FROM evaluations"))
+
+    def __len__(self):
+        return self.getConnection().execute("SELECT value FROM counts WHERE name = 'evaluations'").fetchone()[0]
+
+    def close(self):
+        if self.connection is not None and self.processId == os.getpid():
+            self.flush()
+            self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exception, traceback):
+        self.close()
@@ -33,7 +33,30 @@ Formula:
     All of these values are summed together to get the total moral value of an action.
 """
 
-import math
+import heapq
+import logging
+import operator
+import weakref
+from array import array
+from collections.abc import Sequence
+
+import felicific_decay
+import felicific_pareto
+import felicific_results
+
+# Warnings and notices go through logging, so nothing is written unless the application configures a handler
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# The arguments of Agent.addConsequence(), which are also those of Decision.createAgent() before isDecisionMaker
+PARAMETER_NAMES = ("isPleasure", "intensity", "duration", "certainty", "propinquity", "fecundity", "purity",
+                   "multiplier", "f_intensity", "f_duration", "f_propinquity", "f_multiplier",
+                   "p_intensity", "p_duration", "p_propinquity", "p_multiplier")
+PARAMETER_COUNT = len(PARAMETER_NAMES)
+
+# Decisions add the change in value of every changed agent to their totals, and sum the totals again from the agents
+# after this many changes, so that the rounding errors of the additions don't build up
+RESUM_INTERVAL = 1000
 
 
 class Agent:
@@ -59,57 +82,305 @@ class Agent:
     p_propinquity = the propinquity (nearness in time) of the 2nd order consequence of the opposite type
     p_multiplier = the multiplier for the number of people affected equally by the 2nd order consequence of the opposite type
 
+    decay = the felicific_decay.PropinquityDecay applied to the propinquities, or None for 1/propinquity^0.1
+    consequences = the value of every consequence (read-only, see getConsequences())
+
+    Agents use __slots__ and only keep the arguments of their addConsequence() calls, as scenarios can hold millions
+    of them. The consequences and their sums are computed from the arguments when they are asked for, as decisions
+    keep their own totals.
+
     Methods:
         getMoralValue() returns the moral value of the action
+        getValues() returns the moral value and the negative moral value of the action
+        getConsequences() returns the value of every consequence
+        getParameters() returns the arguments of every addConsequence() call
+        setParameter() changes one argument of an addConsequence() call and updates the consequences
+        getPositiveMoralValue() returns the summed value of the pleasurable consequences
+        getNegativeMoralValue() returns the summed value of the painful consequences
+        addObserver() registers an object whose agentChanged() is called when the consequences change
+        removeObserver() unregisters an observer
     """
 
+    __slots__ = ("parameters", "observers", "decay")
+
     def __init__(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
                  f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
                  p_intensity=0, p_duration=0, p_propinquity=0,
-                 p_multiplier=0):
+                 p_multiplier=0, decay=None):
+
+        # The arguments of every addConsequence() call as given, 16 values per call, so the agent can be stored,
+        # rebuilt or changed. Most agents have a single consequence without 2nd order arguments, so for them only
+        # the first 8 are kept
+        if (f_intensity or f_duration or f_propinquity or f_multiplier
+                or p_intensity or p_duration or p_propinquity or p_multiplier):
+            self.parameters = (isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                               f_intensity, f_duration, f_propinquity, f_multiplier,
+                               p_intensity, p_duration, p_propinquity, p_multiplier)
+        else:
+            self.parameters = (isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier)
+        # The decisions holding this agent, which are told when its consequences change: None, a single observer
+        # (most agents belong to one decision) or a list of them
+        self.observers = None
+        self.decay = decay
 
-        self.consequences = []
-        self.addConsequence(isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
-                            f_intensity, f_duration, f_propinquity, f_multiplier, p_intensity, p_duration,
-                            p_propinquity,
-                            p_multiplier)
+    @property
+    def consequences(self):
+        return self.getConsequences()
 
     def getConsequences(self):
-        return self.consequences
-
-    def addConsequence(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
-                       f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
-                       p_intensity=0, p_duration=0, p_propinquity=0,
-                       p_multiplier=0):
-
-        adjusted_propinquity = 1 / math.pow(propinquity, .1) if propinquity != 0 else 1
+        consequences = array("d")
+        for parameters in self.getParameters():
+            consequences.extend(self.computeConsequences(*parameters, decay=self.decay))
+        return consequences
+
+    def getParameters(self):
+        parameters = self.parameters
+        if len(parameters) < PARAMETER_COUNT:
+            return [parameters + (0,) * (PARAMETER_COUNT - len(parameters))]
+        return [parameters[start:start + PARAMETER_COUNT] for start in range(0, len(parameters), PARAMETER_COUNT)]
+
+    @staticmethod
+    def computeConsequences(isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                            f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                            p_intensity=0, p_duration=0, p_propinquity=0,
+                            p_multiplier=0, decay=None):
+
+        if decay is None:
+            decay = felicific_decay.DEFAULT_DECAY
+        consequences = []
+        adjusted_propinquity = decay.getValue(propinquity)
 
         if isPleasure:
-            self.consequences.append(certainty * (intensity * duration * adjusted_propinquity * multiplier))
+            consequences.append(certainty * (intensity * duration * adjusted_propinquity * multiplier))
         else:
-            self.consequences.append(-1 * certainty * (intensity * duration * adjusted_propinquity * multiplier))
+            consequences.append(-1 * certainty * (intensity * duration * adjusted_propinquity * multiplier))
 
-        # The following lines are used to add 2nd order consequences.
+        # The following lines are used to add 2nd order consequences, each decayed by its own propinquity.
+        # The decay is only computed for the consequences that exist.
         if isPleasure:
-            f_adjusted_propinquity = 1 / math.pow(f_propinquity, .1) if f_propinquity != 0 else 1
             if fecundity != 0:
-                self.consequences.append(fecundity * (f_intensity * f_duration * f_adjusted_propinquity * f_multiplier))
+                f_adjusted_propinquity = decay.getValue(f_propinquity)
+                consequences.append(fecundity * (f_intensity * f_duration * f_adjusted_propinquity * f_multiplier))
             if purity != 0:
-                self.consequences.append(-1 * purity * (p_intensity * p_duration * f_adjusted_propinquity * p_multiplier))
+                p_adjusted_propinquity = decay.getValue(p_propinquity)
+                consequences.append(-1 * purity * (p_intensity * p_duration * p_adjusted_propinquity * p_multiplier))
 
         else:
-            p_adjusted_propinquity = 1 / math.pow(p_propinquity, .1) if p_propinquity != 0 else 1
             if fecundity != 0:
-                self.consequences.append(
-                    -1 * fecundity * (f_intensity * f_duration * p_adjusted_propinquity * f_multiplier))
+                f_adjusted_propinquity = decay.getValue(f_propinquity)
+                consequences.append(
+                    -1 * fecundity * (f_intensity * f_duration * f_adjusted_propinquity * f_multiplier))
             if purity != 0:
-                self.consequences.append(purity * (p_intensity * p_duration * p_adjusted_propinquity * p_multiplier))
+                p_adjusted_propinquity = decay.getValue(p_propinquity)
+                consequences.append(purity * (p_intensity * p_duration * p_adjusted_propinquity * p_multiplier))
+
+        return consequences
+
+    def addConsequence(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                       f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                       p_intensity=0, p_duration=0, p_propinquity=0,
+                       p_multiplier=0):
+
+        consequences = self.computeConsequences(isPleasure, intensity, duration, certainty, propinquity, fecundity,
+                                                purity, multiplier, f_intensity, f_duration, f_propinquity,
+                                                f_multiplier, p_intensity, p_duration, p_propinquity, p_multiplier,
+                                                self.decay)
+        # the calls are 16 values apart, so the first one is completed if its 2nd order arguments were left out
+        self.parameters = sum(self.getParameters(), ()) + (
+            isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+            f_intensity, f_duration, f_propinquity, f_multiplier, p_intensity, p_duration, p_propinquity, p_multiplier)
+        self.consequencesChanged((), consequences)
+
+    def setParameter(self, name, value, consequence=0):
+        """
+        Changes one argument of an addConsequence() call (the first one by default), recomputing only the consequences
+        of that call and passing the change in value on to the observers of the agent.
+        """
+        parameterIndex = PARAMETER_NAMES.index(name)
+        rows = self.getParameters()
+        if not 0 <= consequence < len(rows):
+            raise IndexError("Agent has no consequence " + str(consequence) + ".")
+
+        # the consequences are computed from the arguments, so only those of this call are computed again
+        oldRow = rows[consequence]
+        newRow = oldRow[:parameterIndex] + (value,) + oldRow[parameterIndex + 1:]
+        oldConsequences = self.computeConsequences(*oldRow, decay=self.decay)
+        newConsequences = self.computeConsequences(*newRow, decay=self.decay)
+        rows[consequence] = newRow
+        self.parameters = sum(rows, ())
+        self.consequencesChanged(oldConsequences, newConsequences)
+
+    @staticmethod
+    def getTotals(consequences):
+        # returns the summed value of the consequences and of the painful ones
+        moralValue = 0
+        negativeMoralValue = 0
+        for consequence in consequences:
+            moralValue += consequence
+            if consequence < 0:
+                negativeMoralValue += consequence
+        return moralValue, negativeMoralValue
+
+    def consequencesChanged(self, removedConsequences, addedConsequences):
+        # passes the change in value on to the observers
+        if self.observers is None:
+            return
+        addedMoralValue, addedNegativeMoralValue = self.getTotals(addedConsequences)
+        removedMoralValue, removedNegativeMoralValue = self.getTotals(removedConsequences)
+        changedMoralValue = addedMoralValue - removedMoralValue
+        changedNegativeMoralValue = addedNegativeMoralValue - removedNegativeMoralValue
+        for observer in self.observers if isinstance(self.observers, list) else (self.observers,):
+            observer.agentChanged(self, changedMoralValue, changedNegativeMoralValue)
+
+    def addObserver(self, observer):
+        if self.observers is None:
+            self.observers = observer
+        elif isinstance(self.observers, list):
+            self.observers.append(observer)
+        else:
+            self.observers = [self.observers, observer]
+
+    def removeObserver(self, observer):
+        if self.observers is observer:
+            self.observers = None
+        elif isinstance(self.observers, list):
+            self.observers = [other for other in self.observers if other is not observer]
+
+    def getValues(self):
+        return self.getTotals(self.getConsequences())
 
     def getMoralValue(self):
-        return sum(self.consequences)
+        return self.getValues()[0]
+
+    def getPositiveMoralValue(self):
+        moralValue, negativeMoralValue = self.getValues()
+        return moralValue - negativeMoralValue
 
     def getNegativeMoralValue(self):
-        return sum([x for x in self.consequences if x < 0])
+        return self.getValues()[1]
+
+
+class PooledAgent(Agent):
+    """
+    An agent interned by an AgentPool, which may be held by many decisions. Its consequences cannot change, as the
+    change would reach every decision holding it: Decision.setAgentParameter() changes a copy of it instead, made
+    for the decision being edited. As it cannot change, and pools hold few agents, its values are kept.
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self, *arguments, decay=None):
+        super().__init__(*arguments, decay=decay)
+        self.values = super().getValues()
+
+    def getValues(self):
+        return self.values
+
+    def addConsequence(self, *arguments):
+        raise ValueError("A pooled agent is shared by its decisions and cannot change. Create the agent without a "
+                         "pool to add consequences to it.")
+
+    def setParameter(self, name, value, consequence=0):
+        raise ValueError("A pooled agent is shared by its decisions and cannot change. Use "
+                         "Decision.setAgentParameter() to change it in one decision.")
+
+
+class AgentPool:
+    """
+    Interns agents by their createAgent() arguments, so that an agent shared by many decisions is stored and
+    evaluated only once. Decisions created with a pool hold references to its agents, with a multiplicity when the
+    same agent is added more than once.
+
+    Pooled agents cannot change, as they are shared: Decision.setAgentParameter() replaces the pooled agent of one
+    decision by a copy of its own before changing it, so the other decisions keep the pooled agent.
+
+    Variables:
+    agents = the interned agents, by their arguments
+
+    Methods:
+        getAgent() returns the agent for the given arguments, creating it the first time
+    """
+
+    def __init__(self):
+        self.agents = {}
+
+    def __len__(self):
+        return len(self.agents)
+
+    def getAgent(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                 f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                 p_intensity=0, p_duration=0, p_propinquity=0, p_multiplier=0, decay=None):
+
+        key = (bool(isPleasure), intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+               f_intensity, f_duration, f_propinquity, f_multiplier, p_intensity, p_duration, p_propinquity,
+               p_multiplier, decay)
+        agent = self.agents.get(key)
+        if agent is None:
+            agent = PooledAgent(*key[:-1], decay=decay)
+            self.agents[key] = agent
+        return agent
+
+
+class DecisionMakerObserver:
+    """Passes the changes of the decision makers of a decision on to the decision, flagged as such."""
+
+    __slots__ = ("decision",)
+
+    def __init__(self, decision):
+        self.decision = decision
+
+    def agentChanged(self, agent, changedMoralValue, changedNegativeMoralValue):
+        self.decision.agentChanged(agent, changedMoralValue, changedNegativeMoralValue, True)
+
+
+class AgentView(Sequence):
+    """
+    A view of the agents of a decision as (Agent, isDecisionMaker) tuples, which are only created when accessed.
+
+    Decision.agents used to be a list of these tuples. Agents can still be appended to it (or extended) as tuples,
+    which adds them like Decision.addAgent(), but they cannot be replaced or removed through it.
+    """
+
+    __slots__ = ("decision", "positions")
+
+    def __init__(self, decision):
+        self.decision = decision
+        self.positions = None
+        self.updatePositions()
+
+    def updatePositions(self):
+        # agents added several times to a pooled decision are repeated, as if each had been created separately
+        decision = self.decision
+        self.positions = None
+        if decision.multiplicities:
+            self.positions = [position for position in range(len(decision.agentList))
+                              for copy in range(decision.getMultiplicity(position))]
+
+    def __len__(self):
+        if self.positions is not None:
+            return len(self.positions)
+        return len(self.decision.agentList)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if self.positions is not None:
+            index = self.positions[index]
+        return self.decision.agentList[index], self.decision.isDecisionMaker(index)
+
+    def append(self, agent):
+        agent, isDecisionMaker = agent
+        self.decision.addAgent(agent, isDecisionMaker)
+        self.updatePositions()
+
+    def extend(self, agents):
+        for agent in agents:
+            self.append(agent)
+
+    def __repr__(self):
+        return repr(list(self))
 
 
 class Decision:
@@ -118,78 +389,288 @@ class Decision:
 
     Variables:
     self_interest_scale = the scale of self-interest (0 = altruistic, 1 = egoistic)
-    agents = a list of agents affected by the decision
+    agents = a view of the agents affected by the decision, as (Agent, isDecisionMaker) tuples, to which agents can
+        be appended but which cannot be changed otherwise (see AgentView)
+    agentList = the agents affected by the decision
+    decisionMakerIndexes = the positions of the decision makers in agentList
+    pool = an optional AgentPool the agents are taken from
+    decay = the felicific_decay.PropinquityDecay of the agents, or None for 1/propinquity^0.1
+    multiplicities = how many times the agents of a pooled decision were added, for those added more than once
+    changes = the number of agent changes added to the totals since they were last summed from the agents
 
     Methods:
-        createAgent() creates an agent to add to the decision
+        createAgent() creates an agent to add to the decision, or takes it from the pool
+        createCohortAgent() creates an agent standing for a cohort whose members differ, and adds it to the decision
+        addAgent() adds an agent that was already created
+        getAgentCounts() returns every distinct agent with its multiplicity
+        getParameterRows() returns the createAgent() arguments of every agent
         getMoralValue() returns the summed moral value of the decision for all agents
+        getMoralValueAt() returns the summed moral value of the decision for a given self-interest scale
+        getPartialMoralValues() returns the summed moral value of the decision maker and of the other agents
+        getNegativeMoralValue() returns the summed negative moral value of the decision for all agents
+        getPartialNegativeMoralValues() returns the summed negative moral value of the decision maker and of the
+            other agents
         setSelfInterestScale() sets the self-interest scale
         checkForDecisionMaker() checks if there is a decision maker among the agents
+        setAgentParameter() changes one argument of an agent of the decision, copying it first if it is pooled
+        addObserver() registers an object whose decisionChanged() is called when the moral value may have changed
+        removeObserver() unregisters an observer
     """
 
-    def __init__(self, selfInterestScale=None):
+    __slots__ = ("selfInterestScale", "agentList", "decisionMakerIndexes", "pool", "agentPositions", "multiplicities",
+                 "decisionMakerMoralValue", "othersMoralValue", "decisionMakerNegativeMoralValue",
+                 "othersNegativeMoralValue", "changes", "cachedValues", "observers", "decisionMakerObserver", "decay")
+
+    def __init__(self, selfInterestScale=None, pool=None, decay=None):
         self.selfInterestScale = selfInterestScale
-        self.agents = []
+        self.agentList = []
+        # The decision maker flag is kept here rather than next to every agent, usually there is only one
+        self.decisionMakerIndexes = set()
+        self.pool = pool
+        # a decay given by name (e.g. "exponential") is built with its default parameters
+        self.decay = felicific_decay.getDecay(decay) if decay is not None else None
+        # For pooled decisions, the position of every (agent, isDecisionMaker) in agentList
+        self.agentPositions = {} if pool is not None else None
+        self.multiplicities = {}
+        # Running totals over the agents, split between the decision maker and the others
+        self.decisionMakerMoralValue = 0
+        self.othersMoralValue = 0
+        self.decisionMakerNegativeMoralValue = 0
+        self.othersNegativeMoralValue = 0
+        self.changes = 0
+        # (selfInterestScale, moral value, negative moral value) of the last evaluation
+        self.cachedValues = None
+        self.observers = ()
+        self.decisionMakerObserver = None
 
     def createAgent(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
                     f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
                     p_intensity=0, p_duration=0, p_propinquity=0, p_multiplier=0, isDecisionMaker=False):
 
+        isDecisionMaker = bool(isDecisionMaker)
+        if self.pool is None:
+            agent = Agent(isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                          f_intensity, f_duration, f_propinquity, f_multiplier,
+                          p_intensity, p_duration, p_propinquity, p_multiplier, self.decay)
+            # the new agent has no other observer
+            agent.observers = self.getAgentObserver(isDecisionMaker)
+            # the values are summed from the arguments at hand rather than read back from the agent
+            moralValue, negativeMoralValue = Agent.getTotals(Agent.computeConsequences(
+                isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                f_intensity, f_duration, f_propinquity, f_multiplier, p_intensity, p_duration, p_propinquity,
+                p_multiplier, self.decay))
+        else:
+            agent = self.pool.getAgent(isPleasure, intensity, duration, certainty, propinquity, fecundity, purity,
+                                       multiplier, f_intensity, f_duration, f_propinquity, f_multiplier,
+                                       p_intensity, p_duration, p_propinquity, p_multiplier, self.decay)
+            position = self.agentPositions.get((id(agent), isDecisionMaker))
+            if position is not None:
+                # the agent is already part of this decision, so it only counts once more
+                self.multiplicities[position] = self.getMultiplicity(position) + 1
+                self.updateAgentTotals(isDecisionMaker, *agent.values)
+                return
+            # pooled agents cannot change, so they are not observed
+            self.agentPositions[(id(agent), isDecisionMaker)] = len(self.agentList)
+            moralValue, negativeMoralValue = agent.values
+
+        # if we have a decision maker, we need to note that
+        if isDecisionMaker:
+            self.decisionMakerIndexes.add(len(self.agentList))
+        self.agentList.append(agent)
+        # the totals are updated inline rather than with updateAgentTotals(), as this is called for every agent
+        if isDecisionMaker:
+            self.decisionMakerMoralValue += moralValue
+            self.decisionMakerNegativeMoralValue += negativeMoralValue
+        else:
+            self.othersMoralValue += moralValue
+            self.othersNegativeMoralValue += negativeMoralValue
+        self.changed()
+
+    def createCohortAgent(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity,
+                          multiplier, f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                          p_intensity=0, p_duration=0, p_propinquity=0, p_multiplier=0, isDecisionMaker=False):
+        """
+        Creates a felicific_cohort.CohortAgent, whose arguments may be felicific_cohort.Histogram distributions over
+        its members, and adds it to the decision. Cohorts are never taken from the pool.
+        """
+        import felicific_cohort
+        self.addAgent(felicific_cohort.CohortAgent(isPleasure, intensity, duration, certainty, propinquity, fecundity,
+                                                   purity, multiplier, f_intensity, f_duration, f_propinquity,
+                                                   f_multiplier, p_intensity, p_duration, p_propinquity, p_multiplier,
+                                                   self.decay), isDecisionMaker)
+
+    def addAgent(self, agent, isDecisionMaker=False):
+        """
+        Adds an agent that was already created, e.g. a felicific_cohort.CohortAgent. createAgent() does the same
+        inline, as it is called for every agent.
+        """
+        isDecisionMaker = bool(isDecisionMaker)
+        if self.agentPositions is not None:
+            position = self.agentPositions.get((id(agent), isDecisionMaker))
+            if position is not None:
+                # the agent is already part of this decision, so it only counts once more
+                self.multiplicities[position] = self.getMultiplicity(position) + 1
+                self.updateAgentTotals(isDecisionMaker, *agent.getValues())
+                return
+            self.agentPositions[(id(agent), isDecisionMaker)] = len(self.agentList)
+
         # if we have a decision maker, we need to note that
         if isDecisionMaker:
-            self.agents.append(
-                (Agent(isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
-                       f_intensity, f_duration, f_propinquity, f_multiplier,
-                       p_intensity, p_duration, p_propinquity, p_multiplier), True))
+            self.decisionMakerIndexes.add(len(self.agentList))
+        self.agentList.append(agent)
+        if not isinstance(agent, PooledAgent):
+            agent.addObserver(self.getAgentObserver(isDecisionMaker))
+        self.updateAgentTotals(isDecisionMaker, *agent.getValues())
+
+    def setAgentParameter(self, position, name, value, consequence=0):
+        """
+        Changes one argument of the agent at the given position of agentList, like Agent.setParameter(). A pooled
+        agent may be held by other decisions, so it is first replaced by a copy of its own in this decision (for every
+        time it was added), and only the copy is changed.
+        """
+        agent = self.agentList[position]
+        if isinstance(agent, PooledAgent):
+            isDecisionMaker = self.isDecisionMaker(position)
+            copy = Agent(*agent.parameters, decay=agent.decay)
+            del self.agentPositions[(id(agent), isDecisionMaker)]
+            self.agentPositions[(id(copy), isDecisionMaker)] = position
+            self.agentList[position] = copy
+            copy.addObserver(self.getAgentObserver(isDecisionMaker))
+            agent = copy
+        agent.setParameter(name, value, consequence)
+
+    def getMultiplicity(self, position):
+        return self.multiplicities.get(position, 1)
+
+    # the agents observe the decision through this object, and the decision makers through a DecisionMakerObserver,
+    # so that agents don't have to keep their decision maker flag
+    def getAgentObserver(self, isDecisionMaker):
+        if not isDecisionMaker:
+            return self
+        if self.decisionMakerObserver is None:
+            self.decisionMakerObserver = DecisionMakerObserver(self)
+        return self.decisionMakerObserver
+
+    # called by an agent of this decision when its consequences change
+    def agentChanged(self, agent, addedMoralValue, addedNegativeMoralValue, isDecisionMaker=False):
+        if self.agentPositions is not None:
+            multiplicity = self.getMultiplicity(self.agentPositions[(id(agent), isDecisionMaker)])
+            addedMoralValue *= multiplicity
+            addedNegativeMoralValue *= multiplicity
+        self.changes += 1
+        if self.changes < RESUM_INTERVAL:
+            self.updateAgentTotals(isDecisionMaker, addedMoralValue, addedNegativeMoralValue)
+        else:
+            self.sumAgentTotals()
+
+    def sumAgentTotals(self):
+        # sums the totals from the agents, in the order they were added, as createAgent() does
+        self.decisionMakerMoralValue = 0
+        self.othersMoralValue = 0
+        self.decisionMakerNegativeMoralValue = 0
+        self.othersNegativeMoralValue = 0
+        for position, agent in enumerate(self.agentList):
+            moralValue, negativeMoralValue = agent.getValues()
+            isDecisionMaker = self.isDecisionMaker(position)
+            for copy in range(self.getMultiplicity(position)):
+                if isDecisionMaker:
+                    self.decisionMakerMoralValue += moralValue
+                    self.decisionMakerNegativeMoralValue += negativeMoralValue
+                else:
+                    self.othersMoralValue += moralValue
+                    self.othersNegativeMoralValue += negativeMoralValue
+        self.changes = 0
+        self.changed()
 
+    def updateAgentTotals(self, isDecisionMaker, addedMoralValue, addedNegativeMoralValue):
+        if isDecisionMaker:
+            self.decisionMakerMoralValue += addedMoralValue
+            self.decisionMakerNegativeMoralValue += addedNegativeMoralValue
         else:
-            self.agents.append(
-                (Agent(isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
-                       f_intensity, f_duration, f_propinquity, f_multiplier,
-                       p_intensity, p_duration, p_propinquity, p_multiplier), False))
+            self.othersMoralValue += addedMoralValue
+            self.othersNegativeMoralValue += addedNegativeMoralValue
+        self.changed()
+
+    def changed(self):
+        self.cachedValues = None
+        for reference in self.observers:
+            observer = reference()
+            if observer is not None:
+                observer.decisionChanged(self)
+
+    # observers are held by weak references, so an EvaluateDecisions that is no longer used is not kept alive (and
+    # told of changes) by the decisions it evaluated
+    def addObserver(self, observer):
+        self.observers = tuple(reference for reference in self.observers
+                               if reference() is not None) + (weakref.ref(observer),)
+
+    def removeObserver(self, observer):
+        self.observers = tuple(reference for reference in self.observers
+                               if reference() is not None and reference() is not observer)
+
+    @property
+    def agents(self):
+        return AgentView(self)
 
     def getAgents(self):
-        return self.agents
+        return AgentView(self)
+
+    def isDecisionMaker(self, index):
+        return index in self.decisionMakerIndexes
+
+    # returns (agent, isDecisionMaker, multiplicity) for every distinct agent
+    def getAgentCounts(self):
+        return [(agent, self.isDecisionMaker(position), self.getMultiplicity(position))
+                for position, agent in enumerate(self.agentList)]
+
+    # returns (createAgent() arguments, isDecisionMaker) for every consequence added to the agents
+    def getParameterRows(self):
+        return [(parameters, isDecisionMaker) for agent, isDecisionMaker in self.getAgents()
+                for parameters in agent.getParameters()]
 
     def getSelfInterestScale(self):
         return self.selfInterestScale
 
     def setSelfInterestScale(self, selfInterestScale):
         self.selfInterestScale = selfInterestScale
+        self.changed()
 
-    def getMoralValue(self):
-        totalMoralValue = 0
+    def getPartialMoralValues(self):
+        # The moral value of a decision is linear in the self-interest scale:
+        # decision maker sum * scale + others sum * (1 - scale)
+        return self.decisionMakerMoralValue, self.othersMoralValue
 
-        for agent in self.agents:
-            if self.selfInterestScale is not None:
-                if agent[1]:
-                    totalMoralValue += agent[0].getMoralValue() * self.selfInterestScale
-                else:
-                    totalMoralValue += agent[0].getMoralValue() * (1 - self.selfInterestScale)
-            else:
-                totalMoralValue += agent[0].getMoralValue()
+    def getPartialNegativeMoralValues(self):
+        return self.decisionMakerNegativeMoralValue, self.othersNegativeMoralValue
 
-        return round(totalMoralValue, 2)
+    def getMoralValueAt(self, selfInterestScale):
+        return self.scalePartialValues(self.getPartialMoralValues(), selfInterestScale)
 
-    def getNegativeMoralValue(self):
-        totalMoralValue = 0
+    def getNegativeMoralValueAt(self, selfInterestScale):
+        return self.scalePartialValues(self.getPartialNegativeMoralValues(), selfInterestScale)
 
-        for agent in self.agents:
-            if self.selfInterestScale is not None:
-                if agent[1]:
-                    totalMoralValue += agent[0].getNegativeMoralValue() * self.selfInterestScale
-                else:
-                    totalMoralValue += agent[0].getNegativeMoralValue() * (1 - self.selfInterestScale)
-            else:
-                totalMoralValue += agent[0].getNegativeMoralValue()
+    @staticmethod
+    def scalePartialValues(partialValues, selfInterestScale):
+        decisionMakerValue, othersValue = partialValues
 
-        return round(totalMoralValue, 2)
+        if selfInterestScale is None:
+            return round(decisionMakerValue + othersValue, 2)
+        return round(decisionMakerValue * selfInterestScale + othersValue * (1 - selfInterestScale), 2)
+
+    def getCachedValues(self):
+        if self.cachedValues is None or self.cachedValues[0] != self.selfInterestScale:
+            self.cachedValues = (self.selfInterestScale, self.getMoralValueAt(self.selfInterestScale),
+                                 self.getNegativeMoralValueAt(self.selfInterestScale))
+        return self.cachedValues
+
+    def getMoralValue(self):
+        return self.getCachedValues()[1]
+
+    def getNegativeMoralValue(self):
+        return self.getCachedValues()[2]
 
     def hasDecisionMaker(self):
-        for agent in self.agents:
-            if agent[1]:
-                return True
-        return False
+        return len(self.decisionMakerIndexes) > 0
 
 
 class EvaluateDecisions:
@@ -199,18 +680,54 @@ class EvaluateDecisions:
     Variables:
     selfInterestScale = the scale of self-interest (0 = altruistic, 1 = egoistic)
     decisions = the decisions to be evaluated
+    parallel = whether to evaluate the decisions with felicific_parallel, in a pool of worker processes
+    workers = the number of worker processes (defaults to the number of CPUs)
+    chunkSize = the number of agents per chunk of the parallel evaluation (defaults to that of felicific_parallel)
+
+    Decisions notify this object when their moral value may have changed (e.g. after Agent.setParameter()), and the
+    best decisions are kept in heaps, so that after a change the best decision is found again in O(log n) instead of
+    evaluating every decision. Entries of changed decisions are left in the heaps and skipped once they reach the top.
+
+    In parallel, the arguments of the agents of every decision are written to a parameter matrix, which the workers
+    evaluate from shared memory (see felicific_parallel.evaluateParameterMatrix()), so no Agent is pickled. Every query
+    evaluates the decisions again, which only pays off for decisions holding millions of agents.
 
     Methods:
         addDecision() adds a decision to the list of decisions
+        getAllMoralValues() returns the moral value and negative moral value of every decision
         setSelfInterestScale() sets the self-interest scale for all decisions
         printMoralValueForAllDecisions() prints the moral value for all decisions
+        getResults() returns a felicific_results.DecisionResult for every decision
+        iterateResults() yields the felicific_results.DecisionResult of every decision
+        writeResults() writes the results of every decision to a felicific_results sink
         printBestDecision() prints the decision with the highest moral value
         getBestDecision() returns the name of the decision with the highest moral value
+        getBestDecisionsBySelfInterest() returns the best decision for every range of the self-interest scale
+        getSelfInterestCrossovers() returns the self-interest scales at which the best decision changes
+        getParetoOptimalDecisions() returns the decisions that no other decision beats in every objective
     """
 
-    def __init__(self):
+    # The objectives of getParetoOptimalDecisions(): the moral value, the negative moral value, and the unscaled
+    # moral values of the decision maker and of the other agents
+    OBJECTIVES = ("total", "negative", "decisionMaker", "others")
+
+    def __init__(self, parallel=False, workers=None, chunkSize=None):
         self.selfInterestScale = None
         self.decisions = []
+        self.parallel = parallel
+        self.workers = workers
+        self.chunkSize = chunkSize
+        # the (name, decision) entries tracked by the heaps, which are those of decisions unless it was changed
+        # directly rather than with addDecision()
+        self.trackedDecisions = []
+        # the indexes of every decision, by decision id, and the number of changes of every decision
+        self.decisionIndexes = {}
+        self.versions = []
+        # whether every decision notifies this object of its changes, otherwise every query evaluates them all
+        self.observed = True
+        # heaps of (-moral value, index, version) and (-negative moral value, index, version), built on first use
+        self.heaps = None
+        self.changedIndexes = set()
 
     def getSelfInterestScale(self):
         return self.selfInterestScale
@@ -222,6 +739,48 @@ class EvaluateDecisions:
         if self.setSelfInterestScale is not None:
             decision.setSelfInterestScale(self.selfInterestScale)
         self.decisions.append((decisionName, decision))
+        self.trackDecision(self.decisions[-1])
+
+    def trackDecision(self, entry):
+        index = len(self.trackedDecisions)
+        decision = entry[1]
+        self.trackedDecisions.append(entry)
+        self.versions.append(0)
+        if hasattr(decision, "addObserver"):
+            if id(decision) not in self.decisionIndexes:
+                decision.addObserver(self)
+            self.decisionIndexes.setdefault(id(decision), []).append(index)
+        else:
+            self.observed = False
+        self.changedIndexes.add(index)
+
+    def trackDecisions(self):
+        """
+        Tracks the decisions again if the list was changed directly (appended to, shortened, or with an entry replaced
+        in place) rather than with addDecision(), which is found by comparing every entry with the tracked one.
+        """
+        if len(self.trackedDecisions) == len(self.decisions) and not any(
+                map(operator.is_not, self.decisions, self.trackedDecisions)):
+            return
+        for decisionName, decision in self.trackedDecisions:
+            if hasattr(decision, "removeObserver"):
+                decision.removeObserver(self)
+        self.trackedDecisions = []
+        self.decisionIndexes = {}
+        self.versions = []
+        self.observed = True
+        self.heaps = None
+        self.changedIndexes = set()
+        for entry in self.decisions:
+            self.trackDecision(entry)
+
+    # called by a decision when its moral value may have changed
+    def decisionChanged(self, decision):
+        if self.heaps is None:
+            return
+        for index in self.decisionIndexes[id(decision)]:
+            self.versions[index] += 1
+            self.changedIndexes.add(index)
 
     def setSelfInterestScale(self, selfInterestScale):
         if selfInterestScale > 1 or selfInterestScale < 0:
@@ -229,27 +788,118 @@ class EvaluateDecisions:
 
         for decision in self.decisions:
             if not decision[1].hasDecisionMaker():
-                print("Warning: Decision " + decision[0] + " does not have a decision maker.")
+                logger.warning("Decision %s does not have a decision maker.", decision[0])
 
         if selfInterestScale == 0:
-            print("Set self interest to Altruistic")
+            logger.info("Set self interest to Altruistic")
         elif selfInterestScale == 1:
-            print("Set self interest to Egoistic")
+            logger.info("Set self interest to Egoistic")
 
         self.selfInterestScale = selfInterestScale
+        # every decision changes, so the heaps are rebuilt rather than updated
+        self.heaps = None
         for decision in self.decisions:
             decision[1].setSelfInterestScale(selfInterestScale)
 
+    # returns [(moral value, negative moral value)] for every decision, in the order they were added
+    def getAllMoralValues(self):
+        if self.isParallel():
+            return self.evaluateInParallel()
+        return [(decision.getMoralValue(), decision.getNegativeMoralValue()) for decisionName, decision in self.decisions]
+
+    def isParallel(self):
+        return self.parallel and self.workers != 1
+
+    def evaluateInParallel(self):
+        import felicific_arrays
+        import felicific_parallel
+
+        # the matrix is evaluated with a single decay
+        decays = set(felicific_decay.getDecay(getattr(decision, "decay", None)) for decisionName, decision
+                     in self.decisions)
+        if len(decays) > 1:
+            raise ValueError("Decisions evaluated in parallel must have the same decay.")
+        matrix, decisionNames = felicific_arrays.getParameterMatrix(self.decisions)
+        options = {} if self.chunkSize is None else {"chunkSize": self.chunkSize}
+        decay = decays.pop() if decays else None
+        result = felicific_parallel.evaluateParameterMatrix(matrix, self.selfInterestScale, decisionNames,
+                                                            workers=self.workers, decay=decay, **options)
+        return list(zip(result.moralValues.tolist(), result.negativeMoralValues.tolist()))
+
+    # yields the results one decision at a time, so writing them never holds every result in memory
+    def iterateResults(self):
+        for decisionName, decision in self.decisions:
+            yield felicific_results.DecisionResult(decisionName, decision.getMoralValue(),
+                                                   decision.getNegativeMoralValue(), decision.getSelfInterestScale(),
+                                                   decision.hasDecisionMaker())
+
+    def getResults(self):
+        return list(self.iterateResults())
+
+    def writeResults(self, sink):
+        sink.writeAll(self.iterateResults())
+        sink.flush()
+
     def printMoralValueForAllDecisions(self):
-        for decision in self.decisions:
-            print(decision[0] + ": " + str(decision[1].getMoralValue()))
+        for decision, values in zip(self.decisions, self.getAllMoralValues()):
+            print(decision[0] + ": " + str(values[0]))
+
+    # returns (name, decision, value) for the decision with the highest moral value (or negative moral value),
+    # evaluating each decision only once
+    def findBestDecision(self, negative=False):
+        if not self.isParallel():
+            self.trackDecisions()
+            if self.observed:
+                return self.findRankedBestDecision(negative)
+
+        bestName, bestDecision = None, None
+        bestValue = None
+        for (decisionName, decision), values in zip(self.decisions, self.getAllMoralValues()):
+            value = values[1] if negative else values[0]
+            # strict comparison keeps the first of equal decisions, like max()
+            if bestValue is None or value > bestValue:
+                bestName, bestDecision, bestValue = decisionName, decision, value
+        if bestDecision is None:
+            raise ValueError("There are no decisions to evaluate.")
+        return bestName, bestDecision, bestValue
+
+    # finds the best decision from the heaps, pushing the new values of the decisions changed since the last query
+    def findRankedBestDecision(self, negative=False):
+        if not self.decisions:
+            raise ValueError("There are no decisions to evaluate.")
+
+        if self.heaps is None or max(len(heap) for heap in self.heaps) > 2 * len(self.decisions) + 64:
+            entries = [self.getHeapEntries(index) for index in range(len(self.decisions))]
+            self.heaps = tuple([entry[valueIndex] for entry in entries] for valueIndex in (0, 1))
+            for heap in self.heaps:
+                heapq.heapify(heap)
+        else:
+            for index in self.changedIndexes:
+                moralEntry, negativeEntry = self.getHeapEntries(index)
+                heapq.heappush(self.heaps[0], moralEntry)
+                heapq.heappush(self.heaps[1], negativeEntry)
+        self.changedIndexes = set()
+
+        heap = self.heaps[1 if negative else 0]
+        # drop the entries of decisions that have changed since they were pushed
+        while heap[0][2] != self.versions[heap[0][1]]:
+            heapq.heappop(heap)
+        negatedValue, index, version = heap[0]
+        # ties are ordered by index, which keeps the first of equal decisions, like max()
+        decisionName, decision = self.decisions[index]
+        return decisionName, decision, -negatedValue
+
+    def getHeapEntries(self, index):
+        decision = self.decisions[index][1]
+        version = self.versions[index]
+        return (-decision.getMoralValue(), index, version), (-decision.getNegativeMoralValue(), index, version)
 
     def printDecisionWithHighestValue(self):
-        bestDecisionName, bestDecision = max(self.decisions, key=lambda x: x[1].getMoralValue())
+        bestDecisionName, bestDecision, bestValue = self.findBestDecision()
 
         print(
             "The best decision from a standard Utilitarian perspective is: " + bestDecisionName + ". with a moral value of " + str(
-                bestDecision.getMoralValue()))
+                bestValue))
 
         if bestDecision.selfInterestScale is not None:
             print("This decision was made with a self interest scale of " + str(bestDecision.selfInterestScale))
@@ -257,7 +907,7 @@ class EvaluateDecisions:
 
     # prints the decision with the negative moral value closest to 0
     def printDecisionWithLeastNegativeValue(self):
-        bestDecisionName, bestDecision = max(self.decisions, key=lambda x: x[1].getNegativeMoralValue())
+        bestDecisionName, bestDecision, bestValue = self.findBestDecision(negative=True)
 
         print(
             "The best decision from a Negative Utilitarian perspective is: " + bestDecisionName + ". with a moral value of " + str(
@@ -268,9 +918,83 @@ class EvaluateDecisions:
         print()
 
     def getDecisionWithHighestValue(self):
-        bestDecisionName, bestDecision = max(self.decisions, key=lambda x: x[1].getMoralValue())
-        return bestDecisionName
+        return self.findBestDecision()[0]
 
     def getDecisionWithLeastNegativeValue(self):
-        bestDecisionName, bestDecision = max(self.decisions, key=lambda x: x[1].getNegativeMoralValue())
-        return bestDecisionName
+        return self.findBestDecision(negative=True)[0]
+
+    def getBestDecisionsBySelfInterest(self):
+        """
+        Returns a list of (lowestScale, highestScale, decisionName) covering self-interest scales from 0 to 1.
+        Each decision's value is a line over the scale, so the best decisions form the upper envelope of those lines,
+        which is found once instead of re-evaluating every decision for every scale.
+        """
+        lines = []
+        for index, decision in enumerate(self.decisions):
+            decisionMakerValue, othersValue = decision[1].getPartialMoralValues()
+            lines.append((decisionMakerValue - othersValue, othersValue, index))
+
+        # Sort by slope, keeping only the highest (and for identical lines the first added) line of every slope
+        lines.sort(key=lambda line: (line[0], -line[1], line[2]))
+        distinctLines = []
+        for line in lines:
+            if not distinctLines or distinctLines[-1][0] != line[0]:
+                distinctLines.append(line)
+
+        # A line is not on the envelope if the lines before and after it cross above it
+        envelope = []
+        for line in distinctLines:
+            while len(envelope) >= 2:
+                first, second = envelope[-2], envelope[-1]
+                if (line[1] - first[1]) * (second[0] - first[0]) >= (second[1] - first[1]) * (line[0] - first[0]):
+                    envelope.pop()
+                else:
+                    break
+            envelope.append(line)
+
+        segments = []
+        for position, line in enumerate(envelope):
+            lowest = 0.0
+            highest = 1.0
+            if position > 0:
+                previous = envelope[position - 1]
+                lowest = max(lowest, (previous[1] - line[1]) / (line[0] - previous[0]))
+            if position < len(envelope) - 1:
+                following = envelope[position + 1]
+                highest = min(highest, (line[1] - following[1]) / (following[0] - line[0]))
+            if lowest < highest:
+                segments.append((lowest, highest, self.decisions[line[2]][0]))
+
+        return segments
+
+    def getSelfInterestCrossovers(self):
+        return [segment[0] for segment in self.getBestDecisionsBySelfInterest()[1:]]
+
+    def getParetoOptimalDecisions(self, objectives=OBJECTIVES):
+        """
+        Returns the names of the decisions, in the order they were added, that no other decision is at least as good
+        as in every objective and better in one. Every objective is maximized, so a negative moral value is better
+        the closer it is to 0.
+        """
+        for objective in objectives:
+            if objective not in self.OBJECTIVES:
+                raise ValueError("Unknown objective: " + str(objective) + ". Objectives are "
+                                 + ", ".join(self.OBJECTIVES) + ".")
+        objectives = list(dict.fromkeys(objectives))
+        # the moral value only depends on the values of the decision maker and of the others, and never decreases
+        # when either increases, so it cannot change which decisions are dominated when both are objectives
+        if "decisionMaker" in objectives and "others" in objectives and "total" in objectives:
+            objectives.remove("total")
+
+        columns = {}
+        if "total" in objectives or "negative" in objectives:
+            values = self.getAllMoralValues()
+            columns["total"] = [moralValue for moralValue, negativeMoralValue in values]
+            columns["negative"] = [negativeMoralValue for moralValue, negativeMoralValue in values]
+        if "decisionMaker" in objectives or "others" in objectives:
+            partialValues = [decision.getPartialMoralValues() for decisionName, decision in self.decisions]
+            columns["decisionMaker"] = [decisionMakerValue for decisionMakerValue, othersValue in partialValues]
+            columns["others"] = [othersValue for decisionMakerValue, othersValue in partialValues]
+
+        points = zip(*[columns[objective] for objective in objectives])
+        return [self.decisions[index][0] for index in felicific_pareto.getParetoOptimal(points)]
@@ -0,0 +1,208 @@
+"""
+Cohort agents, which stand for a population whose members differ, without creating an agent per member.
+
+An Agent gives one value to every parameter, and a group only differs from one person through its multiplier. A
+CohortAgent instead takes any of its parameters as a Histogram of values over its members, e.g. the intensity of a
+pain for the 30% of a town living near a new road and for everyone else. The parameters are taken as independent, so
+the expected value of a consequence is the product of the expected values of its factors, each a weighted dot product
+over the bins of its histogram. The multiplier is the number of members, as for an Agent.
+
+CohortAgent.fromSamples() takes weighted samples instead: rows of createAgent() arguments (after isPleasure), each
+weighted by the number of members it stands for. The factors of a sample are kept together, so they need not be
+independent, and every consequence is the weighted dot product of the sample weights with the consequences of the
+samples.
+
+Either way the cohort is summed into one createAgent() row, whose 1st order, fecundity and purity consequences are the
+summed consequences of the members (with every other factor 1, and a propinquity of 0, as its decay is applied
+already). A cohort agent is therefore an Agent like any other: decisions add its consequences to their moral and
+negative moral values, and the arrays, parallel evaluation and the cache see its summed row. Time and memory depend on
+the number of bins or samples, not on the number of members.
+"""
+
+import operator
+
+import felicific_calculus as fc
+import felicific_decay
+
+
+class Histogram:
+    """
+    The distribution of one parameter over the members of a cohort.
+
+    Variables:
+    values = the value of every bin
+    weights = the share of the members in every bin, summing to 1 (given as any non-negative weights, e.g. counts)
+
+    Methods:
+        getMean() returns the weighted mean of the values, or of a function of the values
+    """
+
+    __slots__ = ("values", "weights")
+
+    def __init__(self, values, weights=None):
+        values = [float(value) for value in values]
+        if not values:
+            raise ValueError("A histogram needs at least one bin.")
+        weights = [1.0] * len(values) if weights is None else [float(weight) for weight in weights]
+        if len(weights) != len(values):
+            raise ValueError("A histogram needs one weight per bin.")
+        total = sum(weights)
+        if min(weights) < 0 or total <= 0:
+            raise ValueError("Histogram weights must not be negative, and cannot all be 0.")
+        self.values = values
+        self.weights = [weight / total for weight in weights]
+
+    def getMean(self, function=None):
+        values = self.values if function is None else map(function, self.values)
+        return sum(map(operator.mul, self.weights, values))
+
+    def __repr__(self):
+        return "Histogram(" + repr(self.values) + ", " + repr(self.weights) + ")"
+
+
+# the factors of the 1st order, fecundity and purity consequences, as indexes of the createAgent() arguments, with
+# the propinquity last
+TERM_INDEXES = tuple(tuple(fc.PARAMETER_NAMES.index(name) for name in names) for names in (
+    ("certainty", "intensity", "duration", "multiplier", "propinquity"),
+    ("fecundity", "f_intensity", "f_duration", "f_multiplier", "f_propinquity"),
+    ("purity", "p_intensity", "p_duration", "p_multiplier", "p_propinquity"),
+))
+
+
+def checkIsPleasure(isPleasure):
+    # a cohort sums its members into one agent, which is either pleasure or pain
+    if isinstance(isPleasure, Histogram):
+        raise ValueError("isPleasure of a cohort cannot be a Histogram, split the cohort into a cohort of pleasure "
+                         "and a cohort of pain.")
+
+
+def getSummedRow(isPleasure, terms, presence):
+    # createAgent() arguments whose 1st order, fecundity and purity consequences are the given terms, with the
+    # 2nd order consequences only where they are present
+    first, fecundity, purity = terms
+    return (isPleasure, first, 1, 1, 0, 1 if presence[1] else 0, 1 if presence[2] else 0, 1,
+            fecundity, 1, 0, 1, purity, 1, 0, 1)
+
+
+class CohortAgent(fc.Agent):
+    """
+    An agent standing for a cohort whose members differ, given by Histogram parameters or weighted samples.
+
+    Variables:
+    arguments = the createAgent() arguments of the cohort, each a number or a Histogram, or None for samples
+    samples = the createAgent() arguments (after isPleasure) of every sample, or None for histograms
+    sampleWeights = the number of members every sample stands for
+
+    Methods:
+        fromSamples() creates a cohort from weighted samples
+        getTerms() returns the summed 1st order, fecundity and purity consequences of the members, before their sign
+        setParameter() changes an argument of the cohort (a number or a Histogram) and updates its consequences
+    """
+
+    __slots__ = ("arguments", "samples", "sampleWeights")
+
+    def __init__(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                 f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                 p_intensity=0, p_duration=0, p_propinquity=0,
+                 p_multiplier=0, decay=None):
+
+        checkIsPleasure(isPleasure)
+        self.arguments = [isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                          f_intensity, f_duration, f_propinquity, f_multiplier,
+                          p_intensity, p_duration, p_propinquity, p_multiplier]
+        self.samples = None
+        self.sampleWeights = None
+        self.decay = decay
+        super().__init__(*self.getSummedRow(), decay=decay)
+
+    @classmethod
+    def fromSamples(cls, isPleasure, samples, weights=None, decay=None):
+        """
+        Creates a cohort from samples, each holding the createAgent() arguments after isPleasure (7 to 15 values)
+        and weighted by the number of members it stands for (1 by default).
+        """
+        checkIsPleasure(isPleasure)
+        rows = []
+        for sample in samples:
+            if not 7 <= len(sample) <= fc.PARAMETER_COUNT - 1:
+                raise ValueError("Every sample needs 7 to " + str(fc.PARAMETER_COUNT - 1) + " values.")
+            rows.append([isPleasure] + [float(value) for value in sample]
+                        + [0.0] * (fc.PARAMETER_COUNT - 1 - len(sample)))
+        if not rows:
+            raise ValueError("A cohort needs at least one sample.")
+        weights = [1.0] * len(rows) if weights is None else [float(weight) for weight in weights]
+        if len(weights) != len(rows) or min(weights) < 0:
+            raise ValueError("A cohort needs one non-negative weight per sample.")
+
+        agent = cls.__new__(cls)
+        agent.arguments = None
+        agent.samples = rows
+        agent.sampleWeights = weights
+        agent.decay = decay
+        fc.Agent.__init__(agent, *agent.getSummedRow(), decay=decay)
+        return agent
+
+    def getTerms(self):
+        """
+        Returns the summed 1st order, fecundity and purity consequences of the members, before their sign, and
+        whether each is present.
+        """
+        decay = self.decay if self.decay is not None else felicific_decay.DEFAULT_DECAY
+        terms = []
+        presence = []
+        for indexes in TERM_INDEXES:
+            if self.samples is None:
+                # independent parameters: the mean of the product is the product of the means
+                means = [self.getMean(self.arguments[index]) for index in indexes[:-1]]
+                propinquity = self.arguments[indexes[-1]]
+                if isinstance(propinquity, Histogram):
+                    means.append(propinquity.getMean(decay.getValue))
+                else:
+                    means.append(decay.getValue(propinquity))
+                term = 1
+                for mean in means:
+                    term *= mean
+                terms.append(term)
+                presence.append(means[0] != 0)
+            else:
+                columns = [[sample[index] for sample in self.samples] for index in indexes]
+                columns[-1] = [decay.getValue(propinquity) for propinquity in columns[-1]]
+                products = self.sampleWeights
+                for column in columns:
+                    products = list(map(operator.mul, products, column))
+                terms.append(sum(products))
+                presence.append(any(columns[0]))
+        return terms, presence
+
+    @staticmethod
+    def getMean(argument):
+        if isinstance(argument, Histogram):
+            return argument.getMean()
+        return argument
+
+    def getSummedRow(self):
+        terms, presence = self.getTerms()
+        isPleasure = self.arguments[0] if self.samples is None else self.samples[0][0]
+        return getSummedRow(isPleasure, terms, presence)
+
+    def setParameter(self, name, value, consequence=0):
+        """
+        Changes one argument of the cohort, to a number or a Histogram, and recomputes its consequences. Consequences
+        added later with addConsequence() are changed like those of any agent.
+        """
+        if consequence != 0:
+            super().setParameter(name, value, consequence)
+            return
+        if self.samples is not None:
+            raise ValueError("A cohort of samples has no single argument to change.")
+        parameterIndex = fc.PARAMETER_NAMES.index(name)
+        if parameterIndex == 0:
+            checkIsPleasure(value)
+
+        rows = self.getParameters()
+        oldConsequences = self.computeConsequences(*rows[0], decay=self.decay)
+        self.arguments[parameterIndex] = value
+        rows[0] = tuple(self.getSummedRow())
+        newConsequences = self.computeConsequences(*rows[0], decay=self.decay)
+        self.parameters = sum(rows, ())
+        self.consequencesChanged(oldConsequences, newConsequences)
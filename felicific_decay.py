@@ -0,0 +1,241 @@
+"""
+Decay functions, which turn the propinquity (nearness in time) of a consequence into the factor its value is
+multiplied by. Bentham's calculus only asks that a value decays over time; the original formula is the power law
+1/propinquity^0.1, which stays the default.
+
+    PowerLawDecay(exponent)     1/propinquity^exponent
+    ExponentialDecay(rate)      e^(-rate * propinquity)
+    HyperbolicDecay(rate)       1/(1 + rate * propinquity)
+    TableDecay(points)          linear interpolation between (propinquity, factor) points
+
+A propinquity of 0 always means no decay, and a negative propinquity is refused. Decays can be looked up by name
+with getDecay(), and new ones added with registerDecay(). Scenarios almost only use small integer propinquities, so
+every decay memoizes the factors of the integers below TABLE_SIZE, both for single values and, as an array, for the
+vectorized getValues() (which needs numpy).
+"""
+
+import bisect
+import inspect
+import math
+
+# integer propinquities below this are looked up rather than computed
+TABLE_SIZE = 1024
+
+
+class PropinquityDecay:
+    """
+    Base class of the decay functions.
+
+    Methods:
+        getValue() returns the factor of one propinquity
+        getValues() returns the factors of an array of propinquities
+        getDerivatives() returns the derivatives of the factors of an array of propinquities
+    """
+
+    def __init__(self):
+        # factors of the integer propinquities, filled as they are first used
+        self.values = {}
+        self.table = None
+
+    def computeValue(self, propinquity):
+        raise NotImplementedError
+
+    def computeValues(self, propinquities):
+        import numpy as np
+        return np.array([self.getValue(propinquity) for propinquity in propinquities.tolist()], dtype=float)
+
+    def computeDerivatives(self, propinquities):
+        raise NotImplementedError
+
+    def getValue(self, propinquity):
+        value = self.values.get(propinquity)
+        if value is None:
+            if propinquity == 0:
+                return 1
+            if propinquity < 0:
+                raise ValueError("Propinquity must not be negative.")
+            value = self.computeValue(propinquity)
+            if 0 < propinquity < TABLE_SIZE and float(propinquity).is_integer():
+                self.values[propinquity] = value
+        return value
+
+    def getTable(self):
+        if self.table is None:
+            import numpy as np
+            # computed with getValue(), so table lookups match the scalar values exactly
+            self.table = np.array([1.0] + [self.getValue(propinquity) for propinquity in range(1, TABLE_SIZE)])
+        return self.table
+
+    def getValues(self, propinquities):
+        import numpy as np
+        propinquities = np.asarray(propinquities, dtype=float)
+        if (propinquities < 0).any():
+            raise ValueError("Propinquity must not be negative.")
+        integral = (propinquities >= 0) & (propinquities < TABLE_SIZE) & (propinquities == np.floor(propinquities))
+        if integral.all():
+            return self.getTable()[propinquities.astype(np.intp)]
+
+        values = np.empty(propinquities.shape)
+        values[integral] = self.getTable()[propinquities[integral].astype(np.intp)]
+        others = propinquities[~integral]
+        values[~integral] = np.where(others != 0, self.computeValues(np.where(others != 0, others, 1)), 1)
+        return values
+
+    def getDerivatives(self, propinquities):
+        """Returns the derivatives of the factors, taken as 0 at a propinquity of 0, which means no decay."""
+        import numpy as np
+        propinquities = np.asarray(propinquities, dtype=float)
+        nonZero = propinquities != 0
+        return np.where(nonZero, self.computeDerivatives(np.where(nonZero, propinquities, 1)), 0)
+
+    # decays are compared and hashed by their parameters, so equal decays share pooled agents and cache entries
+    def getParameters(self):
+        raise NotImplementedError
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.getParameters() == other.getParameters()
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.getParameters()))
+
+    def __repr__(self):
+        return type(self).__name__ + repr(self.getParameters())
+
+    def __getstate__(self):
+        return self.getParameters()
+
+    def __setstate__(self, parameters):
+        self.__init__(*parameters)
+
+
+class PowerLawDecay(PropinquityDecay):
+    def __init__(self, exponent=.1):
+        super().__init__()
+        self.exponent = exponent
+
+    def computeValue(self, propinquity):
+        return 1 / math.pow(propinquity, self.exponent)
+
+    def computeValues(self, propinquities):
+        import numpy as np
+        return 1 / np.power(propinquities, self.exponent)
+
+    def computeDerivatives(self, propinquities):
+        import numpy as np
+        return -self.exponent * np.power(propinquities, -self.exponent - 1)
+
+    def getParameters(self):
+        return (self.exponent,)
+
+
+class ExponentialDecay(PropinquityDecay):
+    def __init__(self, rate=.1):
+        super().__init__()
+        self.rate = rate
+
+    def computeValue(self, propinquity):
+        return math.exp(-self.rate * propinquity)
+
+    def computeValues(self, propinquities):
+        import numpy as np
+        return np.exp(-self.rate * propinquities)
+
+    def computeDerivatives(self, propinquities):
+        return -self.rate * self.computeValues(propinquities)
+
+    def getParameters(self):
+        return (self.rate,)
+
+
+class HyperbolicDecay(PropinquityDecay):
+    def __init__(self, rate=.1):
+        super().__init__()
+        self.rate = rate
+
+    def computeValue(self, propinquity):
+        return 1 / (1 + self.rate * propinquity)
+
+    def computeValues(self, propinquities):
+        return 1 / (1 + self.rate * propinquities)
+
+    def computeDerivatives(self, propinquities):
+        return -self.rate / (1 + self.rate * propinquities) ** 2
+
+    def getParameters(self):
+        return (self.rate,)
+
+
+class TableDecay(PropinquityDecay):
+    """
+    Interpolates linearly between (propinquity, factor) points, and keeps the factor of the first or last point
+    beyond them. As for every decay, a propinquity of 0 has a factor of 1 whatever the table says.
+    """
+
+    def __init__(self, points):
+        super().__init__()
+        points = sorted((float(propinquity), float(factor)) for propinquity, factor in dict(points).items())
+        if not points:
+            raise ValueError("A decay table needs at least one point.")
+        self.propinquities = [propinquity for propinquity, factor in points]
+        self.factors = [factor for propinquity, factor in points]
+
+    def computeValue(self, propinquity):
+        index = bisect.bisect_right(self.propinquities, propinquity)
+        if index == 0:
+            return self.factors[0]
+        if index == len(self.propinquities):
+            return self.factors[-1]
+        low, high = self.propinquities[index - 1], self.propinquities[index]
+        share = (propinquity - low) / (high - low)
+        return self.factors[index - 1] + share * (self.factors[index] - self.factors[index - 1])
+
+    def computeValues(self, propinquities):
+        import numpy as np
+        return np.interp(propinquities, self.propinquities, self.factors)
+
+    def computeDerivatives(self, propinquities):
+        import numpy as np
+        if len(self.factors) < 2:
+            return np.zeros(np.shape(propinquities))
+        slopes = np.diff(self.factors) / np.diff(self.propinquities)
+        # the slope of the segment each propinquity is on, 0 beyond the points
+        segments = np.searchsorted(self.propinquities, propinquities, side="right") - 1
+        inside = (segments >= 0) & (segments < len(slopes))
+        return np.where(inside, slopes[np.clip(segments, 0, len(slopes) - 1)], 0)
+
+    def getParameters(self):
+        return (tuple(zip(self.propinquities, self.factors)),)
+
+
+DECAYS = {
+    "power": PowerLawDecay,
+    "exponential": ExponentialDecay,
+    "hyperbolic": HyperbolicDecay,
+    "table": TableDecay,
+}
+
+DEFAULT_DECAY = PowerLawDecay(.1)
+
+
+def registerDecay(name, decayClass):
+    DECAYS[name] = decayClass
+
+
+def getDecay(decay=None, *arguments):
+    """
+    Returns a decay: the default for None, the decay itself for a PropinquityDecay, or the registered decay of that
+    name built with the arguments, e.g. getDecay("exponential", .2). A decay without defaults, such as "table", can't
+    be given by its name alone, so Decision(decay="table") raises a ValueError: pass TableDecay(points) instead.
+    """
+    if decay is None:
+        return DEFAULT_DECAY
+    if isinstance(decay, PropinquityDecay):
+        return decay
+    if decay not in DECAYS:
+        raise ValueError("Unknown decay: " + str(decay) + ". Known decays are " + ", ".join(sorted(DECAYS)) + ".")
+    try:
+        inspect.signature(DECAYS[decay]).bind(*arguments)
+    except TypeError as error:
+        raise ValueError("The " + str(decay) + " decay cannot be built from these arguments (" + str(error)
+                         + "), so pass a " + DECAYS[decay].__name__ + " instead of its name.") from None
+    return DECAYS[decay](*arguments)
@@ -0,0 +1,400 @@
+"""
+Streaming ingest of CSV and JSONL scenario files, for scenarios larger than memory.
+
+Every row (a CSV line after the header, or a JSON object per line) is one createAgent() call:
+
+    decision, agent, isDecisionMaker, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity,
+    multiplier, f_intensity, f_duration, f_propinquity, f_multiplier, p_intensity, p_duration, p_propinquity,
+    p_multiplier
+
+decision is the name of the decision. agent (the name of the agent within its decision), isDecisionMaker and the 2nd
+order fields are optional. A row may instead give the value of one consequence as value, like the consequence lists
+of utilicalc.utilityCalculus(). Files ending in .gz (or starting with the gzip magic bytes) are decompressed on the
+fly.
+
+The file is read chunkSize rows at a time by a parse thread, which turns every chunk into typed arrays while the
+previous chunk is evaluated, with at most prefetch chunks waiting in between. Every chunk is evaluated with
+felicific_arrays.expandConsequences() and folded into running sums per decision (split between the decision makers
+and the others, so any self-interest scale can be applied at the end) and per agent. Memory depends on the chunk size
+and on the number of decisions and agents, not on the number of rows.
+"""
+
+import csv
+import gzip
+import itertools
+import json
+import queue
+import threading
+
+import numpy as np
+
+import felicific_arrays as fa
+
+FIELDS = fa.FIELDS
+REQUIRED_FIELDS = FIELDS[:8]
+TRUE_TEXTS = {"1", "1.0", "true", "t", "yes", "y"}
+FALSE_TEXTS = {"", "0", "0.0", "false", "f", "no", "n"}
+
+
+def openScenarioFile(path):
+    """Opens a scenario file as text, decompressing it if it is gzipped."""
+    with open(path, "rb") as file:
+        compressed = file.read(2) == b"\x1f\x8b"
+    if compressed or str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def getFormat(path):
+    name = str(path).lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    raise ValueError("Unknown scenario format of " + str(path) + ", give format=\"csv\" or \"jsonl\".")
+
+
+def parseFlag(value):
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_TEXTS:
+            return 1.0
+        if text in FALSE_TEXTS:
+            return 0.0
+        value = float(text)
+    return 1.0 if value else 0.0
+
+
+def parseNumber(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return float(value) if value else 0.0
+    return float(value)
+
+
+class ScenarioChunk:
+    """
+    The rows of one chunk as typed arrays.
+
+    Variables:
+    parameters = the (rows, 16) createAgent() arguments, 0 for value rows
+    values = the consequence value of every value row, NaN for the other rows
+    decisionIds = the decision id of every row
+    agentIds = the agent id of every row, -1 for rows without an agent
+    isDecisionMaker = whether every row is of a decision maker
+    """
+
+    def __init__(self, parameters, values, decisionIds, agentIds, isDecisionMaker):
+        self.parameters = parameters
+        self.values = values
+        self.decisionIds = decisionIds
+        self.agentIds = agentIds
+        self.isDecisionMaker = isDecisionMaker
+
+    def __len__(self):
+        return len(self.decisionIds)
+
+
+class ScenarioParser:
+    """
+    Parses the rows of a scenario file into ScenarioChunks, numbering the decisions and agents as they appear.
+
+    Variables:
+    decisionNames = the names of the decisions, indexed by decision id
+    agentNames = the (decision id, agent name) of every agent, indexed by agent id
+    """
+
+    def __init__(self):
+        self.decisionNames = []
+        self.decisionIds = {}
+        self.agentNames = []
+        self.agentIds = {}
+
+    def getDecisionId(self, name):
+        decisionId = self.decisionIds.get(name)
+        if decisionId is None:
+            decisionId = self.decisionIds[name] = len(self.decisionNames)
+            self.decisionNames.append(name)
+        return decisionId
+
+    def getAgentId(self, decisionId, name):
+        if name == "":
+            return -1
+        key = (decisionId, name)
+        agentId = self.agentIds.get(key)
+        if agentId is None:
+            agentId = self.agentIds[key] = len(self.agentNames)
+            self.agentNames.append(key)
+        return agentId
+
+    def createChunk(self, columns, rowCount):
+        # columns holds the raw values of every field present, by name, each a list with one value per row
+        if "decision" not in columns:
+            raise ValueError("Scenario rows need a decision.")
+        decisionIds = np.array([self.getDecisionId(str(name)) for name in columns["decision"]], dtype=np.int64)
+        agents = columns.get("agent")
+        if agents is None:
+            agentIds = np.full(rowCount, -1, dtype=np.int64)
+        else:
+            agentIds = np.array([self.getAgentId(decisionId, str(agent))
+                                 for decisionId, agent in zip(decisionIds.tolist(), agents)], dtype=np.int64)
+
+        isDecisionMaker = np.zeros(rowCount, dtype=bool)
+        if "isDecisionMaker" in columns:
+            isDecisionMaker[:] = [parseFlag(flag) for flag in columns["isDecisionMaker"]]
+        values = np.full(rowCount, np.nan)
+        if "value" in columns:
+            values[:] = [np.nan if value == "" else parseNumber(value) for value in columns["value"]]
+
+        parameters = np.zeros((rowCount, len(FIELDS)))
+        for index, name in enumerate(FIELDS):
+            column = columns.get(name)
+            if column is None:
+                continue
+            if index == 0:
+                parameters[:, 0] = [parseFlag(flag) for flag in column]
+                continue
+            try:
+                parameters[:, index] = np.array(column, dtype=float)
+            except (TypeError, ValueError):
+                # empty or missing values are 0, like the defaults of createAgent()
+                parameters[:, index] = [parseNumber(value) for value in column]
+
+        # every row is either a consequence value or has the required createAgent() arguments
+        missing = [name for name in REQUIRED_FIELDS if name not in columns]
+        if missing and np.isnan(values).any():
+            raise ValueError("Scenario rows without a value need " + ", ".join(missing) + ".")
+        parameters[~np.isnan(values)] = 0
+        return ScenarioChunk(parameters, values, decisionIds, agentIds, isDecisionMaker)
+
+    def iterateCsvChunks(self, file, chunkSize):
+        reader = csv.reader(file)
+        header = [name.strip() for name in next(reader, [])]
+        while True:
+            rows = list(itertools.islice(reader, chunkSize))
+            if not rows:
+                return
+            rows = [row for row in rows if row]
+            if any(len(row) != len(header) for row in rows):
+                raise ValueError("Every scenario row needs " + str(len(header)) + " values, like the header.")
+            columns = {name: [row[index] for row in rows] for index, name in enumerate(header)}
+            yield self.createChunk(columns, len(rows))
+
+    def iterateJsonlChunks(self, file, chunkSize):
+        while True:
+            lines = list(itertools.islice(file, chunkSize))
+            if not lines:
+                return
+            records = [json.loads(line) for line in lines if line.strip()]
+            names = set()
+            for record in records:
+                names.update(record)
+            # missing and null values are empty, like empty CSV cells
+            columns = {name: ["" if record.get(name) is None else record[name] for record in records]
+                       for name in names}
+            yield self.createChunk(columns, len(records))
+
+    def iterateChunks(self, file, format, chunkSize):
+        if format == "csv":
+            return self.iterateCsvChunks(file, chunkSize)
+        if format == "jsonl":
+            return self.iterateJsonlChunks(file, chunkSize)
+        raise ValueError("Unknown scenario format: " + str(format) + ".")
+
+
+def iterateScenarioChunks(path, parser=None, format=None, chunkSize=65536, prefetch=2):
+    """
+    Yields the ScenarioChunks of a scenario file, parsed by a background thread that stays at most prefetch chunks
+    ahead. Errors of the parse thread are raised here.
+    """
+    if chunkSize < 1 or prefetch < 1:
+        raise ValueError("Chunk size and prefetch must be at least 1.")
+    if parser is None:
+        parser = ScenarioParser()
+    if format is None:
+        format = getFormat(path)
+    chunks = queue.Queue(prefetch)
+    stopped = threading.Event()
+    end = object()
+
+    def put(item):
+        # gives up once the consumer has stopped, rather than blocking forever on a full queue
+        while not stopped.is_set():
+            try:
+                chunks.put(item, timeout=.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def parse():
+        try:
+            with openScenarioFile(path) as file:
+                for chunk in parser.iterateChunks(file, format, chunkSize):
+                    if not put(chunk):
+                        return
+            put(end)
+        except BaseException as error:
+            put(error)
+
+    thread = threading.Thread(target=parse, name="felicific-ingest", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is end:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def grow(values, size):
+    if len(values) >= size:
+        return values
+    return np.concatenate([values, np.zeros(max(size, 2 * len(values)) - len(values))])
+
+
+class IngestResult:
+    """
+    The running sums of an ingested scenario.
+
+    Variables:
+    decisionNames = the names of the decisions, indexed by decision id
+    agentNames = the (decision name, agent name) of every named agent, indexed by agent id
+    rowCount = how many rows were ingested
+    decisionMakerMoralValues, othersMoralValues = the unscaled moral values of every decision, split between the
+        decision makers and the others
+    decisionMakerNegativeMoralValues, othersNegativeMoralValues = the same for the negative moral values
+    agentMoralValues, agentNegativeMoralValues = the unscaled moral and negative moral value of every named agent
+
+    Methods:
+        add() folds a ScenarioChunk into the sums
+        getMoralValues() returns the moral value of every decision for a self-interest scale
+        getNegativeMoralValues() returns the negative moral value of every decision for a self-interest scale
+        getDecisionWithHighestValue() returns the name of the decision with the highest moral value
+        getDecisionWithLeastNegativeValue() returns the name of the decision with the negative moral value closest to 0
+        getAgentValues() returns the (moral value, negative moral value) of every named agent of a decision
+    """
+
+    def __init__(self, parser, decay=None, trackAgents=True):
+        self.parser = parser
+        self.decay = decay
+        self.trackAgents = trackAgents
+        self.rowCount = 0
+        self.decisionCount = 0
+        self.agentCount = 0
+        # the sums are kept in arrays that grow by doubling, so only the first decisionCount (agentCount) are used
+        self.sums = np.zeros((4, 0))
+        self.agentSums = np.zeros((2, 0))
+
+    def add(self, chunk):
+        self.rowCount += len(chunk)
+        consequenceRows = np.flatnonzero(np.isnan(chunk.values))
+        columns = fa.expandConsequences(chunk.parameters[consequenceRows], decay=self.decay)
+        rows = np.concatenate([consequenceRows[columns.agent], np.flatnonzero(~np.isnan(chunk.values))])
+        values = np.concatenate([columns.getValues(), chunk.values[rows[len(columns):]]])
+        negativeValues = np.minimum(values, 0)
+
+        self.decisionCount = max(self.decisionCount, int(chunk.decisionIds.max(initial=-1)) + 1)
+        if self.sums.shape[1] < self.decisionCount:
+            self.sums = np.array([grow(sums, self.decisionCount) for sums in self.sums])
+        # cells 2 * decision id + isDecisionMaker, so the decision makers and the others are summed in one pass
+        cells = 2 * chunk.decisionIds[rows] + chunk.isDecisionMaker[rows]
+        for sums, weights in ((self.sums[:2], values), (self.sums[2:], negativeValues)):
+            added = np.bincount(cells, weights=weights, minlength=2 * self.decisionCount).reshape(-1, 2)
+            # rows 0 and 1 of each pair of sums are the others and the decision makers
+            sums[0, :len(added)] += added[:, 0]
+            sums[1, :len(added)] += added[:, 1]
+
+        if self.trackAgents:
+            agentIds = chunk.agentIds[rows]
+            named = agentIds >= 0
+            self.agentCount = max(self.agentCount, int(agentIds.max(initial=-1)) + 1)
+            if self.agentSums.shape[1] < self.agentCount:
+                self.agentSums = np.array([grow(sums, self.agentCount) for sums in self.agentSums])
+            for sums, weights in zip(self.agentSums, (values, negativeValues)):
+                added = np.bincount(agentIds[named], weights=weights[named], minlength=self.agentCount)
+                sums[:len(added)] += added
+
+    @property
+    def decisionNames(self):
+        return self.parser.decisionNames[:self.decisionCount]
+
+    @property
+    def agentNames(self):
+        return [(self.parser.decisionNames[decisionId], agentName)
+                for decisionId, agentName in self.parser.agentNames[:self.agentCount]]
+
+    @property
+    def othersMoralValues(self):
+        return self.sums[0, :self.decisionCount]
+
+    @property
+    def decisionMakerMoralValues(self):
+        return self.sums[1, :self.decisionCount]
+
+    @property
+    def othersNegativeMoralValues(self):
+        return self.sums[2, :self.decisionCount]
+
+    @property
+    def decisionMakerNegativeMoralValues(self):
+        return self.sums[3, :self.decisionCount]
+
+    @property
+    def agentMoralValues(self):
+        return self.agentSums[0, :self.agentCount]
+
+    @property
+    def agentNegativeMoralValues(self):
+        return self.agentSums[1, :self.agentCount]
+
+    @staticmethod
+    def scale(decisionMakerValues, othersValues, selfInterestScale):
+        # rounded like Decision.getMoralValue()
+        if selfInterestScale is None:
+            return np.round(decisionMakerValues + othersValues, 2)
+        if selfInterestScale > 1 or selfInterestScale < 0:
+            raise ValueError("Self interest scale must be between 0 and 1.")
+        return np.round(decisionMakerValues * selfInterestScale + othersValues * (1 - selfInterestScale), 2)
+
+    def getMoralValues(self, selfInterestScale=None):
+        return self.scale(self.decisionMakerMoralValues, self.othersMoralValues, selfInterestScale)
+
+    def getNegativeMoralValues(self, selfInterestScale=None):
+        return self.scale(self.decisionMakerNegativeMoralValues, self.othersNegativeMoralValues, selfInterestScale)
+
+    # np.argmax returns the first maximum, which matches the tie-breaking of max() in EvaluateDecisions
+    def getDecisionWithHighestValue(self, selfInterestScale=None):
+        if not self.decisionCount:
+            raise ValueError("There are no decisions to evaluate.")
+        return self.decisionNames[int(np.argmax(self.getMoralValues(selfInterestScale)))]
+
+    def getDecisionWithLeastNegativeValue(self, selfInterestScale=None):
+        if not self.decisionCount:
+            raise ValueError("There are no decisions to evaluate.")
+        return self.decisionNames[int(np.argmax(self.getNegativeMoralValues(selfInterestScale)))]
+
+    def getAgentValues(self, decisionName):
+        decisionId = self.parser.decisionIds[decisionName]
+        return {agentName: (float(self.agentSums[0, agentId]), float(self.agentSums[1, agentId]))
+                for agentId, (agentDecisionId, agentName) in enumerate(self.parser.agentNames[:self.agentCount])
+                if agentDecisionId == decisionId}
+
+
+def ingestScenario(path, format=None, chunkSize=65536, decay=None, trackAgents=True, prefetch=2):
+    """
+    Streams a CSV or JSONL (optionally gzipped) scenario file through the calculus and returns its IngestResult.
+    format is guessed from the file name unless given.
+    """
+    parser = ScenarioParser()
+    result = IngestResult(parser, decay, trackAgents)
+    for chunk in iterateScenarioChunks(path, parser, format, chunkSize, prefetch):
+        result.add(chunk)
+    return result
@@ -0,0 +1,358 @@
+"""
+Instrumentation of the calculus: counters, timers per stage and allocation tracking, with pluggable exporters.
+
+The calculus itself holds no instrumentation code, so when instrumentation is disabled it costs nothing at all.
+enable() replaces the methods listed in INSTRUMENTED with timed wrappers, and disable() puts the originals back:
+
+    recorder = felicific_instrumentation.enable()
+    ...evaluate decisions...
+    felicific_instrumentation.disable()
+    felicific_instrumentation.PrometheusExporter("felicific.prom").export(recorder.getSnapshot())
+
+Every instrumented method is a stage, timed with its number of calls, total and longest time. Times include the
+stages called from within (Decision.createAgent() includes the Agent.__init__() of the new agent). The
+counters are:
+
+    consequencesCreated     consequences of new agents and those added by Agent.addConsequence()
+    parametersChanged       calls of Agent.setParameter()
+    agentsCreated           calls of Decision.createAgent()
+    sumsRecomputed          moral values summed from the partial totals, i.e. not read from the cached values
+
+With trackAllocations, tracemalloc is started and the memory allocated (net of what is freed) within every stage is
+added up. profile() enables instrumentation for one evaluation run and reports the decisions and agents the most time
+was spent on. Recorders are not locked, so they are meant for one thread at a time.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import re
+import time
+import tracemalloc
+
+import felicific_calculus as fc
+
+
+def getConsequenceCount(agent):
+    # an agent has no parameters before its __init__()
+    return len(agent.getConsequences()) if hasattr(agent, "parameters") else 0
+
+
+# (class, method, counter, size, kind): every call adds 1 to the counter, or, with a size function, the change in
+# size of the object it was called on. kind names the objects profile() attributes the time of the call to.
+INSTRUMENTED = (
+    (fc.Agent, "__init__", "consequencesCreated", getConsequenceCount, "agent"),
+    (fc.Agent, "addConsequence", "consequencesCreated", getConsequenceCount, "agent"),
+    (fc.Agent, "setParameter", "parametersChanged", None, "agent"),
+    (fc.Decision, "createAgent", "agentsCreated", None, "decision"),
+    (fc.Decision, "getMoralValueAt", "sumsRecomputed", None, None),
+    (fc.Decision, "getNegativeMoralValueAt", "sumsRecomputed", None, None),
+    (fc.Decision, "getMoralValue", None, None, "decision"),
+    (fc.Decision, "getNegativeMoralValue", None, None, "decision"),
+    (fc.EvaluateDecisions, "setSelfInterestScale", None, None, None),
+    (fc.EvaluateDecisions, "getAllMoralValues", None, None, None),
+    (fc.EvaluateDecisions, "findBestDecision", None, None, None),
+    (fc.EvaluateDecisions, "findRankedBestDecision", None, None, None),
+    (fc.EvaluateDecisions, "getBestDecisionsBySelfInterest", None, None, None),
+    (fc.EvaluateDecisions, "getParetoOptimalDecisions", None, None, None),
+)
+
+# the recorder of the enabled instrumentation, and the original methods it replaced
+recorder = None
+originals = []
+
+
+class Recorder:
+    """
+    Collects the counters, stage timers and allocations of the instrumented methods.
+
+    Variables:
+    counters = the value of every counter, by name
+    timers = [calls, total seconds, longest seconds] of every stage, by stage name
+    allocations = the bytes allocated (net of those freed) within every stage, with trackAllocations
+    objectTimes = [object, seconds] of every agent and decision by id, with trackObjects
+    events = the (stage, start, seconds) of the last traceSize calls, with a traceSize
+
+    Methods:
+        count() adds to a counter
+        record() records one call of a stage
+        getSnapshot() returns the counters, timers and allocations as a dict
+        reset() clears everything recorded
+    """
+
+    def __init__(self, trackAllocations=False, trackObjects=False, traceSize=0):
+        self.trackAllocations = trackAllocations
+        self.trackObjects = trackObjects
+        self.traceSize = traceSize
+        # whether enable() started tracemalloc for this recorder, so that disable() only stops the tracing it started
+        self.startedTracing = False
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.timers = {}
+        self.allocations = {}
+        self.objectTimes = {}
+        self.events = []
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self, stage, start, seconds, allocated=0, target=None):
+        timer = self.timers.get(stage)
+        if timer is None:
+            self.timers[stage] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+        if self.trackAllocations:
+            self.allocations[stage] = self.allocations.get(stage, 0) + allocated
+        if target is not None:
+            # the object is kept with its time, so that its id cannot be reused while it is recorded
+            objectTime = self.objectTimes.get(id(target))
+            if objectTime is None:
+                self.objectTimes[id(target)] = [target, seconds]
+            else:
+                objectTime[1] += seconds
+        if self.traceSize:
+            self.events.append((stage, start, seconds))
+            if len(self.events) >= 2 * self.traceSize:
+                del self.events[:-self.traceSize]
+
+    def getSnapshot(self):
+        snapshot = {
+            "counters": dict(self.counters),
+            "timers": {stage: {"calls": calls, "seconds": seconds, "maxSeconds": maxSeconds}
+                       for stage, (calls, seconds, maxSeconds) in self.timers.items()},
+        }
+        if self.trackAllocations:
+            snapshot["allocations"] = dict(self.allocations)
+            if tracemalloc.is_tracing():
+                snapshot["peakTracedBytes"] = tracemalloc.get_traced_memory()[1]
+        if self.traceSize:
+            snapshot["events"] = [{"stage": stage, "start": start, "seconds": seconds}
+                                  for stage, start, seconds in self.events[-self.traceSize:]]
+        return snapshot
+
+
+def instrument(activeRecorder, owner, name, counter, size, kind):
+    original = owner.__dict__[name]
+    stage = owner.__name__ + "." + name
+    trackObject = activeRecorder.trackObjects and kind is not None
+    trackAllocations = activeRecorder.trackAllocations
+    clock = time.perf_counter
+
+    @functools.wraps(original)
+    def wrapper(self, *arguments, **keywords):
+        if size is not None:
+            sizeBefore = size(self)
+        if trackAllocations:
+            memoryBefore = tracemalloc.get_traced_memory()[0]
+        start = clock()
+        try:
+            return original(self, *arguments, **keywords)
+        finally:
+            seconds = clock() - start
+            allocated = tracemalloc.get_traced_memory()[0] - memoryBefore if trackAllocations else 0
+            activeRecorder.record(stage, start, seconds, allocated, self if trackObject else None)
+            if counter is not None:
+                activeRecorder.count(counter, size(self) - sizeBefore if size is not None else 1)
+
+    originals.append((owner, name, original))
+    setattr(owner, name, wrapper)
+
+
+def enable(activeRecorder=None, trackAllocations=False):
+    """
+    Instruments the calculus and returns the recorder, a new one unless given. Any enabled instrumentation is
+    disabled first.
+    """
+    global recorder
+    disable()
+    if activeRecorder is None:
+        activeRecorder = Recorder(trackAllocations)
+    if activeRecorder.trackAllocations and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        activeRecorder.startedTracing = True
+    for owner, name, counter, size, kind in INSTRUMENTED:
+        instrument(activeRecorder, owner, name, counter, size, kind)
+    recorder = activeRecorder
+    return activeRecorder
+
+
+def disable():
+    """Restores the original methods, and returns the recorder that was enabled, or None."""
+    global recorder
+    while originals:
+        owner, name, original = originals.pop()
+        setattr(owner, name, original)
+    disabledRecorder, recorder = recorder, None
+    if disabledRecorder is not None and disabledRecorder.startedTracing:
+        tracemalloc.stop()
+        disabledRecorder.startedTracing = False
+    return disabledRecorder
+
+
+def isEnabled():
+    return recorder is not None
+
+
+class DictExporter:
+    """Keeps the last exported snapshot in memory, as data."""
+
+    def __init__(self):
+        self.data = None
+
+    def export(self, snapshot):
+        self.data = snapshot
+        return snapshot
+
+
+class PrometheusExporter:
+    """
+    Writes snapshots in the Prometheus text format to a file, e.g. for the textfile collector of the node exporter.
+    The file is replaced at once, so a collector never reads half of it.
+    """
+
+    def __init__(self, path, prefix="felicific_"):
+        self.path = path
+        self.prefix = prefix
+
+    @staticmethod
+    def getMetricName(name):
+        return re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", name).lower()
+
+    @staticmethod
+    def getLabel(value):
+        return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+
+    def getLines(self, snapshot):
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = self.prefix + self.getMetricName(name) + "_total"
+            lines += ["# TYPE " + metric + " counter", metric + " " + repr(value)]
+
+        stageMetrics = (("stage_calls_total", "counter", "calls"), ("stage_seconds_total", "counter", "seconds"),
+                        ("stage_max_seconds", "gauge", "maxSeconds"))
+        for metricName, metricType, field in stageMetrics:
+            metric = self.prefix + metricName
+            lines.append("# TYPE " + metric + " " + metricType)
+            for stage, timer in sorted(snapshot["timers"].items()):
+                lines.append(metric + "{stage=" + self.getLabel(stage) + "} " + repr(timer[field]))
+
+        if "allocations" in snapshot:
+            metric = self.prefix + "stage_allocated_bytes_total"
+            lines.append("# TYPE " + metric + " counter")
+            for stage, allocated in sorted(snapshot["allocations"].items()):
+                lines.append(metric + "{stage=" + self.getLabel(stage) + "} " + repr(allocated))
+        if "peakTracedBytes" in snapshot:
+            metric = self.prefix + "peak_traced_bytes"
+            lines += ["# TYPE " + metric + " gauge", metric + " " + repr(snapshot["peakTracedBytes"])]
+        return lines
+
+    def export(self, snapshot):
+        temporaryPath = self.path + ".tmp"
+        with open(temporaryPath, "w") as file:
+            file.write("\n".join(self.getLines(snapshot)) + "\n")
+        os.replace(temporaryPath, self.path)
+        return snapshot
+
+
+class JsonlExporter:
+    """
+    Appends snapshots to a JSONL trace: one line per traced call (from a recorder with a traceSize), then one line
+    with the counters, timers and allocations.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def export(self, snapshot):
+        snapshot = dict(snapshot)
+        events = snapshot.pop("events", ())
+        with open(self.path, "a") as file:
+            for event in events:
+                file.write(json.dumps(dict(event, type="call")) + "\n")
+            file.write(json.dumps(dict(snapshot, type="snapshot", time=time.time())) + "\n")
+        return snapshot
+
+
+class ProfileReport:
+    """
+    The results of profile().
+
+    Variables:
+    snapshot = the snapshot of the recorder at the end of the run
+    decisions = (name, seconds, number of agents) of the decisions the most time was spent on
+    agents = (decision name, position, seconds, number of consequences) of the agents the most time was spent on
+
+    A decision is named by the EvaluateDecisions given to profile(), or by its position in the order it was first
+    seen; agents are found in the decisions they belong to.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.decisions = []
+        self.agents = []
+
+    def fill(self, activeRecorder, evaluator, top):
+        self.snapshot = activeRecorder.getSnapshot()
+        names = {}
+        if evaluator is not None:
+            for decisionName, decision in evaluator.getDecisions():
+                names.setdefault(id(decision), decisionName)
+
+        decisionTimes = []
+        agentTimes = {}
+        for target, seconds in activeRecorder.objectTimes.values():
+            if isinstance(target, fc.Agent):
+                agentTimes[id(target)] = (target, seconds)
+            else:
+                decisionTimes.append((target, seconds))
+        # decisions without a name are numbered in the order they were first seen
+        for target, seconds in decisionTimes:
+            names.setdefault(id(target), len(names))
+
+        # the decisions holding every timed agent, also those only seen through their agents
+        holders = {id(decision): decision for decision, seconds in decisionTimes}
+        if evaluator is not None:
+            holders.update((id(decision), decision) for decisionName, decision in evaluator.getDecisions())
+        agentPlaces = {}
+        for decision in holders.values():
+            for position, agent in enumerate(decision.agentList):
+                if id(agent) in agentTimes:
+                    agentPlaces.setdefault(id(agent), (names.get(id(decision)), position))
+
+        decisionTimes.sort(key=lambda decisionTime: -decisionTime[1])
+        self.decisions = [(names[id(decision)], seconds, len(decision.agentList))
+                          for decision, seconds in decisionTimes[:top]]
+        heaviestAgents = sorted(agentTimes.values(), key=lambda agentTime: -agentTime[1])[:top]
+        self.agents = [agentPlaces.get(id(agent), (None, None)) + (seconds, getConsequenceCount(agent))
+                       for agent, seconds in heaviestAgents]
+
+
+@contextlib.contextmanager
+def profile(evaluator=None, top=10, trackAllocations=False, exporters=()):
+    """
+    Instruments the calculus for the run within the with block, and fills the yielded ProfileReport on exit with the
+    top decisions and agents by time. Any instrumentation enabled before is restored afterwards.
+    """
+    previous = disable()
+    activeRecorder = Recorder(trackAllocations, trackObjects=True)
+    report = ProfileReport()
+    enable(activeRecorder)
+    try:
+        yield report
+    finally:
+        # filled before disabling, while tracemalloc still knows the peak
+        report.fill(activeRecorder, evaluator, top)
+        disable()
+        # the report keeps what it needs, the agents and decisions are not held any longer
+        activeRecorder.objectTimes = {}
+        for exporter in exporters:
+            exporter.export(report.snapshot)
+        if previous is not None:
+            enable(previous)
@@ -0,0 +1,257 @@
+"""
+Monte Carlo evaluation of decisions whose Felicific Calculus parameters are uncertain.
+
+Every createAgent() argument is normally a point estimate, e.g. "certainty .7 -- 30% chance they will survive". Here
+any argument can instead be a Distribution. N samples are drawn and every decision is evaluated for every sample, in
+vectorized batches built on felicific_arrays.evaluateParameterMatrix(). The result gives the distribution of moral
+values of each decision, the probability that each decision is the best one and quantiles of the moral values.
+
+Each batch draws from its own random stream derived from the seed and the batch number, so results are reproducible
+and do not depend on how many processes the batches are spread over.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import felicific_arrays as fa
+
+
+class Distribution:
+    """
+    Base class of the parameter distributions.
+
+    Methods:
+        sample() returns an array of samples drawn with the given numpy random Generator
+    """
+
+    def sample(self, rng, size):
+        raise NotImplementedError
+
+
+class Uniform(Distribution):
+    def __init__(self, low, high):
+        if high < low:
+            raise ValueError("Uniform distribution needs low <= high.")
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        return rng.uniform(self.low, self.high, size)
+
+
+class Normal(Distribution):
+    # low and high optionally clip the samples, e.g. to keep a certainty between 0 and 1
+    def __init__(self, mean, deviation, low=None, high=None):
+        if deviation < 0:
+            raise ValueError("Normal distribution needs a deviation of at least 0.")
+        self.mean = mean
+        self.deviation = deviation
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        samples = rng.normal(self.mean, self.deviation, size)
+        if self.low is not None or self.high is not None:
+            samples = np.clip(samples, self.low, self.high)
+        return samples
+
+
+class Beta(Distribution):
+    # samples lie between low and high, by default between 0 and 1 which suits certainties, fecundities and purities
+    def __init__(self, alpha, beta, low=0, high=1):
+        if alpha <= 0 or beta <= 0:
+            raise ValueError("Beta distribution needs alpha and beta greater than 0.")
+        self.alpha = alpha
+        self.beta = beta
+        self.low = low
+        self.high = high
+
+    def sample(self, rng, size):
+        return self.low + (self.high - self.low) * rng.beta(self.alpha, self.beta, size)
+
+
+class Triangular(Distribution):
+    def __init__(self, low, mode, high):
+        if not low <= mode <= high or low == high:
+            raise ValueError("Triangular distribution needs low <= mode <= high and low < high.")
+        self.low = low
+        self.mode = mode
+        self.high = high
+
+    def sample(self, rng, size):
+        return rng.triangular(self.low, self.mode, self.high, size)
+
+
+class Empirical(Distribution):
+    # draws from observed values, optionally weighted
+    def __init__(self, values, weights=None):
+        self.values = np.asarray(values, dtype=float)
+        if len(self.values) == 0:
+            raise ValueError("Empirical distribution needs at least one value.")
+        self.probabilities = None
+        if weights is not None:
+            weights = np.asarray(weights, dtype=float)
+            if len(weights) != len(self.values) or weights.min() < 0 or weights.sum() <= 0:
+                raise ValueError("Empirical distribution needs one non-negative weight per value.")
+            self.probabilities = weights / weights.sum()
+
+    def sample(self, rng, size):
+        return rng.choice(self.values, size, p=self.probabilities)
+
+
+class UncertainDecision:
+    """
+    Collects the agents of a decision for Monte Carlo evaluation. It takes the same arguments as
+    Decision.createAgent(), but any of them may be a Distribution.
+
+    Variables:
+    rows = the createAgent() parameters of every agent
+    decisionMakers = whether each agent is the decision maker
+    """
+
+    def __init__(self):
+        self.rows = []
+        self.decisionMakers = []
+
+    def createAgent(self, isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                    f_intensity=0, f_duration=0, f_propinquity=0, f_multiplier=0,
+                    p_intensity=0, p_duration=0, p_propinquity=0, p_multiplier=0, isDecisionMaker=False):
+
+        self.rows.append((isPleasure, intensity, duration, certainty, propinquity, fecundity, purity, multiplier,
+                          f_intensity, f_duration, f_propinquity, f_multiplier,
+                          p_intensity, p_duration, p_propinquity, p_multiplier))
+        self.decisionMakers.append(bool(isDecisionMaker))
+
+
+class ScenarioTemplate:
+    """
+    The fixed part of a Monte Carlo scenario, sent once to every worker process: the parameter matrix with the point
+    estimates filled in, the (row, column, Distribution) of every uncertain parameter and the propinquity decay.
+    """
+
+    def __init__(self, decisions, decay=None):
+        self.decay = decay
+        rows = []
+        self.uncertain = []
+        for decisionId, decision in enumerate(decisions):
+            for parameters, isDecisionMaker in zip(decision.rows, decision.decisionMakers):
+                row = []
+                for column, value in enumerate(parameters):
+                    if isinstance(value, Distribution):
+                        self.uncertain.append((len(rows), column, value))
+                        value = 0
+                    row.append(value)
+                rows.append(row + [decisionId, isDecisionMaker])
+        self.matrix = np.array(rows, dtype=float).reshape(-1, fa.DECISION_MAKER_COLUMN + 1)
+        self.decisionCount = len(decisions)
+
+    def evaluate(self, rng, samples, selfInterestScale):
+        # One copy of the scenario per sample, where sample i uses decision ids i * decisionCount + decisionId
+        rows = len(self.matrix)
+        matrix = np.tile(self.matrix, (samples, 1))
+        matrix[:, fa.DECISION_COLUMN] += np.repeat(np.arange(samples) * self.decisionCount, rows)
+        for row, column, distribution in self.uncertain:
+            matrix[row::rows, column] = distribution.sample(rng, samples)
+
+        result = fa.evaluateParameterMatrix(matrix, selfInterestScale,
+                                            decisionCount=samples * self.decisionCount, decay=self.decay)
+        return result.moralValues.reshape(samples, self.decisionCount)
+
+
+def getBatchRng(seed, batchIndex):
+    return np.random.default_rng(np.random.SeedSequence(entropy=seed, spawn_key=(batchIndex,)))
+
+
+def evaluateShard(template, seed, batches, selfInterestScale):
+    # batches is a list of (batchIndex, samples), evaluated in order
+    return np.concatenate([template.evaluate(getBatchRng(seed, batchIndex), samples, selfInterestScale)
+                           for batchIndex, samples in batches])
+
+
+class MonteCarloResult:
+    """
+    The outcome of a Monte Carlo evaluation.
+
+    Variables:
+    decisionNames = the names of the decisions, in the order they were added
+    moralValues = a (samples, decisions) array of the moral value of every decision for every sample
+
+    Methods:
+        getProbabilityBest() returns the probability of each decision having the highest moral value
+        getQuantiles() returns the given quantiles of the moral value of each decision
+        getMeans() returns the mean moral value of each decision
+    """
+
+    def __init__(self, decisionNames, moralValues):
+        self.decisionNames = decisionNames
+        self.moralValues = moralValues
+
+    def getDistribution(self, decisionName):
+        return self.moralValues[:, self.decisionNames.index(decisionName)]
+
+    def getProbabilityBest(self):
+        # argmax picks the first of equal decisions, like EvaluateDecisions
+        counts = np.bincount(np.argmax(self.moralValues, axis=1), minlength=len(self.decisionNames))
+        return {name: float(count) / len(self.moralValues) for name, count in zip(self.decisionNames, counts)}
+
+    def getQuantiles(self, quantiles=(.05, .5, .95)):
+        values = np.quantile(self.moralValues, quantiles, axis=0)
+        return {name: values[:, index] for index, name in enumerate(self.decisionNames)}
+
+    def getMeans(self):
+        return {name: float(mean) for name, mean in zip(self.decisionNames, self.moralValues.mean(axis=0))}
+
+
+class MonteCarloEvaluation:
+    """
+    Evaluates uncertain decisions by sampling their parameters.
+
+    Variables:
+    seed = the seed every random stream is derived from
+    decisions = the (name, UncertainDecision) pairs to evaluate
+    decay = the felicific_decay.PropinquityDecay applied to the propinquities, or None for 1/propinquity^0.1
+
+    Methods:
+        addDecision() adds an UncertainDecision, creating one if none is given
+        run() samples and evaluates all decisions, returning a MonteCarloResult
+    """
+
+    def __init__(self, seed=None, decay=None):
+        # Draw a seed up front so that a run without a seed can still be reproduced from self.seed
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy)
+        self.decisions = []
+        self.decay = decay
+
+    def addDecision(self, decisionName, decision=None):
+        if decision is None:
+            decision = UncertainDecision()
+        self.decisions.append((decisionName, decision))
+        return decision
+
+    def run(self, samples, selfInterestScale=None, batchSize=10000, processes=None):
+        """
+        Draws samples sets of parameters in batches of batchSize. With processes greater than 1, the batches are
+        spread over that many worker processes; the result is the same as with a single process.
+        """
+        if samples < 1 or batchSize < 1:
+            raise ValueError("Samples and batch size must be at least 1.")
+        if not self.decisions:
+            raise ValueError("There are no decisions to evaluate.")
+
+        template = ScenarioTemplate([decision for decisionName, decision in self.decisions], self.decay)
+        batches = [(batchIndex, min(batchSize, samples - start))
+                   for batchIndex, start in enumerate(range(0, samples, batchSize))]
+
+        if processes is None or processes <= 1:
+            moralValues = evaluateShard(template, self.seed, batches, selfInterestScale)
+        else:
+            # Contiguous shards keep the samples in batch order when they are put back together
+            shards = [shard for shard in np.array_split(np.arange(len(batches)), processes) if len(shard)]
+            with ProcessPoolExecutor(max_workers=len(shards)) as executor:
+                futures = [executor.submit(evaluateShard, template, self.seed,
+                                           [batches[index] for index in shard], selfInterestScale)
+                           for shard in shards]
+                moralValues = np.concatenate([future.result() for future in futures])
+
+        return MonteCarloResult([decisionName for decisionName, decision in self.decisions], moralValues)
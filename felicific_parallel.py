@@ -0,0 +1,137 @@
+"""
+Process-pool evaluation of large scenarios: scenario files (felicific_scenario) and parameter matrices (as taken by
+felicific_arrays.evaluateParameterMatrix()).
+
+Sending Decision objects to other processes never pays off, as their moral values are running totals that are
+cheaper to read than to send. What is worth sharing out is evaluating the records of a scenario, so that is what the
+workers do. Every worker memory-maps the scenario file (or attaches to a shared memory copy of a parameter matrix)
+and evaluates its own range of records, so only the range and the per-decision sums pass between processes.
+EvaluateDecisions(parallel=True) does the same with the parameter matrix of its decisions:
+
+    evaluateScenario("scenario.bin", workers=8)
+    evaluateParameterMatrix(matrix, workers=8)
+    felicific_calculus.EvaluateDecisions(parallel=True, workers=8)
+
+The records are split at the chunk boundaries of the serial evaluation and the sums of every chunk are added in
+order, so the values, and therefore the best decision, are exactly those of evaluateParameterMatrix().
+"""
+
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_scenario
+
+
+def getRecords(source):
+    """Returns the records of a source, and the shared memory block to close once they are no longer used."""
+    kind, name, offset, shape = source
+    if kind == "file":
+        return np.memmap(name, dtype=float, mode="r", offset=offset, shape=shape), None
+    block = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=float, buffer=block.buf), block
+
+
+def evaluateChunks(source, firstChunk, lastChunk, chunkSize, selfInterestScale, decisionCount, decay):
+    """Returns the (moral values, negative moral values) of every decision over each of the chunks of a task."""
+    records, block = getRecords(source)
+    try:
+        return [fa.sumParameterChunk(records[chunk * chunkSize:(chunk + 1) * chunkSize], selfInterestScale,
+                                     decisionCount, decay)
+                for chunk in range(firstChunk, lastChunk)]
+    finally:
+        # the array must be gone before its block can be closed
+        del records
+        if block is not None:
+            block.close()
+
+
+def evaluateSource(source, recordCount, decisionCount, decisionNames, selfInterestScale, workers, chunkSize,
+                   decay):
+    if selfInterestScale is not None and (selfInterestScale > 1 or selfInterestScale < 0):
+        raise ValueError("Self interest scale must be between 0 and 1.")
+    if chunkSize < 1:
+        raise ValueError("Chunk size must be at least 1.")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    chunkCount = math.ceil(recordCount / chunkSize)
+    # about four tasks per worker keeps the pool busy when some ranges are slower than others
+    chunksPerTask = max(1, math.ceil(chunkCount / (4 * workers)))
+    moralValues = np.zeros(decisionCount)
+    negativeMoralValues = np.zeros(decisionCount)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(evaluateChunks, source, first, min(first + chunksPerTask, chunkCount), chunkSize,
+                                   selfInterestScale, decisionCount, decay)
+                   for first in range(0, chunkCount, chunksPerTask)]
+        # adding the chunks in order gives the same sums as the serial evaluation
+        for future in futures:
+            for chunkValues, chunkNegativeValues in future.result():
+                moralValues += chunkValues
+                negativeMoralValues += chunkNegativeValues
+
+    return fa.BatchResult(np.round(moralValues, 2), np.round(negativeMoralValues, 2), decisionNames)
+
+
+def getMappedFile(matrix):
+    """Returns the file and offset of a matrix memory-mapped from a file (e.g. by felicific_scenario), or None."""
+    if not matrix.flags.c_contiguous:
+        return None
+    array = matrix
+    while isinstance(array, np.ndarray):
+        # the memmap that mapped the file is the one whose base is not an array
+        if isinstance(array, np.memmap) and not isinstance(array.base, np.ndarray):
+            if array.filename is None:
+                return None
+            return array.filename, array.offset + matrix.ctypes.data - array.ctypes.data
+        array = array.base
+    return None
+
+
+def evaluateParameterMatrix(matrix, selfInterestScale=None, decisionNames=None, decisionCount=None, workers=None,
+                            chunkSize=1000000, decay=None):
+    """
+    Evaluates a parameter matrix like felicific_arrays.evaluateParameterMatrix(), with a pool of workers (by default
+    one per CPU). A matrix memory-mapped from a file is mapped by every worker, any other is copied once into shared
+    memory.
+    """
+    matrix = np.asarray(matrix, dtype=float)
+    if matrix.ndim != 2 or matrix.shape[1] not in (fa.DECISION_COLUMN + 1, fa.DECISION_MAKER_COLUMN + 1):
+        raise ValueError("Parameter matrix must have " + str(fa.DECISION_COLUMN + 1) + " or "
+                         + str(fa.DECISION_MAKER_COLUMN + 1) + " columns.")
+    if len(matrix) and matrix[:, fa.DECISION_COLUMN].min() < 0:
+        raise ValueError("Decision ids must not be negative.")
+    if decisionCount is None:
+        decisionCount = (len(decisionNames) if decisionNames is not None
+                         else int(matrix[:, fa.DECISION_COLUMN].max(initial=-1)) + 1)
+
+    mappedFile = getMappedFile(matrix)
+    if mappedFile is not None:
+        return evaluateSource(("file",) + mappedFile + (matrix.shape,), len(matrix), decisionCount, decisionNames,
+                              selfInterestScale, workers, chunkSize, decay)
+
+    # a shared memory block can't be empty
+    block = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+    try:
+        np.ndarray(matrix.shape, dtype=float, buffer=block.buf)[:] = matrix
+        return evaluateSource(("shared", block.name, 0, matrix.shape), len(matrix), decisionCount, decisionNames,
+                              selfInterestScale, workers, chunkSize, decay)
+    finally:
+        block.close()
+        block.unlink()
+
+
+def evaluateScenario(path, selfInterestScale=None, workers=None, chunkSize=1000000, decay=None):
+    """
+    Evaluates a scenario file with a pool of workers (by default one per CPU), each memory-mapping the file, and
+    returns a felicific_arrays.BatchResult.
+    """
+    scenario = felicific_scenario.loadScenario(path)
+    if decay is None:
+        decay = scenario.decay
+    return evaluateParameterMatrix(scenario.matrix, selfInterestScale, scenario.decisionNames, workers=workers,
+                                   chunkSize=chunkSize, decay=decay)
@@ -0,0 +1,116 @@
+"""
+Pareto-optimal (skyline) selection of decisions over several objectives, every one of which is maximized.
+
+A decision is Pareto-optimal when no other decision is at least as good in every objective and better in one.
+Decisions with equal values in every objective do not dominate each other, so they are all kept. Depending on the
+number of objectives:
+
+    1       the decisions with the highest value
+    2       sort by the first objective and sweep, keeping the best second objective so far: O(n log n)
+    3       sort by the first objective and sweep, keeping a staircase of the best (second, third) values so far,
+            searched with bisection: O(n log n) comparisons
+    4+      sort-filter skyline: sorted so that no decision can be dominated by a later one, each decision is only
+            compared to the Pareto-optimal decisions found before it
+
+Only the standard library is used, so EvaluateDecisions can use it without NumPy.
+"""
+
+from bisect import bisect_left
+
+
+def getParetoOptimal(points):
+    """Returns the indexes, in ascending order, of the Pareto-optimal points, each a sequence of objective values."""
+    points = [tuple(point) for point in points]
+    if not points:
+        return []
+    dimensions = len(points[0])
+    if any(len(point) != dimensions for point in points):
+        raise ValueError("Every point must have the same number of objectives.")
+
+    if dimensions == 0:
+        return list(range(len(points)))
+    if dimensions == 1:
+        best = max(point[0] for point in points)
+        return [index for index, point in enumerate(points) if point[0] == best]
+    if dimensions == 2:
+        return getSkyline2D(points)
+    if dimensions == 3:
+        return getSkyline3D(points)
+    return getSortFilterSkyline(points)
+
+
+def getGroups(points):
+    # the indexes of the points sorted by decreasing objectives, grouped by equal first objective
+    order = sorted(range(len(points)), key=points.__getitem__, reverse=True)
+    start = 0
+    while start < len(order):
+        end = start + 1
+        first = points[order[start]][0]
+        while end < len(order) and points[order[end]][0] == first:
+            end += 1
+        yield order[start:end]
+        start = end
+
+
+def getSkyline2D(points):
+    skyline = []
+    bestY = None
+    for group in getGroups(points):
+        # within a group of equal x, only the points with the highest y are not dominated by another in the group,
+        # and they are dominated by an earlier group (with a higher x) with at least their y
+        groupY = points[group[0]][1]
+        if bestY is None or groupY > bestY:
+            skyline.extend(index for index in group if points[index][1] == groupY)
+            bestY = groupY
+    return sorted(skyline)
+
+
+def getSkyline3D(points):
+    skyline = []
+    # the staircase of the (y, z) of the Pareto-optimal points with a higher x: y ascending, z strictly descending
+    stairY = []
+    stairZ = []
+    for group in getGroups(points):
+        if len(group) == 1:
+            candidates = group
+        else:
+            # the 2D skyline within the group of equal x, which the earlier groups may still dominate
+            candidates = [group[position] for position in getSkyline2D([points[index][1:] for index in group])]
+        survivors = []
+        for index in candidates:
+            x, y, z = points[index]
+            # the first step with at least this y has the highest z of all steps with at least this y
+            position = bisect_left(stairY, y)
+            if position == len(stairY) or stairZ[position] < z:
+                survivors.append(index)
+
+        for index in survivors:
+            x, y, z = points[index]
+            position = bisect_left(stairY, y)
+            if position < len(stairY) and stairY[position] == y and stairZ[position] >= z:
+                # an equal point of this group is already on the staircase
+                continue
+            # remove the steps this point dominates: those with at most its y and z, just before it
+            start = position
+            while start > 0 and stairZ[start - 1] <= z:
+                start -= 1
+            if position < len(stairY) and stairY[position] == y:
+                position += 1
+            stairY[start:position] = [y]
+            stairZ[start:position] = [z]
+        skyline.extend(survivors)
+    return sorted(skyline)
+
+
+def dominates(point, other):
+    return all(value >= otherValue for value, otherValue in zip(point, other)) and point != other
+
+
+def getSortFilterSkyline(points):
+    skyline = []
+    # in decreasing lexicographic order, a point can only be dominated by points before it
+    for index in sorted(range(len(points)), key=points.__getitem__, reverse=True):
+        point = points[index]
+        if not any(dominates(points[other], point) for other in skyline):
+            skyline.append(index)
+    return sorted(skyline)
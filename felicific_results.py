@@ -0,0 +1,246 @@
+"""
+Structured evaluation results, and sinks that write them out.
+
+EvaluateDecisions.getResults() returns one DecisionResult per decision instead of printing, and the results can be
+written to any of the sinks below. The sinks buffer their output, so writing millions of results costs a few large
+writes rather than a console line each:
+
+    NullSink        discards everything, for runs that only need the best decision
+    JsonlSink       one JSON object per line
+    CsvSink         a header row followed by one row per result
+    ColumnarSink    one column per field, written as Parquet or Arrow (needs pyarrow) or as NumPy .npz (needs numpy)
+"""
+
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+
+class DecisionResult:
+    """
+    The evaluation of one decision.
+
+    Variables:
+    decisionName = the name of the decision
+    moralValue = the summed moral value of the decision
+    negativeMoralValue = the summed negative moral value of the decision
+    selfInterestScale = the self-interest scale the decision was evaluated with, or None
+    hasDecisionMaker = whether the decision has a decision maker among its agents
+    """
+
+    __slots__ = ("decisionName", "moralValue", "negativeMoralValue", "selfInterestScale", "hasDecisionMaker")
+
+    FIELDS = __slots__
+
+    def __init__(self, decisionName, moralValue, negativeMoralValue, selfInterestScale=None, hasDecisionMaker=False):
+        self.decisionName = decisionName
+        self.moralValue = moralValue
+        self.negativeMoralValue = negativeMoralValue
+        self.selfInterestScale = selfInterestScale
+        self.hasDecisionMaker = hasDecisionMaker
+
+    def __repr__(self):
+        return "DecisionResult(" + ", ".join(field + "=" + repr(getattr(self, field)) for field in self.FIELDS) + ")"
+
+    def __eq__(self, other):
+        return isinstance(other, DecisionResult) and self.toTuple() == other.toTuple()
+
+    def toTuple(self):
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    def toDict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+class ResultSink:
+    """
+    Base class of the sinks. Results are collected in a buffer that is flushed every bufferSize results and on close.
+    Sinks can be used as context managers.
+
+    Methods:
+        write() writes one result
+        writeAll() writes every result of an iterable
+        flush() writes out the buffered results
+        close() flushes and closes the sink
+    """
+
+    def __init__(self, bufferSize=10000):
+        self.bufferSize = bufferSize
+        self.buffer = []
+
+    def write(self, result):
+        self.buffer.append(result)
+        if len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    def writeAll(self, results):
+        for result in results:
+            self.write(result)
+
+    def flush(self):
+        if self.buffer:
+            self.writeBuffer(self.buffer)
+            self.buffer = []
+
+    def writeBuffer(self, results):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exceptionType, exception, traceback):
+        self.close()
+
+
+class NullSink(ResultSink):
+    def __init__(self):
+        super().__init__(bufferSize=1)
+        self.count = 0
+
+    def write(self, result):
+        self.count += 1
+
+    def writeBuffer(self, results):
+        pass
+
+
+class FileSink(ResultSink):
+    # writes text to a path it opens and closes itself, or to an open file it leaves open
+    def __init__(self, file, bufferSize=10000):
+        super().__init__(bufferSize)
+        self.ownsFile = isinstance(file, (str, os.PathLike))
+        self.file = open(file, "w", newline="") if self.ownsFile else file
+
+    def close(self):
+        super().close()
+        if self.ownsFile:
+            self.file.close()
+        else:
+            self.file.flush()
+
+
+class JsonlSink(FileSink):
+    def writeBuffer(self, results):
+        self.file.write("".join(json.dumps(result.toDict()) + "\n" for result in results))
+
+
+class CsvSink(FileSink):
+    def __init__(self, file, bufferSize=10000):
+        super().__init__(file, bufferSize)
+        self.file.write(",".join(DecisionResult.FIELDS) + "\r\n")
+
+    def writeBuffer(self, results):
+        text = io.StringIO()
+        csv.writer(text).writerows(result.toTuple() for result in results)
+        self.file.write(text.getvalue())
+
+
+class ColumnarSink(ResultSink):
+    """
+    Writes the results as columns, as Parquet ("parquet") or Arrow IPC ("arrow") files with pyarrow, or as a NumPy
+    .npz archive ("npz"). Every flush writes the buffered results out and clears the buffer, so the sink never holds
+    more than bufferSize results: as a record batch of the Parquet or Arrow file, or, as the members of an .npz archive
+    cannot be appended to, to a temporary file per column, which close() copies into the archive.
+    """
+
+    FORMATS = ("parquet", "arrow", "npz")
+
+    def __init__(self, path, format="parquet", bufferSize=10000):
+        if format not in self.FORMATS:
+            raise ValueError("Columnar format must be one of " + ", ".join(self.FORMATS) + ".")
+        # fail early rather than after the whole evaluation if the needed library is missing
+        if format == "npz":
+            import numpy
+        else:
+            import pyarrow
+        super().__init__(bufferSize)
+        self.path = path
+        self.format = format
+        # the pyarrow writer, the file it writes to and the schema of the columns, set by the first flush
+        self.writer = None
+        self.file = None
+        self.schema = None
+        # for npz, a temporary file of every column, and the (dtype, length) of every flush written to it
+        self.columnFiles = None
+        self.chunks = {field: [] for field in DecisionResult.FIELDS}
+
+    def writeBuffer(self, results):
+        columns = {field: [getattr(result, field) for result in results] for field in DecisionResult.FIELDS}
+        if self.format == "npz":
+            self.writeColumnFiles(columns)
+        else:
+            self.writeRecordBatch(columns)
+
+    def openWriter(self, nameType):
+        import pyarrow as pa
+        self.schema = pa.schema([("decisionName", nameType), ("moralValue", pa.float64()),
+                                 ("negativeMoralValue", pa.float64()), ("selfInterestScale", pa.float64()),
+                                 ("hasDecisionMaker", pa.bool_())])
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        else:
+            self.file = pa.OSFile(os.fspath(self.path), "wb")
+            self.writer = pa.ipc.new_file(self.file, self.schema)
+
+    def writeRecordBatch(self, columns):
+        import pyarrow as pa
+        if self.writer is None:
+            # the names take the type of the first results, the other columns always have the same type
+            self.openWriter(pa.array(columns["decisionName"]).type)
+        self.writer.write_batch(pa.record_batch([pa.array(columns[field], type=self.schema.field(field).type)
+                                                 for field in DecisionResult.FIELDS], schema=self.schema))
+
+    def writeColumnFiles(self, columns):
+        import numpy as np
+        if self.columnFiles is None:
+            self.columnFiles = {field: tempfile.TemporaryFile() for field in DecisionResult.FIELDS}
+        columns["selfInterestScale"] = [np.nan if scale is None else scale for scale in columns["selfInterestScale"]]
+        for field, values in columns.items():
+            array = np.asarray(values)
+            if array.dtype.hasobject:
+                raise ValueError("The " + field + " of results written as npz must be numbers or strings.")
+            self.columnFiles[field].write(array.tobytes())
+            self.chunks[field].append((array.dtype, len(array)))
+
+    def writeArchive(self):
+        import numpy as np
+        with zipfile.ZipFile(self.path, "w", allowZip64=True) as archive:
+            for field in DecisionResult.FIELDS:
+                chunks = self.chunks[field]
+                # every flush was written with the type of its own values (e.g. names of its own length), so each is
+                # converted to the type of the whole column
+                dtype = np.result_type(*(chunkType for chunkType, length in chunks)) if chunks else np.dtype(float)
+                header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False,
+                          "shape": (sum(length for chunkType, length in chunks),)}
+                with archive.open(field + ".npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array_header_1_0(member, header)
+                    if chunks:
+                        file = self.columnFiles[field]
+                        file.seek(0)
+                        for chunkType, length in chunks:
+                            member.write(np.frombuffer(file.read(chunkType.itemsize * length), chunkType)
+                                         .astype(dtype).tobytes())
+
+    def close(self):
+        super().close()
+        if self.format == "npz":
+            try:
+                self.writeArchive()
+            finally:
+                for file in (self.columnFiles or {}).values():
+                    file.close()
+            return
+
+        if self.writer is None:
+            import pyarrow as pa
+            self.openWriter(pa.string())
+        self.writer.close()
+        if self.file is not None:
+            self.file.close()
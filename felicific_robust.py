@@ -0,0 +1,166 @@
+"""
+Robust selection of decisions across a grid of scenarios.
+
+getDecisionWithHighestValue() picks the best decision for one set of parameters and one self-interest scale. Here
+every scenario is a plausible world, given as scale factors of the parameters (e.g. {"certainty": .8} lowers the
+certainty of every consequence by 20%) and optionally its own self-interest scale. Every decision is evaluated in
+every scenario, and three decisions are picked:
+
+    maximin         the decision with the highest value in its worst scenario
+    minimax regret  the decision whose largest shortfall from the best decision of a scenario is the smallest
+    expected value  the decision with the highest value averaged over the scenarios (weighted by their probabilities)
+
+The decisions are summed once, split between the decision makers and the other agents, with
+felicific_sensitivity.ScaledEvaluation; every scenario is then a small matrix product rather than a new evaluation of
+the calculus. Scenarios are evaluated shardSize at a time and only the running worst values, regrets and expected
+values are kept, so the decisions x scenarios matrix never has to fit in memory unless it is asked for.
+"""
+
+import itertools
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_sensitivity
+
+FIELDS = fa.FIELDS
+FIELD_INDEX = fa.FIELD_INDEX
+
+
+def getScenarioGrid(factors, selfInterestScales=(None,)):
+    """
+    Returns every combination of the given scale factors and self-interest scales as a list of scenarios, e.g.
+    getScenarioGrid({"certainty": (.5, 1), "multiplier": (.8, 1, 1.2)}, (0, .5, 1)) gives 18 scenarios.
+    """
+    names = list(factors)
+    scenarios = []
+    for values in itertools.product(*(factors[name] for name in names)):
+        for selfInterestScale in selfInterestScales:
+            scenario = dict(zip(names, values))
+            if selfInterestScale is not None:
+                scenario["selfInterestScale"] = selfInterestScale
+            scenarios.append(scenario)
+    return scenarios
+
+
+class RobustResult:
+    """
+    The robust choices among decisions evaluated across scenarios.
+
+    Variables:
+    decisionNames = the names of the decisions, indexed by decision id
+    worstValues = the lowest value of every decision over the scenarios
+    maxRegrets = the largest regret of every decision over the scenarios: the value of the best decision of a
+        scenario minus its own
+    expectedValues = the value of every decision averaged over the scenarios
+    values = the (decisions, scenarios) values, if they were kept
+
+    Methods:
+        getMaximinDecision() returns the decision with the highest worst value
+        getMinimaxRegretDecision() returns the decision with the lowest largest regret
+        getExpectedValueDecision() returns the decision with the highest expected value
+    """
+
+    def __init__(self, decisionNames, worstValues, maxRegrets, expectedValues, values=None):
+        self.decisionNames = decisionNames
+        self.worstValues = worstValues
+        self.maxRegrets = maxRegrets
+        self.expectedValues = expectedValues
+        self.values = values
+
+    # np.argmax and np.argmin return the first of equal decisions, like max() in EvaluateDecisions
+    def getMaximinDecision(self):
+        return self.decisionNames[int(np.argmax(self.worstValues))]
+
+    def getMinimaxRegretDecision(self):
+        return self.decisionNames[int(np.argmin(self.maxRegrets))]
+
+    def getExpectedValueDecision(self):
+        return self.decisionNames[int(np.argmax(self.expectedValues))]
+
+
+class RobustEvaluation:
+    """
+    Evaluates decisions across scenarios.
+
+    Variables:
+    decisionNames = the names of the decisions, indexed by decision id
+    scales = a (scenarios, 16) array of the scale factor of every parameter in every scenario
+    selfInterestScales = the self-interest scale of every scenario, NaN for none
+    probabilities = the probability of every scenario, summing to 1
+    negative = whether the negative moral values are compared instead of the moral values
+
+    Methods:
+        run() evaluates every decision in every scenario and returns a RobustResult
+    """
+
+    def __init__(self, decisions, scenarios, probabilities=None, negative=False, decisionNames=None, decay=None):
+        if not scenarios:
+            raise ValueError("There are no scenarios to evaluate.")
+        self.scales = np.ones((len(scenarios), len(FIELDS)))
+        self.selfInterestScales = np.full(len(scenarios), np.nan)
+        for index, scenario in enumerate(scenarios):
+            for name, value in scenario.items():
+                if name == "selfInterestScale":
+                    if value is not None and (value > 1 or value < 0):
+                        raise ValueError("Self interest scale must be between 0 and 1.")
+                    self.selfInterestScales[index] = np.nan if value is None else value
+                elif name not in FIELD_INDEX or name == "isPleasure":
+                    raise ValueError("Unknown or non-numeric parameter: " + str(name) + ".")
+                elif value < 0:
+                    # a negative factor would turn pleasures into pains, which the summed consequences cannot follow
+                    raise ValueError("Scale factors must not be negative.")
+                else:
+                    self.scales[index, FIELD_INDEX[name]] = value
+
+        if probabilities is None:
+            self.probabilities = np.full(len(scenarios), 1 / len(scenarios))
+        else:
+            probabilities = np.asarray(probabilities, dtype=float)
+            if len(probabilities) != len(scenarios) or (probabilities < 0).any() or probabilities.sum() <= 0:
+                raise ValueError("Every scenario needs a probability of at least 0, and they cannot all be 0.")
+            self.probabilities = probabilities / probabilities.sum()
+        self.negative = negative
+
+        # the decision makers and the other agents are summed apart (each weighted 1, the others 0), so that every
+        # scenario can apply its own self-interest scale
+        self.decisionMakers = felicific_sensitivity.ScaledEvaluation(decisions, 1, decisionNames, decay)
+        self.others = felicific_sensitivity.ScaledEvaluation(decisions, 0, decisionNames, decay)
+        self.decisionNames = self.decisionMakers.decisionNames
+
+    def evaluateShard(self, start, end):
+        """Returns the (scenarios, decisions) values of the scenarios from start to end, rounded like Decision."""
+        scales = self.scales[start:end]
+        decisionMakerValues = self.decisionMakers.evaluate(scales, self.negative)
+        othersValues = self.others.evaluate(scales, self.negative)
+        selfInterestScales = self.selfInterestScales[start:end, None]
+        values = np.where(np.isnan(selfInterestScales), decisionMakerValues + othersValues,
+                          decisionMakerValues * selfInterestScales + othersValues * (1 - selfInterestScales))
+        return np.round(values, 2)
+
+    def run(self, shardSize=1024, keepValues=False):
+        """
+        Evaluates the scenarios shardSize at a time. With keepValues, the result also holds the (decisions, scenarios)
+        matrix of values.
+        """
+        if shardSize < 1:
+            raise ValueError("Shard size must be at least 1.")
+        decisionCount = len(self.decisionNames)
+        if decisionCount == 0:
+            raise ValueError("There are no decisions to evaluate.")
+
+        worstValues = np.full(decisionCount, np.inf)
+        maxRegrets = np.zeros(decisionCount)
+        expectedValues = np.zeros(decisionCount)
+        shards = []
+        for start in range(0, len(self.scales), shardSize):
+            end = min(start + shardSize, len(self.scales))
+            values = self.evaluateShard(start, end)
+            worstValues = np.minimum(worstValues, values.min(axis=0))
+            maxRegrets = np.maximum(maxRegrets, (values.max(axis=1, keepdims=True) - values).max(axis=0))
+            expectedValues += self.probabilities[start:end] @ values
+            if keepValues:
+                shards.append(values)
+
+        return RobustResult(self.decisionNames, worstValues, maxRegrets, expectedValues,
+                            np.concatenate(shards).T if keepValues else None)
@@ -0,0 +1,216 @@
+"""
+A compact binary file format for scenarios, which can be memory-mapped straight into the evaluation arrays.
+
+A scenario normally only exists as Python code issuing createAgent() calls one by one. A scenario file instead holds:
+
+    header      64 bytes: magic, version, record size, record count, decision count, offset of the name table, the
+                registered name of the decay (see felicific_decay) and the offset of its parameters
+    records     one fixed-width record per consequence: the 16 createAgent() fields, the decision id and the decision
+                maker flag, as little-endian doubles
+    name table  the name of every decision, each a little-endian uint32 byte length and a type byte (s for a string,
+                i for an integer) followed by its UTF-8 bytes
+    decay       the parameters of the decay as JSON, if the decay is not the default
+
+Decision names must be strings or integers, and are loaded back as the type they were written with.
+
+Records have exactly the layout of the matrix taken by felicific_arrays.evaluateParameterMatrix(), so loading a
+scenario maps the records into that matrix without copying or parsing them, and evaluating it only costs page faults.
+Files are written to a temporary file that replaces the path once it is complete, so a failed write never leaves a
+partial scenario behind.
+"""
+
+import itertools
+import json
+import numbers
+import os
+import struct
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_decay
+
+MAGIC = b"UTILICLC"
+VERSION = 3
+HEADER = struct.Struct("<8sIIQQQ16sQ")
+HEADER_SIZE = 64
+RECORD_FIELDS = fa.DECISION_MAKER_COLUMN + 1
+RECORD_DTYPE = np.dtype("<f8")
+RECORD_SIZE = RECORD_FIELDS * RECORD_DTYPE.itemsize
+NAME_HEADER = struct.Struct("<Ic")
+
+
+class Scenario:
+    """
+    A scenario loaded from a file.
+
+    Variables:
+    matrix = the (records, 18) parameter matrix, memory-mapped from the file
+    decisionNames = the names of the decisions, indexed by decision id
+    decay = the felicific_decay.PropinquityDecay the scenario was written with, or None for 1/propinquity^0.1
+
+    Methods:
+        evaluate() evaluates every decision, returning a felicific_arrays.BatchResult, optionally with several worker
+            processes
+        getDecision() builds an ArrayDecision holding one decision of the scenario
+
+    Both evaluate with the decay of the scenario unless they are given another.
+    """
+
+    def __init__(self, matrix, decisionNames, decay=None):
+        self.matrix = matrix
+        self.decisionNames = decisionNames
+        self.decay = decay
+
+    def evaluate(self, selfInterestScale=None, chunkSize=1000000, decay=None, workers=1):
+        if decay is None:
+            decay = self.decay
+        # with several workers, each maps the file and evaluates its own chunks (see felicific_parallel)
+        if workers != 1:
+            import felicific_parallel
+            return felicific_parallel.evaluateParameterMatrix(self.matrix, selfInterestScale, self.decisionNames,
+                                                              workers=workers, chunkSize=chunkSize, decay=decay)
+        return fa.evaluateParameterMatrix(self.matrix, selfInterestScale, self.decisionNames, chunkSize=chunkSize,
+                                          decay=decay)
+
+    def getDecision(self, decisionName, decay=None):
+        if decay is None:
+            decay = self.decay
+        decisionId = self.decisionNames.index(decisionName)
+        decision = fa.ArrayDecision(decay=decay)
+        for row in self.matrix[self.matrix[:, fa.DECISION_COLUMN] == decisionId]:
+            decision.createAgent(*row[:fa.DECISION_COLUMN].tolist(),
+                                 isDecisionMaker=bool(row[fa.DECISION_MAKER_COLUMN]))
+        return decision
+
+
+def getDecayHeader(decay):
+    """Returns the registered name of a decay and its parameters as JSON, or empty ones for the default decay."""
+    decay = felicific_decay.getDecay(decay)
+    if decay == felicific_decay.DEFAULT_DECAY:
+        return b"", b""
+    names = [name for name, decayClass in felicific_decay.DECAYS.items() if type(decay) is decayClass]
+    if not names or len(names[0].encode("utf-8")) > 16:
+        raise ValueError("Scenario decays must be registered with felicific_decay.registerDecay() under a name of at "
+                         "most 16 bytes.")
+    return names[0].encode("utf-8"), json.dumps(decay.getParameters()).encode("utf-8")
+
+
+def getNameBytes(name):
+    """Returns the type byte of a decision name and its UTF-8 bytes."""
+    if isinstance(name, str):
+        return b"s", name.encode("utf-8")
+    if isinstance(name, numbers.Integral) and not isinstance(name, bool):
+        return b"i", str(int(name)).encode("utf-8")
+    raise ValueError("Scenario decision names must be strings or integers.")
+
+
+def writeScenarioMatrix(path, matrices, decisionNames, decay=None):
+    """
+    Writes a scenario from parameter matrices laid out like the records (or without the decision maker column).
+    matrices may be one matrix or an iterable of chunks, so scenarios larger than memory can be written. The names are
+    only read after the last chunk, so a generator of chunks may still be adding to decisionNames. The decay is
+    stored in the file, and must be registered with felicific_decay.registerDecay() unless it is the default. Names
+    must be strings or integers.
+    """
+    if isinstance(matrices, np.ndarray):
+        matrices = [matrices]
+    decayName, decayParameters = getDecayHeader(decay)
+
+    temporaryPath = str(path) + "." + str(os.getpid()) + ".tmp"
+    try:
+        with open(temporaryPath, "wb") as file:
+            file.write(bytes(HEADER_SIZE))
+            recordCount = 0
+            highestDecisionId = -1
+            for matrix in matrices:
+                matrix = np.asarray(matrix, dtype=float)
+                if matrix.ndim == 2 and matrix.shape[1] == fa.DECISION_COLUMN + 1:
+                    matrix = np.column_stack([matrix, np.zeros(len(matrix))])
+                if matrix.ndim != 2 or matrix.shape[1] != RECORD_FIELDS:
+                    raise ValueError("Scenario records must have " + str(fa.DECISION_COLUMN + 1) + " or "
+                                     + str(RECORD_FIELDS) + " columns.")
+                if len(matrix):
+                    if matrix[:, fa.DECISION_COLUMN].min() < 0:
+                        raise ValueError("Decision ids must not be negative.")
+                    highestDecisionId = max(highestDecisionId, int(matrix[:, fa.DECISION_COLUMN].max()))
+                file.write(np.ascontiguousarray(matrix, dtype=RECORD_DTYPE).tobytes())
+                recordCount += len(matrix)
+
+            if highestDecisionId >= len(decisionNames):
+                raise ValueError("Scenario records refer to a decision without a name.")
+
+            nameTableOffset = file.tell()
+            for name in decisionNames:
+                nameType, name = getNameBytes(name)
+                file.write(NAME_HEADER.pack(len(name), nameType))
+                file.write(name)
+            decayOffset = file.tell()
+            file.write(decayParameters)
+
+            file.seek(0)
+            file.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, recordCount, len(decisionNames), nameTableOffset,
+                                   decayName, decayOffset))
+        os.replace(temporaryPath, path)
+    except BaseException:
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        raise
+
+
+def writeScenario(path, decisions, decay=None):
+    """
+    Writes a scenario from (name, decision) pairs, e.g. EvaluateDecisions.getDecisions() or a generator. The decay
+    defaults to that of the decisions, which must then all have the same one.
+    """
+    decisionNames = []
+    decisions = iter(decisions)
+    first = next(decisions, None)
+    if first is not None:
+        decisions = itertools.chain([first], decisions)
+    checkDecay = decay is None
+    if checkDecay and first is not None:
+        decay = getattr(first[1], "decay", None)
+    scenarioDecay = felicific_decay.getDecay(decay)
+
+    def getRecords():
+        for decisionId, (decisionName, decision) in enumerate(decisions):
+            decisionNames.append(decisionName)
+            if checkDecay and felicific_decay.getDecay(getattr(decision, "decay", None)) != scenarioDecay:
+                raise ValueError("The decisions of a scenario must all have the same decay.")
+            rows = [tuple(parameters) + (decisionId, isDecisionMaker)
+                    for parameters, isDecisionMaker in decision.getParameterRows()]
+            yield np.array(rows, dtype=float).reshape(-1, RECORD_FIELDS)
+
+    writeScenarioMatrix(path, getRecords(), decisionNames, decay)
+
+
+def loadScenario(path):
+    """Memory-maps a scenario file. The records are not read until they are evaluated."""
+    with open(path, "rb") as file:
+        header = file.read(HEADER_SIZE)
+        (magic, version, recordSize, recordCount, decisionCount, nameTableOffset, decayName,
+         decayOffset) = HEADER.unpack_from(header)
+        if magic != MAGIC:
+            raise ValueError(str(path) + " is not a scenario file.")
+        if version != VERSION or recordSize != RECORD_SIZE:
+            raise ValueError(str(path) + " has an unsupported scenario version.")
+
+        file.seek(nameTableOffset)
+        decisionNames = []
+        for decision in range(decisionCount):
+            length, nameType = NAME_HEADER.unpack(file.read(NAME_HEADER.size))
+            name = file.read(length).decode("utf-8")
+            decisionNames.append(int(name) if nameType == b"i" else name)
+
+        decay = None
+        decayName = decayName.rstrip(b"\0").decode("utf-8")
+        if decayName:
+            file.seek(decayOffset)
+            decay = felicific_decay.getDecay(decayName, *json.loads(file.read()))
+
+    if recordCount == 0:
+        matrix = np.zeros((0, RECORD_FIELDS), dtype=RECORD_DTYPE)
+    else:
+        matrix = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(recordCount, RECORD_FIELDS))
+    return Scenario(matrix, decisionNames, decay)
@@ -0,0 +1,328 @@
+"""
+Sensitivity of the moral values of decisions to each Felicific Calculus parameter.
+
+Every consequence is a product of its parameters, e.g. certainty * intensity * duration * decay(propinquity) *
+multiplier, so its partial derivatives are products of the other factors. getGradients() computes the exact
+derivative of every decision's moral value (or negative moral value) with respect to every parameter of every
+createAgent() row in a single vectorized pass, along with per-decision summaries.
+
+getSobolIndices() instead asks how much of the variance of each decision's moral value comes from each parameter,
+when every parameter is scaled by an uncertain factor. It uses the Saltelli estimators of the first order and total
+Sobol indices, evaluated on a scrambled Halton sequence in vectorized batches rather than by rerunning the calculus
+one parameter at a time.
+
+Both take decisions as (name, decision) pairs, e.g. EvaluateDecisions.getDecisions(), or as a parameter matrix laid
+out like the one taken by felicific_arrays.evaluateParameterMatrix().
+"""
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_decay
+
+FIELDS = fa.FIELDS
+FIELD_INDEX = fa.FIELD_INDEX
+
+# The multiplicative parameters of the 1st order, fecundity and purity consequences; each also has a propinquity
+TERM_FIELDS = (
+    ("certainty", "intensity", "duration", "multiplier"),
+    ("fecundity", "f_intensity", "f_duration", "f_multiplier"),
+    ("purity", "p_intensity", "p_duration", "p_multiplier"),
+)
+
+
+def getPropinquityFields(rows):
+    """Returns, for every row, the propinquity field of the 1st order, fecundity and purity consequences."""
+    return tuple(np.full(rows, FIELD_INDEX[name]) for name in ("propinquity", "f_propinquity", "p_propinquity"))
+
+
+class GradientResult:
+    """
+    The gradients of the moral values of decisions.
+
+    Variables:
+    decisionNames = the names of the decisions, indexed by decision id
+    values = the (unrounded) moral value of every decision
+    rowGradients = a (rows, 16) array of the derivative of the value of each row's decision with respect to each of
+        the row's createAgent() parameters (0 for isPleasure)
+    decisionGradients = a (decisions, 16) array of the derivative of each decision's value when a parameter of every
+        row of the decision changes by the same amount
+    elasticities = a (decisions, 16) array of the change in each decision's value when a parameter of every row of the
+        decision changes by 1 (i.e. 100%) of itself, the sum of parameter * derivative
+
+    Methods:
+        getDecisionGradient() returns the gradient of a decision, by parameter name
+        getElasticities() returns the elasticities of a decision, by parameter name
+        getRankingElasticities() returns the elasticities of the margin between the best decision and the runner-up
+    """
+
+    def __init__(self, decisionNames, values, rowGradients, decisionGradients, elasticities):
+        self.decisionNames = decisionNames
+        self.values = values
+        self.rowGradients = rowGradients
+        self.decisionGradients = decisionGradients
+        self.elasticities = elasticities
+
+    def getDecisionGradient(self, decisionName):
+        return dict(zip(FIELDS, self.decisionGradients[self.decisionNames.index(decisionName)].tolist()))
+
+    def getElasticities(self, decisionName):
+        return dict(zip(FIELDS, self.elasticities[self.decisionNames.index(decisionName)].tolist()))
+
+    def getBestDecisions(self):
+        # a stable sort keeps the first of equal decisions first, like max()
+        order = np.argsort(-self.values, kind="stable")
+        return int(order[0]), int(order[1])
+
+    def getRankingElasticities(self):
+        """
+        Returns the elasticities of the margin between the best decision and the runner-up: the parameters with the
+        largest negative values are those most likely to change the best decision.
+        """
+        if len(self.values) < 2:
+            raise ValueError("Ranking needs at least two decisions.")
+        best, runnerUp = self.getBestDecisions()
+        return dict(zip(FIELDS, (self.elasticities[best] - self.elasticities[runnerUp]).tolist()))
+
+
+def getGradients(decisions, selfInterestScale=None, negative=False, decisionNames=None, decay=None):
+    """
+    Returns the exact gradients of the moral values (or with negative=True, the negative moral values) of the
+    decisions as a GradientResult. Values are not rounded, as rounding has no derivative.
+    """
+    decay = felicific_decay.getDecay(decay)
+    parameters, decisionIds, decisionNames, weights = fa.readParameterMatrix(decisions, selfInterestScale,
+                                                                             decisionNames)
+    decisionCount = len(decisionNames)
+    column = {name: parameters[:, index] for index, name in enumerate(FIELDS)}
+    isPleasure = column["isPleasure"] != 0
+    sign = np.where(isPleasure, 1.0, -1.0)
+
+    values = np.zeros(len(parameters))
+    rowGradients = np.zeros(parameters.shape)
+    for termFields, termSign, propinquityFields in zip(TERM_FIELDS, (sign, sign, -sign),
+                                                       getPropinquityFields(len(parameters))):
+        propinquity = parameters[np.arange(len(parameters)), propinquityFields]
+        factors = [column[name] for name in termFields] + [decay.getValues(propinquity)]
+        term = termSign * np.prod(factors, axis=0)
+        termWeights = weights * termSign
+        if negative:
+            # only painful consequences count towards the negative moral value
+            termWeights = np.where(term < 0, termWeights, 0)
+        values += weights * np.minimum(term, 0) if negative else weights * term
+
+        # the derivative of a product with respect to one factor is the product of the others
+        for index, name in enumerate(termFields):
+            rowGradients[:, FIELD_INDEX[name]] += termWeights * np.prod(factors[:index] + factors[index + 1:], axis=0)
+        decayGradient = termWeights * np.prod(factors[:-1], axis=0) * decay.getDerivatives(propinquity)
+        np.add.at(rowGradients, (np.arange(len(parameters)), propinquityFields), decayGradient)
+
+    def sumByDecision(rowValues):
+        return np.stack([np.bincount(decisionIds, weights=rowValues[:, index], minlength=decisionCount)
+                         for index in range(rowValues.shape[1])], axis=1)
+
+    return GradientResult(decisionNames, np.bincount(decisionIds, weights=values, minlength=decisionCount),
+                          rowGradients, sumByDecision(rowGradients), sumByDecision(rowGradients * parameters))
+
+
+class ScaledEvaluation:
+    """
+    The moral values of decisions as a function of one positive scale factor per parameter, applied to that
+    parameter in every row.
+
+    Scaling leaves the sign of every consequence unchanged and multiplies it by the scale factors of its
+    multiplicative parameters, so the consequences are summed once per decision, grouped by the kind of consequence
+    and its propinquity, and every set of scale factors is then evaluated with a small matrix product.
+    """
+
+    def __init__(self, decisions, selfInterestScale=None, decisionNames=None, decay=None):
+        parameters, decisionIds, decisionNames, weights = fa.readParameterMatrix(decisions, selfInterestScale,
+                                                                             decisionNames)
+        self.decisionNames = decisionNames
+        self.decay = felicific_decay.getDecay(decay)
+        decisionCount = len(decisionNames)
+        column = {name: parameters[:, index] for index, name in enumerate(FIELDS)}
+        isPleasure = column["isPleasure"] != 0
+        sign = np.where(isPleasure, 1.0, -1.0)
+
+        self.termFields = [[FIELD_INDEX[name] for name in termFields] for termFields in TERM_FIELDS]
+        groupTerms, groupFields, groupPropinquities, moralSums, negativeSums = [], [], [], [], []
+        for term, (termFields, termSign, propinquityFields) in enumerate(
+                zip(TERM_FIELDS, (sign, sign, -sign), getPropinquityFields(len(parameters)))):
+            base = termSign * np.prod([column[name] for name in termFields], axis=0)
+            present = base != 0
+            propinquity = parameters[np.arange(len(parameters)), propinquityFields][present]
+            keys, group = np.unique(np.stack([propinquityFields[present], propinquity], axis=1), axis=0,
+                                    return_inverse=True)
+            group = group.ravel()
+            cells = group * decisionCount + decisionIds[present]
+            weighted = (weights * base)[present]
+            moralSums.append(np.bincount(cells, weights=weighted, minlength=len(keys) * decisionCount))
+            negativeSums.append(np.bincount(cells, weights=np.minimum(weighted, 0),
+                                            minlength=len(keys) * decisionCount))
+            groupTerms.extend([term] * len(keys))
+            groupFields.extend(keys[:, 0].astype(np.int64).tolist())
+            groupPropinquities.extend(keys[:, 1].tolist())
+
+        self.groupTerms = np.array(groupTerms, dtype=np.int64)
+        self.groupFields = np.array(groupFields, dtype=np.int64)
+        self.groupPropinquities = np.array(groupPropinquities, dtype=float)
+        # (groups, decisions) sums of the consequences before the propinquity decay
+        self.moralSums = np.concatenate(moralSums).reshape(-1, decisionCount)
+        self.negativeSums = np.concatenate(negativeSums).reshape(-1, decisionCount)
+
+    def evaluate(self, scales, negative=False):
+        """Returns the (samples, decisions) values for a (samples, 16) array of scale factors."""
+        scales = np.asarray(scales, dtype=float)
+        termProducts = np.stack([scales[:, fields].prod(axis=1) for fields in self.termFields])
+        groupFactors = termProducts[self.groupTerms] * self.decay.getValues(
+            self.groupPropinquities[:, None] * scales[:, self.groupFields].T)
+        return groupFactors.T @ (self.negativeSums if negative else self.moralSums)
+
+
+def getPrimes(count):
+    primes = []
+    candidate = 2
+    while len(primes) < count:
+        if all(candidate % prime for prime in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def getHaltonSequence(count, dimensions, seed=0, start=0):
+    """
+    Returns count points, from the given start, of a scrambled Halton sequence in [0, 1)^dimensions. Each dimension
+    permutes the digits of its base at random (keeping 0 in place), which breaks up the correlations between the
+    higher dimensions. The permutations only depend on the seed, so the sequence can be generated in batches.
+    """
+    rng = np.random.default_rng(seed)
+    points = np.zeros((count, dimensions))
+    for dimension, base in enumerate(getPrimes(dimensions)):
+        permutation = np.concatenate([[0], rng.permutation(np.arange(1, base))])
+        # skip the first point, which is 0 in every dimension
+        indexes = np.arange(start + 1, start + count + 1)
+        scale = 1.0
+        while indexes.any():
+            scale /= base
+            points[:, dimension] += permutation[indexes % base] * scale
+            indexes //= base
+    return points
+
+
+class SobolResult:
+    """
+    The Sobol indices of the moral values of decisions.
+
+    Variables:
+    factorNames = the parameters that were varied
+    decisionNames = the names of the decisions, indexed by decision id
+    firstOrder = a (decisions, factors) array of the share of the variance of each decision's value caused by each
+        factor alone
+    total = a (decisions, factors) array of the share of the variance caused by each factor, including its
+        interactions with the others
+    rankingDecisions = the names of the best decision and the runner-up without scaling, or None
+    rankingFirstOrder, rankingTotal = the indices of the margin between those two decisions, or None
+
+    Methods:
+        getIndices() returns the (first order, total) indices of a decision, by factor name
+        getRankingDrivers() returns the factors by their total index on the margin between the two best decisions
+    """
+
+    def __init__(self, factorNames, decisionNames, firstOrder, total, rankingDecisions=None, rankingFirstOrder=None,
+                 rankingTotal=None):
+        self.factorNames = factorNames
+        self.decisionNames = decisionNames
+        self.firstOrder = firstOrder
+        self.total = total
+        self.rankingDecisions = rankingDecisions
+        self.rankingFirstOrder = rankingFirstOrder
+        self.rankingTotal = rankingTotal
+
+    def getIndices(self, decisionName):
+        index = self.decisionNames.index(decisionName)
+        return {name: (float(self.firstOrder[index, factor]), float(self.total[index, factor]))
+                for factor, name in enumerate(self.factorNames)}
+
+    def getRankingDrivers(self):
+        if self.rankingTotal is None:
+            raise ValueError("Ranking needs at least two decisions.")
+        order = np.argsort(-self.rankingTotal, kind="stable")
+        return [(self.factorNames[factor], float(self.rankingTotal[factor])) for factor in order]
+
+
+def getSobolIndices(decisions, factors=None, samples=1024, selfInterestScale=None, negative=False, seed=0,
+                    batchSize=4096, decisionNames=None, decay=None):
+    """
+    Returns the SobolResult of scaling every parameter named in factors, a dict of name: (low, high), by a factor
+    drawn uniformly between low and high (by default every parameter but isPleasure, by .9 to 1.1).
+
+    The Saltelli scheme evaluates samples * (factors + 2) sets of scale factors, batchSize samples at a time.
+    """
+    if factors is None:
+        factors = {name: (.9, 1.1) for name in FIELDS[1:]}
+    for name, (low, high) in factors.items():
+        if name not in FIELD_INDEX or name == "isPleasure":
+            raise ValueError("Unknown or non-numeric parameter: " + str(name) + ".")
+        if low <= 0 or high < low:
+            raise ValueError("Scale factors must be positive, with low at most high.")
+    if samples < 2:
+        raise ValueError("Sobol indices need at least 2 samples.")
+
+    evaluation = ScaledEvaluation(decisions, selfInterestScale, decisionNames, decay)
+    decisionNames = evaluation.decisionNames
+    factorNames = list(factors)
+    factorFields = [FIELD_INDEX[name] for name in factorNames]
+    lows = np.array([factors[name][0] for name in factorNames])
+    highs = np.array([factors[name][1] for name in factorNames])
+    factorCount = len(factorNames)
+
+    nominal = evaluation.evaluate(np.ones((1, len(FIELDS))), negative)[0]
+    ranking = None
+    if len(decisionNames) > 1:
+        order = np.argsort(-nominal, kind="stable")
+        ranking = (int(order[0]), int(order[1]))
+
+    def evaluateFactors(values):
+        scales = np.ones((len(values), len(FIELDS)))
+        scales[:, factorFields] = lows + (highs - lows) * values
+        outputs = evaluation.evaluate(scales, negative)
+        if ranking is not None:
+            outputs = np.column_stack([outputs, outputs[:, ranking[0]] - outputs[:, ranking[1]]])
+        return outputs
+
+    # A and B are two independent sets of samples; ABi is A with factor i taken from B
+    outputCount = len(decisionNames) + (ranking is not None)
+    sums = np.zeros(outputCount)
+    squareSums = np.zeros(outputCount)
+    firstOrderSums = np.zeros((factorCount, outputCount))
+    totalSums = np.zeros((factorCount, outputCount))
+    for start in range(0, samples, batchSize):
+        points = getHaltonSequence(min(batchSize, samples - start), 2 * factorCount, seed, start)
+        a, b = points[:, :factorCount], points[:, factorCount:]
+        valuesA, valuesB = evaluateFactors(a), evaluateFactors(b)
+        for values in (valuesA, valuesB):
+            sums += values.sum(axis=0)
+            squareSums += (values ** 2).sum(axis=0)
+        for factor in range(factorCount):
+            ab = a.copy()
+            ab[:, factor] = b[:, factor]
+            valuesAB = evaluateFactors(ab)
+            firstOrderSums[factor] += (valuesB * (valuesAB - valuesA)).sum(axis=0)
+            totalSums[factor] += ((valuesA - valuesAB) ** 2).sum(axis=0)
+
+    # the variance is estimated from both A and B
+    count = 2 * samples
+    variance = squareSums / count - (sums / count) ** 2
+    # outputs that do not vary at all have no variance to attribute, so their indices are 0
+    varies = variance > 1e-12 * np.maximum(1, (sums / count) ** 2)
+    firstOrder = np.divide(firstOrderSums / samples, variance, out=np.zeros_like(firstOrderSums), where=varies)
+    total = np.divide(totalSums / (2 * samples), variance, out=np.zeros_like(totalSums), where=varies)
+
+    decisionCount = len(decisionNames)
+    result = SobolResult(factorNames, decisionNames, firstOrder[:, :decisionCount].T, total[:, :decisionCount].T)
+    if ranking is not None:
+        result.rankingDecisions = (decisionNames[ranking[0]], decisionNames[ranking[1]])
+        result.rankingFirstOrder = firstOrder[:, decisionCount]
+        result.rankingTotal = total[:, decisionCount]
+    return result
@@ -0,0 +1,445 @@
+"""
+An asyncio evaluation service, which scores the decisions of other systems over a Unix socket or TCP.
+
+Every request and response is one line of JSON:
+
+    {"id": 1, "decisions": {"name": [row, ...], ...}, "selfInterestScale": .5}
+    {"id": 1, "moralValues": {"name": value, ...}, "negativeMoralValues": {...}, "decisionWithHighestValue": "name",
+     "decisionWithLeastNegativeValue": "name"}
+
+where each row holds createAgent() arguments, with 17 values the last one being isDecisionMaker, as in
+StreamingEvaluation, and selfInterestScale is optional. A request that cannot be evaluated (e.g. one holding a value
+that is not finite or a negative propinquity), or whose values overflow, gets {"id": 1, "error": ...}; requests
+are checked one by one, so a bad request doesn't fail the others of its batch. {"stats": true} gets the counts and
+latency percentiles of the service, answered ahead of the queue.
+
+Rather than evaluating every request on its own, concurrent requests are gathered into micro-batches: a batch starts
+with the first waiting request and takes every request that arrives within the batch window, up to maxBatchSize. The
+rows of the whole batch are then stacked into one parameter matrix and evaluated in one vectorized call on a worker
+thread (or process), which also builds the responses, so the event loop only reads and writes lines. While every
+worker is busy, requests keep queueing, so batches grow with the load.
+
+The queue of waiting requests is bounded by maxPending. When it is full, connections stop being read until a batch
+is taken, which pushes back on the clients through the socket instead of letting memory grow.
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import functools
+import json
+import time
+
+import numpy as np
+
+import felicific_arrays as fa
+import felicific_decay
+
+
+def readRequest(request):
+    # the names, the (rows, 17) parameter matrix with the decision maker flag as the last column, and the number of
+    # rows of every decision of a request
+    decisions = request.get("decisions")
+    if not isinstance(decisions, dict) or not decisions:
+        raise ValueError("A request needs at least one decision.")
+    rows = []
+    counts = []
+    for agentRows in decisions.values():
+        counts.append(len(agentRows))
+        for row in agentRows:
+            if not 8 <= len(row) <= len(fa.FIELDS) + 1:
+                raise ValueError("Every row needs 8 to " + str(len(fa.FIELDS) + 1) + " values.")
+            if len(row) == len(fa.FIELDS) + 1:
+                parameters, isDecisionMaker = row[:-1], row[-1]
+            else:
+                parameters, isDecisionMaker = row, False
+            rows.append(list(parameters) + [0] * (len(fa.FIELDS) - len(parameters)) + [bool(isDecisionMaker)])
+    matrix = np.array(rows, dtype=float).reshape(len(rows), len(fa.FIELDS) + 1)
+
+    # checked here rather than left to the evaluation, where one bad request would fail every request of its batch
+    if not np.isfinite(matrix).all():
+        raise ValueError("Every value of a request must be finite.")
+    column = {name: matrix[:, index] for index, name in enumerate(fa.FIELDS)}
+    # like Decision, only the propinquities of the consequences that happen are decayed
+    if ((column["propinquity"] < 0) | ((column["fecundity"] != 0) & (column["f_propinquity"] < 0))
+            | ((column["purity"] != 0) & (column["p_propinquity"] < 0))).any():
+        raise ValueError("Propinquity must not be negative.")
+    return list(decisions), matrix, counts
+
+
+def evaluateRequests(requests, decay=None):
+    """
+    Evaluates the decisions of every request in one vectorized call and returns the encoded response line of every
+    request.
+    """
+    responses = [None] * len(requests)
+    matrices = []
+    decisionIds = []
+    weights = []
+    # (position, names, first decision id) of every request that can be evaluated
+    evaluated = []
+    decisionCount = 0
+    for position, request in enumerate(requests):
+        try:
+            names, matrix, counts = readRequest(request)
+            selfInterestScale = request.get("selfInterestScale")
+            # not (0 <= scale <= 1) also refuses a scale of NaN
+            if selfInterestScale is not None and not 0 <= selfInterestScale <= 1:
+                raise ValueError("Self interest scale must be between 0 and 1.")
+        except (TypeError, ValueError) as error:
+            responses[position] = encodeResponse({"id": request.get("id"), "error": str(error)})
+            continue
+        owners = np.repeat(np.arange(decisionCount, decisionCount + len(names)), counts)
+        if selfInterestScale is None:
+            weights.append(np.ones(len(matrix)))
+        else:
+            weights.append(np.where(matrix[:, -1] != 0, selfInterestScale, 1 - selfInterestScale))
+        matrices.append(matrix)
+        decisionIds.append(owners)
+        evaluated.append((position, names, decisionCount))
+        decisionCount += len(names)
+
+    if evaluated:
+        matrix = np.concatenate(matrices)
+        # values that overflow are answered with an error by encodeResponse()
+        with np.errstate(over="ignore", invalid="ignore"):
+            columns = fa.expandConsequences(matrix[:, :len(fa.FIELDS)], decay=decay)
+            values = columns.getValues() * np.concatenate(weights)[columns.agent]
+            owners = np.concatenate(decisionIds)[columns.agent]
+            moralValues = np.round(np.bincount(owners, weights=values, minlength=decisionCount), 2).tolist()
+            negativeMoralValues = np.round(np.bincount(owners, weights=np.minimum(values, 0),
+                                                       minlength=decisionCount), 2).tolist()
+
+        for position, names, first in evaluated:
+            values = moralValues[first:first + len(names)]
+            negativeValues = negativeMoralValues[first:first + len(names)]
+            # the first of equal decisions wins, like max() in EvaluateDecisions
+            responses[position] = encodeResponse({
+                "id": requests[position].get("id"),
+                "moralValues": dict(zip(names, values)),
+                "negativeMoralValues": dict(zip(names, negativeValues)),
+                "decisionWithHighestValue": names[values.index(max(values))],
+                "decisionWithLeastNegativeValue": names[negativeValues.index(max(negativeValues))],
+            })
+    return responses
+
+
+def encodeResponse(response):
+    # NaN and infinity are not JSON, so values that overflowed are reported instead of sent
+    try:
+        line = json.dumps(response, separators=(",", ":"), allow_nan=False)
+    except ValueError:
+        line = json.dumps({"id": response.get("id"), "error": "The values of the request are not finite."},
+                          separators=(",", ":"))
+    return line.encode() + b"\n"
+
+
+def refuseConstant(constant):
+    raise ValueError("Requests must not hold " + constant + ".")
+
+
+class LatencyStats:
+    """
+    Counts the requests and batches of the service and keeps the latencies of the most recent requests.
+
+    Variables:
+    latencies = the seconds from submission to response of the last size requests
+    requestCount, batchCount = how many requests and batches have been evaluated
+
+    Methods:
+        addBatch() records the latencies of the requests of a batch
+        getPercentile() returns a percentile of the recent latencies
+        getStats() returns the counts and latency percentiles as a dict
+    """
+
+    def __init__(self, size=10000):
+        self.latencies = collections.deque(maxlen=size)
+        self.requestCount = 0
+        self.batchCount = 0
+
+    def addBatch(self, latencies):
+        self.latencies.extend(latencies)
+        self.requestCount += len(latencies)
+        self.batchCount += 1
+
+    def getPercentile(self, percentile, latencies=None):
+        # nearest rank, so the percentile is always one of the recorded latencies
+        if latencies is None:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        rank = max(int(np.ceil(percentile / 100 * len(latencies))), 1)
+        return latencies[min(rank, len(latencies)) - 1]
+
+    def getStats(self, percentiles=(50, 90, 99, 99.9)):
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requestCount,
+            "batches": self.batchCount,
+            "meanBatchSize": self.requestCount / self.batchCount if self.batchCount else 0,
+            "latency": {"p" + format(percentile, "g"): self.getPercentile(percentile, latencies)
+                        for percentile in percentiles},
+        }
+
+
+class MicroBatcher:
+    """
+    Gathers submitted requests into batches and evaluates each batch with one call on an executor.
+
+    Variables:
+    evaluate = the function evaluating a list of requests into a list of results, run on the executor
+    window = how many seconds a batch waits for more requests after its first one
+    maxBatchSize = the most requests of a batch
+    queue = the requests waiting for a batch, at most maxPending
+    pendingCount = how many submitted requests have not been answered yet, queued or being evaluated
+    stats = the LatencyStats of the evaluated requests
+
+    Methods:
+        start() starts gathering batches, with at most workers batches evaluated at once
+        submit() queues a request, waiting while the queue is full, and returns the future of its result
+        close() stops gathering batches once the queued requests have been evaluated
+    """
+
+    def __init__(self, evaluate, executor, window=.002, maxBatchSize=256, maxPending=1024, workers=1):
+        if window < 0 or maxBatchSize < 1 or maxPending < 1 or workers < 1:
+            raise ValueError("Batch window must not be negative, batch size, pending requests and workers positive.")
+        self.evaluate = evaluate
+        self.executor = executor
+        self.window = window
+        self.maxBatchSize = maxBatchSize
+        self.workers = workers
+        self.queue = asyncio.Queue(maxPending)
+        self.pendingCount = 0
+        self.stats = LatencyStats()
+        self.task = None
+        self.batches = set()
+
+    def start(self):
+        self.task = asyncio.get_running_loop().create_task(self.gatherBatches())
+
+    async def submit(self, request):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future, time.perf_counter()))
+        self.pendingCount += 1
+        return future
+
+    async def gatherBatches(self):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.workers)
+        while True:
+            # wait for a free worker first, so that requests keep queueing while every worker is busy
+            await slots.acquire()
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.maxBatchSize:
+                if self.queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self.queue.get_nowait())
+            task = loop.create_task(self.evaluateBatch(batch, slots))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def evaluateBatch(self, batch, slots):
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.evaluate, [request for request, future, submitted in batch])
+        except Exception as error:
+            results = [error] * len(batch)
+        finally:
+            slots.release()
+        now = time.perf_counter()
+        self.pendingCount -= len(batch)
+        for (request, future, submitted), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+        self.stats.addBatch([now - submitted for request, future, submitted in batch])
+
+    async def close(self):
+        while not self.queue.empty():
+            await asyncio.sleep(self.window or .001)
+        if self.batches:
+            await asyncio.wait(list(self.batches))
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+
+class EvaluationServer:
+    """
+    Serves evaluations of decisions over a Unix socket (with a path) or TCP, batching the concurrent requests.
+
+    Variables:
+    path = the Unix socket path, or None for TCP on host and port (0 for any free port)
+    processes = whether batches are evaluated in worker processes rather than threads
+    maxRequestSize = the longest request line, in bytes
+    batcher = the MicroBatcher of the requests
+
+    Methods:
+        start() starts listening
+        getAddress() returns the socket path, or the (host, port) listened on
+        serveForever() serves until cancelled
+        getStats() returns the counts, latency percentiles and pending requests of the service (not counting the
+            request asking for them, which is answered ahead of the queue)
+        close() stops listening and waits for the requests already queued
+    """
+
+    def __init__(self, path=None, host="127.0.0.1", port=0, window=.002, maxBatchSize=256, maxPending=1024, workers=1,
+                 processes=False, maxRequestSize=2 ** 24, decay=None):
+        self.path = path
+        self.host = host
+        self.port = port
+        self.window = window
+        self.maxBatchSize = maxBatchSize
+        self.maxPending = maxPending
+        self.workers = workers
+        self.processes = processes
+        self.maxRequestSize = maxRequestSize
+        self.decay = decay
+        self.executor = None
+        self.batcher = None
+        self.server = None
+        self.connections = set()
+
+    async def start(self):
+        if self.processes:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        else:
+            self.executor = concurrent.futures.ThreadPoolExecutor(self.workers)
+        self.batcher = MicroBatcher(functools.partial(evaluateRequests, decay=self.decay), self.executor, self.window,
+                                    self.maxBatchSize, self.maxPending, self.workers)
+        self.batcher.start()
+        if self.path is not None:
+            self.server = await asyncio.start_unix_server(self.handleConnection, self.path, limit=self.maxRequestSize)
+        else:
+            self.server = await asyncio.start_server(self.handleConnection, self.host, self.port,
+                                                     limit=self.maxRequestSize)
+        return self
+
+    def getAddress(self):
+        if self.path is not None:
+            return self.path
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def serveForever(self):
+        await self.server.serve_forever()
+
+    def getStats(self):
+        stats = self.batcher.stats.getStats()
+        stats["pending"] = self.batcher.pendingCount
+        return stats
+
+    async def handleConnection(self, reader, writer):
+        responses = set()
+        connection = asyncio.current_task()
+        self.connections.add(connection)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except asyncio.CancelledError:
+                    # the server is closing: answer the requests already read
+                    break
+                except ValueError:
+                    writer.write(encodeResponse({"id": None, "error": "Request is longer than "
+                                                 + str(self.maxRequestSize) + " bytes."}))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line, parse_constant=refuseConstant)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request must be a JSON object.")
+                except ValueError as error:
+                    writer.write(encodeResponse({"id": None, "error": str(error)}))
+                    continue
+                if request.get("stats"):
+                    writer.write(encodeResponse(dict(self.getStats(), id=request.get("id"))))
+                    continue
+                # waits while the queue is full, so this connection is not read any further until then
+                future = await self.batcher.submit(request)
+                task = asyncio.ensure_future(self.respond(writer, request, future))
+                responses.add(task)
+                task.add_done_callback(responses.discard)
+            if responses:
+                await asyncio.wait(list(responses))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            self.connections.discard(connection)
+
+    @staticmethod
+    async def respond(writer, request, future):
+        try:
+            response = await future
+        except Exception as error:
+            response = encodeResponse({"id": request.get("id"), "error": str(error)})
+        if not writer.is_closing():
+            writer.write(response)
+            await writer.drain()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+        if self.batcher is not None:
+            await self.batcher.close()
+        # connections left open by their clients are waiting for another request
+        for connection in list(self.connections):
+            connection.cancel()
+        if self.connections:
+            await asyncio.wait(list(self.connections))
+        if self.server is not None:
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+async def serve(arguments):
+    decay = felicific_decay.getDecay(arguments.decay, *arguments.decay_arguments) if arguments.decay else None
+    server = await EvaluationServer(arguments.unix, arguments.host, arguments.port, arguments.window / 1000,
+                                    arguments.batch_size, arguments.max_pending, arguments.workers,
+                                    arguments.processes, decay=decay).start()
+    print("Serving on", server.getAddress(), flush=True)
+    try:
+        await server.serveForever()
+    finally:
+        await server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves evaluations of decisions as lines of JSON.")
+    parser.add_argument("--unix", help="the path of a Unix socket to listen on instead of TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--window", type=float, default=2, help="the batch window in milliseconds")
+    parser.add_argument("--batch-size", type=int, default=256, help="the most requests of a batch")
+    parser.add_argument("--max-pending", type=int, default=1024, help="the most requests waiting for a batch")
+    parser.add_argument("--workers", type=int, default=1, help="how many batches are evaluated at once")
+    parser.add_argument("--processes", action="store_true", help="evaluate batches in processes, not threads")
+    parser.add_argument("--decay", choices=sorted(felicific_decay.DECAYS),
+                        help="the decay of the propinquities (1/propinquity^0.1 by default)")
+    parser.add_argument("--decay-arguments", type=json.loads, default=[],
+                        help="the arguments of the decay as a JSON list, e.g. [0.2]")
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
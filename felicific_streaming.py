@@ -0,0 +1,96 @@
+"""
+Streaming selection of the best decisions.
+
+EvaluateDecisions keeps every decision it is given. StreamingEvaluation instead looks at each decision once as it
+arrives from any iterable (e.g. a generator) and keeps only bounded heaps of the k best decisions by moral value and
+by negative moral value, so memory stays constant however many decisions pass through it.
+"""
+
+import heapq
+
+import felicific_calculus as fc
+
+
+class StreamingEvaluation:
+    """
+    Keeps the top k decisions of a stream of decisions.
+
+    Variables:
+    k = how many decisions to keep
+    selfInterestScale = the scale of self-interest (0 = altruistic, 1 = egoistic) applied to every decision
+    decisionCount = how many decisions have been evaluated
+
+    Methods:
+        addDecision() evaluates a decision, given as a Decision or as rows of createAgent() arguments
+        addDecisions() evaluates every (name, decision) of an iterable
+        getTopDecisions() returns the (name, moral value) of the k decisions with the highest moral value
+        getTopNegativeDecisions() returns the (name, negative moral value) of the k decisions with the negative moral
+            value closest to 0
+        getDecisionWithHighestValue() returns the name of the decision with the highest moral value
+        getDecisionWithLeastNegativeValue() returns the name of the decision with the negative moral value closest to 0
+    """
+
+    def __init__(self, k=1, selfInterestScale=None):
+        if k < 1:
+            raise ValueError("k must be at least 1.")
+        if selfInterestScale is not None and (selfInterestScale > 1 or selfInterestScale < 0):
+            raise ValueError("Self interest scale must be between 0 and 1.")
+        self.k = k
+        self.selfInterestScale = selfInterestScale
+        self.decisionCount = 0
+        # Min-heaps of (value, -arrival, name): the worst kept decision is on top, and among equal values the
+        # decision that arrived first ranks higher, like max() in EvaluateDecisions
+        self.topDecisions = []
+        self.topNegativeDecisions = []
+
+    @staticmethod
+    def createDecision(rows):
+        # each row holds createAgent() arguments, with 17 values the last one is isDecisionMaker
+        decision = fc.Decision()
+        for row in rows:
+            if len(row) == 17:
+                decision.createAgent(*row[:-1], isDecisionMaker=bool(row[-1]))
+            else:
+                decision.createAgent(*row)
+        return decision
+
+    def keep(self, heap, entry):
+        if len(heap) < self.k:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    def addDecision(self, decisionName, decision):
+        if not hasattr(decision, "getMoralValue"):
+            decision = self.createDecision(decision)
+        if self.selfInterestScale is not None:
+            decision.setSelfInterestScale(self.selfInterestScale)
+
+        self.decisionCount += 1
+        self.keep(self.topDecisions, (decision.getMoralValue(), -self.decisionCount, decisionName))
+        self.keep(self.topNegativeDecisions, (decision.getNegativeMoralValue(), -self.decisionCount, decisionName))
+
+    def addDecisions(self, decisions):
+        for decisionName, decision in decisions:
+            self.addDecision(decisionName, decision)
+        return self
+
+    @staticmethod
+    def getRanking(heap):
+        return [(decisionName, value) for value, arrival, decisionName in sorted(heap, reverse=True)]
+
+    def getTopDecisions(self):
+        return self.getRanking(self.topDecisions)
+
+    def getTopNegativeDecisions(self):
+        return self.getRanking(self.topNegativeDecisions)
+
+    def getDecisionWithHighestValue(self):
+        if not self.topDecisions:
+            raise ValueError("There are no decisions to evaluate.")
+        return max(self.topDecisions)[2]
+
+    def getDecisionWithLeastNegativeValue(self):
+        if not self.topNegativeDecisions:
+            raise ValueError("There are no decisions to evaluate.")
+        return max(self.topNegativeDecisions)[2]
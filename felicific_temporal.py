@@ -0,0 +1,119 @@
+"""
+Evaluation of decisions over time.
+
+The calculus collapses each consequence into one value. Here every consequence is also placed in time: it starts at
+its propinquity (nearness in time) and lasts for its duration, over which its value accrues at a constant rate. The
+value itself is unchanged, so once every consequence has ended, the accrued value of a decision is its moral value;
+cutting off at an earlier horizon leaves out what comes later. 2nd order consequences start at their own propinquity
+and last for their own duration. A consequence without a positive duration accrues all at once when it starts.
+
+Time is divided into buckets of bucketSize. Rather than filling in a time x consequence matrix, every consequence only
+adds two events: its rate starts at its beginning and stops at its end. The value accrued by time t is then the
+running sum of the rates (the slope) times t plus the running sum of the offsets, so the buckets are streamed in
+blocks with the running sums carried from one block to the next. Memory depends on the number of consequences and the
+block size, not on the horizon.
+"""
+
+import numpy as np
+
+import felicific_arrays as fa
+
+
+class TemporalEvaluation:
+    """
+    The values of decisions accruing over time.
+
+    Variables:
+    decisionNames = the names of the decisions, indexed by decision id
+    bucketSize = the length of time of every bucket
+    starts, ends = when every consequence starts and ends
+    values = the (weighted) value of every consequence
+    owners = the decision id of every consequence
+
+    Methods:
+        getValuesAt() returns the value every decision has accrued by a time
+        iterateBuckets() streams the value accrued by every decision in every bucket up to a horizon, in blocks
+        getBucketValues() returns the value accrued by every decision in every bucket up to a horizon
+    """
+
+    def __init__(self, decisions, selfInterestScale=None, bucketSize=1, negative=False, decisionNames=None,
+                 decay=None):
+        if bucketSize <= 0:
+            raise ValueError("Bucket size must be positive.")
+        parameters, decisionIds, decisionNames, weights = fa.readParameterMatrix(decisions, selfInterestScale,
+                                                                                 decisionNames)
+        self.decisionNames = decisionNames
+        self.bucketSize = bucketSize
+
+        columns = fa.expandConsequences(parameters, decay=decay)
+        values = columns.getValues()
+        if negative:
+            values = np.minimum(values, 0)
+        self.values = values * weights[columns.agent]
+        self.owners = decisionIds[columns.agent]
+        self.starts = columns.propinquity
+        self.ends = columns.propinquity + np.maximum(columns.duration, 0)
+
+        # A consequence accrues rate * (t - start) from its start and loses rate * (t - end) from its end, so it adds
+        # (slope, offset) events at the first bucket ends on or after its start and its end. Consequences without a
+        # duration add their value as an offset at their start.
+        lasting = self.ends > self.starts
+        rates = np.divide(self.values, self.ends - self.starts, out=np.zeros(len(self.values)), where=lasting)
+        events = [(self.starts, rates, np.where(lasting, -rates * self.starts, self.values)),
+                  (self.ends[lasting], -rates[lasting], rates[lasting] * self.ends[lasting])]
+        times = np.concatenate([time for time, slope, offset in events])
+        # bucket k ends at time k * bucketSize; whatever accrues before the first bucket ends falls in it
+        bucketEnds = np.maximum(np.ceil(times / bucketSize), 1).astype(np.int64)
+        order = np.argsort(bucketEnds, kind="stable")
+        self.eventBucketEnds = bucketEnds[order]
+        self.eventOwners = np.concatenate([self.owners, self.owners[lasting]])[order]
+        self.eventSlopes = np.concatenate([slope for time, slope, offset in events])[order]
+        self.eventOffsets = np.concatenate([offset for time, slope, offset in events])[order]
+
+    def getValuesAt(self, time):
+        """Returns the value every decision has accrued by the given time, i.e. with a horizon at that time."""
+        lasting = self.ends > self.starts
+        durations = np.where(lasting, self.ends - self.starts, 1)
+        shares = np.where(lasting, np.clip((time - self.starts) / durations, 0, 1), self.starts <= time)
+        return np.bincount(self.owners, weights=self.values * shares, minlength=len(self.decisionNames))
+
+    def iterateBuckets(self, horizon, blockSize=65536, cumulative=False):
+        """
+        Yields (first bucket, (buckets, decisions) values) for blocks of blockSize buckets, up to the horizon rounded
+        up to a whole bucket. Bucket k holds the value accrued from k * bucketSize to (k + 1) * bucketSize, or with
+        cumulative=True, the value accrued by the end of bucket k.
+        """
+        if horizon <= 0 or blockSize < 1:
+            raise ValueError("Horizon and block size must be positive.")
+        decisionCount = len(self.decisionNames)
+        bucketCount = int(np.ceil(horizon / self.bucketSize))
+
+        slopes = np.zeros(decisionCount)
+        offsets = np.zeros(decisionCount)
+        previous = np.zeros(decisionCount)
+        for firstBucket in range(0, bucketCount, blockSize):
+            buckets = min(blockSize, bucketCount - firstBucket)
+            # the events of this block, at bucket ends firstBucket + 1 to firstBucket + buckets
+            low = np.searchsorted(self.eventBucketEnds, firstBucket + 1, side="left")
+            high = np.searchsorted(self.eventBucketEnds, firstBucket + buckets, side="right")
+            cells = (self.eventBucketEnds[low:high] - firstBucket - 1) * decisionCount + self.eventOwners[low:high]
+
+            blockSlopes = slopes + np.cumsum(np.bincount(cells, weights=self.eventSlopes[low:high],
+                                                         minlength=buckets * decisionCount)
+                                             .reshape(buckets, decisionCount), axis=0)
+            blockOffsets = offsets + np.cumsum(np.bincount(cells, weights=self.eventOffsets[low:high],
+                                                           minlength=buckets * decisionCount)
+                                               .reshape(buckets, decisionCount), axis=0)
+            bucketEnds = np.arange(firstBucket + 1, firstBucket + buckets + 1) * float(self.bucketSize)
+            accrued = blockSlopes * bucketEnds[:, None] + blockOffsets
+
+            slopes, offsets = blockSlopes[-1], blockOffsets[-1]
+            if cumulative:
+                yield firstBucket, accrued
+            else:
+                yield firstBucket, np.diff(accrued, axis=0, prepend=previous[None, :])
+            previous = accrued[-1]
+
+    def getBucketValues(self, horizon, cumulative=False):
+        """Returns the (buckets, decisions) values of iterateBuckets() as one array."""
+        return np.concatenate([values for firstBucket, values in self.iterateBuckets(horizon, cumulative=cumulative)])
@@ -1,24 +1,179 @@
 #! /usr/bin/python
 
-def nextOrderConsequences(consequences):
+import logging
+import numbers
+import sys
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+class ConsequenceGraph:
+    """
+    A graph of consequences, where each consequence may lead to further consequences.
+
+    Each consequence has a value (positive for pleasure, negative for pain). A fecundity edge leads to a further
+    consequence of the same type and a purity edge to one of the opposite type, each with the probability that the
+    further consequence happens; edges between consequences of the wrong types are refused. The total value of a
+    consequence is its own value plus the probability-weighted total value of every further consequence, to any depth.
+    Consequences may be any hashable key but a number, as utilityCalculus() takes numbers as values rather than as
+    consequences of the graph.
+
+    A threshold cuts every edge whose further consequence, weighted by the probability, is smaller than it, so the
+    consequences behind it are never visited. Totals are evaluated once for every (maxDepth, threshold) and reused
+    until the graph changes: without a depth limit the graph must be acyclic and every consequence is evaluated once,
+    after its further consequences; with a depth limit every consequence is evaluated one order at a time, which also
+    bounds cycles.
+
+    Methods:
+        addConsequence() adds a consequence with its value
+        addFecundity() links a consequence to a further consequence of the same type
+        addPurity() links a consequence to a further consequence of the opposite type
+        getTotalValue() returns the value of a consequence including all further consequences
+        getFurtherValue() returns only the value of the further consequences of a consequence
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.edges = {}
+        # Evaluated totals per (maxDepth, threshold), cleared whenever the graph changes
+        self.totals = {}
+
+    def hasConsequence(self, consequence):
+        try:
+            return consequence in self.values
+        except TypeError:
+            return False
+
+    def getValue(self, consequence):
+        return self.values[consequence]
+
+    def addConsequence(self, consequence, value):
+        if isinstance(consequence, numbers.Number):
+            raise ValueError("Consequence " + str(consequence) + " must not be a number, which would be taken as a "
+                             "value.")
+        oldValue = self.values.get(consequence)
+        self.values[consequence] = value
+        # a changed value must still suit the edges from and to the consequence
+        if oldValue is not None and (oldValue > 0, oldValue < 0) != (value > 0, value < 0):
+            try:
+                for node, edges in self.edges.items():
+                    for furtherConsequence, probability, isFecundity in edges:
+                        if consequence in (node, furtherConsequence):
+                            self.checkTypes(node, furtherConsequence, isFecundity)
+            except ValueError:
+                self.values[consequence] = oldValue
+                raise
+        self.edges.setdefault(consequence, [])
+        self.totals = {}
+
+    def checkTypes(self, consequence, furtherConsequence, isFecundity):
+        # a value of 0 is neither pleasure nor pain, so it may be linked either way
+        product = self.values[consequence] * self.values[furtherConsequence]
+        if isFecundity and product < 0:
+            raise ValueError("Fecundity links " + str(consequence) + " to " + str(furtherConsequence)
+                             + ", which must be of the same type.")
+        if not isFecundity and product > 0:
+            raise ValueError("Purity links " + str(consequence) + " to " + str(furtherConsequence)
+                             + ", which must be of the opposite type.")
+
+    def addFurtherConsequence(self, consequence, furtherConsequence, probability, isFecundity):
+        for node in (consequence, furtherConsequence):
+            if node not in self.values:
+                raise KeyError("Unknown consequence: " + str(node))
+        if probability < 0 or probability > 1:
+            raise ValueError("Probability must be between 0 and 1.")
+        self.checkTypes(consequence, furtherConsequence, isFecundity)
+        self.edges[consequence].append((furtherConsequence, probability, isFecundity))
+        self.totals = {}
+
+    def addFecundity(self, consequence, furtherConsequence, probability):
+        self.addFurtherConsequence(consequence, furtherConsequence, probability, True)
+
+    def addPurity(self, consequence, furtherConsequence, probability):
+        self.addFurtherConsequence(consequence, furtherConsequence, probability, False)
+
+    # returns (further consequence, probability) of the edges of a consequence that the threshold doesn't cut
+    def getEdges(self, consequence, threshold):
+        return [(furtherConsequence, probability) for furtherConsequence, probability, isFecundity
+                in self.edges[consequence] if abs(probability * self.values[furtherConsequence]) >= threshold]
+
+    def getTotalValue(self, consequence, maxDepth=None, threshold=0):
+        if consequence not in self.values:
+            raise KeyError("Unknown consequence: " + str(consequence))
+        key = (maxDepth, threshold)
+        if key not in self.totals:
+            self.totals[key] = {} if maxDepth is None else self.getDepthTotals(maxDepth, threshold)
+        totals = self.totals[key]
+        if consequence not in totals:
+            self.addTotals(consequence, totals, threshold)
+        return totals[consequence]
+
+    def addTotals(self, consequence, totals, threshold):
+        # depth-first, so every consequence is evaluated after its further consequences, skipping those evaluated by
+        # earlier queries
+        edges = self.getEdges(consequence, threshold)
+        stack = [(consequence, edges, iter(edges))]
+        path = {consequence}
+        while stack:
+            node, edges, remainingEdges = stack[-1]
+            for furtherConsequence, probability in remainingEdges:
+                if furtherConsequence not in totals:
+                    if furtherConsequence in path:
+                        cycle = [entry[0] for entry in stack]
+                        cycle = [str(cycleNode) for cycleNode in cycle[cycle.index(furtherConsequence):]]
+                        raise ValueError("Consequence graph has a cycle through: " + ", ".join(cycle)
+                                         + ". Use a depth limit to evaluate it.")
+                    furtherEdges = self.getEdges(furtherConsequence, threshold)
+                    stack.append((furtherConsequence, furtherEdges, iter(furtherEdges)))
+                    path.add(furtherConsequence)
+                    break
+            else:
+                stack.pop()
+                path.discard(node)
+                totals[node] = self.values[node] + sum(probability * totals[furtherConsequence]
+                                                       for furtherConsequence, probability in edges)
+
+    def getDepthTotals(self, maxDepth, threshold):
+        # every round, each consequence looks one order further ahead, so after maxDepth rounds every total is complete
+        edges = {node: self.getEdges(node, threshold) for node in self.values}
+        totals = dict(self.values)
+        for depth in range(maxDepth):
+            totals = {node: self.values[node] + sum(probability * totals[furtherConsequence]
+                                                    for furtherConsequence, probability in edges[node])
+                      for node in self.values}
+        return totals
+
+    def getFurtherValue(self, consequence, maxDepth=None, threshold=0):
+        return self.getTotalValue(consequence, maxDepth, threshold) - self.values[consequence]
+
+
+def nextOrderConsequences(consequences, graph=None, maxDepth=None, threshold=0):
     furtherConsequences = []
     for consequence in consequences:
-        furtherConsequences.append(0)
+        if graph is not None and graph.hasConsequence(consequence):
+            furtherConsequences.append(graph.getFurtherValue(consequence, maxDepth, threshold))
+        else:
+            furtherConsequences.append(0)
     return furtherConsequences
 
-def utilityCalculus(act, agents, consequences):
+# consequences may be values (numbers), or consequences of the graph whose value and further consequences are looked up
+def utilityCalculus(act, agents, consequences, graph=None, maxDepth=None, threshold=0):
     score = 0
     for agent in agents:
         agentScore = 0
         agentConsequences = consequences[agent]
         for consequence in agentConsequences:
+            if graph is not None and graph.hasConsequence(consequence):
+                consequence = graph.getValue(consequence)
             agentScore = agentScore + consequence
-        furtherConsequences = nextOrderConsequences(agentConsequences)
+        furtherConsequences = nextOrderConsequences(agentConsequences, graph, maxDepth, threshold)
         for consequence in furtherConsequences:
             agentScore = agentScore + consequence
-        print("Score for {0} is {1}.".format(agent, agentScore))
+        logger.debug("Score for %s is %s.", agent, agentScore)
         score = score + agentScore
-    print("Score for {0} is {1}.".format(act, score))
+    logger.info("Score for %s is %s.", act, score)
     return score
 
-utilityCalculus("Buying a pack of cigarettes", ["Me", "Neighbor 1", "Neighbor 2", "Stranger 1", "Stranger 2", "Tobacco Company", "Gas Station"], {"Me": [3, -5, -1], "Neighbor 1": [-2], "Neighbor 2": [-2], "Stranger 1": [-2], "Stranger 2": [-4], "Tobacco Company": [2], "Gas Station": [3]})
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format="%(message)s", stream=sys.stdout)
+    utilityCalculus("Buying a pack of cigarettes", ["Me", "Neighbor 1", "Neighbor 2", "Stranger 1", "Stranger 2", "Tobacco Company", "Gas Station"], {"Me": [3, -5, -1], "Neighbor 1": [-2], "Neighbor 2": [-2], "Stranger 1": [-2], "Stranger 2": [-4], "Tobacco Company": [2], "Gas Station": [3]})